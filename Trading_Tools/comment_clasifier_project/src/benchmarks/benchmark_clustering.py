@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import adjusted_rand_score
+from sklearn.preprocessing import normalize
+from src.comment_clustering.cluster_embeddings import cluster_embeddings, CLUSTERING_BACKENDS
+from src.comment_clustering.artifact_store import load_artifacts
+from src.util.peak_memory import peak_rss_mb
+from src.logs.logger import logger  # Import your logger
+
+def synthetic_embeddings(n_rows: int, dim: int = 384, n_centers: int = 60, noise: float = 0.05,
+                         random_state: int = 0) -> np.ndarray:
+    """
+    Generate unit-length embeddings scattered around `n_centers` random directions.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of embeddings.
+    dim : int, optional
+        Embedding dimension. Default is 384 (MiniLM).
+    n_centers : int, optional
+        Number of underlying groups. Default is 60.
+    noise : float, optional
+        Per-coordinate noise added around each centre. Default is 0.05.
+    random_state : int, optional
+        Seed. Default is 0.
+
+    Returns
+    -------
+    np.ndarray of shape (n_rows, dim), float32
+        L2-normalised embeddings.
+    """
+    rng = np.random.default_rng(random_state)
+    centers = normalize(rng.normal(size=(n_centers, dim)))
+    rows = centers[rng.integers(0, n_centers, n_rows)] + noise * rng.normal(size=(n_rows, dim))
+    return normalize(rows).astype(np.float32)
+
+def _run_worker(embeddings_path: str, backend: str, distance_threshold: float, labels_path: str) -> None:
+    embeddings = np.load(embeddings_path)
+    started = time.perf_counter()
+    labels = cluster_embeddings(embeddings, distance_threshold=distance_threshold, backend=backend)
+    wall_s = time.perf_counter() - started
+    np.save(labels_path, labels)
+    print(json.dumps({'wall_s': wall_s, 'peak_rss_mb': peak_rss_mb(), 'n_clusters': int(len(np.unique(labels)))}))
+
+def benchmark_clustering(embeddings: np.ndarray, backends, distance_threshold: float) -> pd.DataFrame:
+    """
+    Time each clustering backend in its own process and record its peak RSS.
+
+    Every backend runs in a fresh interpreter so the reported peak RSS belongs to
+    that backend alone. Labels are compared with the 'agglomerative' backend (when it
+    was run) using the adjusted Rand index.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray of shape (n_samples, dim)
+        Embeddings to cluster.
+    backends : list of str
+        Backends to run.
+    distance_threshold : float
+        Distance threshold passed to every backend.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per backend with wall time, peak RSS, cluster count and ARI.
+    """
+    rows = []
+    labels_by_backend = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        embeddings_path = os.path.join(tmp_dir, 'embeddings.npy')
+        np.save(embeddings_path, embeddings)
+        for backend in backends:
+            labels_path = os.path.join(tmp_dir, f'{backend}_labels.npy')
+            logger.info(f"Benchmarking '{backend}' clustering on {len(embeddings)} embeddings.")
+            completed = subprocess.run(
+                [sys.executable, '-m', 'src.benchmarks.benchmark_clustering', '--worker', backend,
+                 '--embeddings-npy', embeddings_path, '--labels-npy', labels_path,
+                 '--distance-threshold', str(distance_threshold)],
+                capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                logger.error(f"'{backend}' benchmark failed: {completed.stderr.strip()}")
+                rows.append({'backend': backend, 'rows': len(embeddings), 'error': completed.stderr.strip().splitlines()[-1]})
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            labels_by_backend[backend] = np.load(labels_path)
+            rows.append({'backend': backend, 'rows': len(embeddings), **result})
+
+    if 'agglomerative' in labels_by_backend:
+        for row in rows:
+            if row['backend'] in labels_by_backend:
+                row['ari_vs_agglomerative'] = adjusted_rand_score(labels_by_backend['agglomerative'],
+                                                                  labels_by_backend[row['backend']])
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Wall time and peak RSS of the clustering backends.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[5000, 20000, 50000])
+    parser.add_argument('--backends', nargs='+', default=list(CLUSTERING_BACKENDS), choices=CLUSTERING_BACKENDS)
+    parser.add_argument('--distance-threshold', type=float, default=1.0)
+    parser.add_argument('--artifact-dir', default=None,
+                        help="Sample real embeddings from this artifact directory instead of synthetic ones.")
+    parser.add_argument('--max-agglomerative-rows', type=int, default=30000,
+                        help="Skip the quadratic-memory backend above this size.")
+    parser.add_argument('--output-csv', default=r'output\benchmark_clustering.csv')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--embeddings-npy', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--labels-npy', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(args.embeddings_npy, args.worker, args.distance_threshold, args.labels_npy)
+        return
+
+    source = load_artifacts(args.artifact_dir)[0] if args.artifact_dir else None
+    reports = []
+    for n_rows in args.rows:
+        if source is not None:
+            rng = np.random.default_rng(0)
+            embeddings = np.asarray(source[np.sort(rng.choice(len(source), size=min(n_rows, len(source)), replace=False))],
+                                    dtype=np.float32)
+        else:
+            embeddings = synthetic_embeddings(n_rows)
+        backends = [b for b in args.backends if b != 'agglomerative' or n_rows <= args.max_agglomerative_rows]
+        reports.append(benchmark_clustering(embeddings, backends, args.distance_threshold))
+
+    report = pd.concat(reports, ignore_index=True)
+    report.to_csv(args.output_csv, index=False)
+    print(report.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
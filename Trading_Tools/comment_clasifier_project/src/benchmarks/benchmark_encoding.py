@@ -0,0 +1,74 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.benchmarks.benchmark_preprocess import synthetic_comments
+from src.comment_clustering.generate_embeddings import encode_texts, load_model
+from src.comment_clustering.preprocess import normalize_comments
+from src.logs.logger import logger  # Import the logger
+
+def benchmark_encoding(row_counts, worker_counts, batch_size: int, bucket_size: int,
+                       model_name: str = 'all-MiniLM-L6-v2') -> pd.DataFrame:
+    """
+    Compare the throughput of a single `model.encode` call with the multi-process, length-bucketed `encode_texts`.
+
+    The single call is timed with the model already loaded; the pooled runs include
+    starting the workers and loading the model in each of them, as a rebuild would.
+
+    Parameters
+    ----------
+    row_counts : list of int
+        Numbers of comments to encode.
+    worker_counts : list of int
+        Encoder processes to benchmark `encode_texts` with.
+    batch_size : int
+        Texts per forward pass.
+    bucket_size : int
+        Texts per worker task.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per size and variant: comments/sec, speed-up over the single call and the
+        largest absolute difference from its embeddings.
+    """
+    model = load_model(model_name)
+    rows = []
+    for n_rows in row_counts:
+        texts = normalize_comments(synthetic_comments(n_rows, n_distinct=n_rows)).tolist()
+        logger.info(f"Benchmarking encoding on {n_rows} comments.")
+
+        started = time.perf_counter()
+        expected = np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+        baseline_rate = n_rows / (time.perf_counter() - started)
+        rows.append({'rows': n_rows, 'variant': 'model.encode', 'workers': 1, 'comments_per_s': baseline_rate,
+                     'speedup': 1.0, 'max_abs_diff': 0.0})
+
+        for n_workers in worker_counts:
+            started = time.perf_counter()
+            embeddings = encode_texts(texts, model_name, n_workers=n_workers, batch_size=batch_size,
+                                      bucket_size=bucket_size, parallel_min_texts=0)
+            rate = n_rows / (time.perf_counter() - started)
+            rows.append({'rows': n_rows, 'variant': 'encode_texts', 'workers': n_workers, 'comments_per_s': rate,
+                         'speedup': rate / baseline_rate,
+                         'max_abs_diff': float(np.abs(np.asarray(embeddings) - expected).max()) if n_rows else 0.0})
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoding throughput in comments/sec, single call vs encoder processes.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--bucket-size', type=int, default=4096)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--output-csv', default=r'output\benchmark_encoding.csv')
+    args = parser.parse_args()
+
+    report = benchmark_encoding(args.rows, args.workers, args.batch_size, args.bucket_size, args.model)
+    report.to_csv(args.output_csv, index=False)
+    print(report.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import time
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from src.comment_clustering.build_hierarchy import build_hierarchy
+from src.logs.logger import logger  # Import your logger
+
+def synthetic_labeled_comments(n_rows: int, n_curves: int = 5000, random_state: int = 0) -> pd.DataFrame:
+    """
+    Generate a date-sorted labeled-comments frame shaped like the pipeline output.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+    n_curves : int, optional
+        Number of distinct curves. Default is 5000.
+    random_state : int, optional
+        Seed. Default is 0.
+
+    Returns
+    -------
+    pandas.DataFrame
+        'source', 'curve_list', 'grouping_var', 'date', 'comment' and 'standard_label' columns,
+        with some empty comments and missing dates.
+    """
+    rng = np.random.default_rng(random_state)
+    comments = np.array([f"curve delayed by vendor {i}" for i in range(1000)] + ['', ' '], dtype=object)
+    df = pd.DataFrame({
+        'source': rng.choice(['Bloomberg', 'Reuters', 'ICE', 'Platts'], n_rows),
+        'curve_list': np.char.add('CURVE_', rng.integers(0, n_curves, n_rows).astype(str)),
+        'grouping_var': rng.choice(['EU', 'US', 'ASIA'], n_rows),
+        'date': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 700, n_rows), unit='D'),
+        'comment': comments[rng.integers(0, len(comments), n_rows)],
+        'standard_label': rng.choice(['Vendor', 'Broker', 'Publication_Calendar'], n_rows),
+    })
+    df.loc[rng.random(n_rows) < 0.01, 'date'] = pd.NaT
+    return df.sort_values(by='date')
+
+def build_hierarchy_iterrows(df: pd.DataFrame) -> dict:
+    """
+    The previous row-by-row builder (without its per-row log line), kept as the baseline.
+    """
+    nested_dict = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    for _, row in df.iterrows():
+        comment = row['comment'] if pd.notna(row['comment']) and row['comment'].strip() != '' else '[Not Reviewed / Evidenced]'
+        nested_dict[row['source']][row['curve_list']][row['grouping_var']].append({
+            'date': row['date'].strftime('%Y-%m-%d') if pd.notna(row['date']) else None,
+            'comment': comment,
+            'standard_label': row['standard_label']
+        })
+    return nested_dict
+
+def _timed(builder, df):
+    started = time.perf_counter()
+    builder(df)
+    return time.perf_counter() - started
+
+def benchmark_hierarchy(row_counts, max_iterrows_rows: int) -> pd.DataFrame:
+    """
+    Time the vectorised and the iterrows hierarchy builders.
+
+    Parameters
+    ----------
+    row_counts : list of int
+        Frame sizes to benchmark.
+    max_iterrows_rows : int
+        Skip the iterrows baseline above this size.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per size with both timings and the speed-up.
+    """
+    rows = []
+    for n_rows in row_counts:
+        df = synthetic_labeled_comments(n_rows)
+        logger.info(f"Benchmarking hierarchy building on {n_rows} rows.")
+        vectorised_s = _timed(build_hierarchy, df)
+        row = {'rows': n_rows, 'vectorised_s': vectorised_s}
+        if n_rows <= max_iterrows_rows:
+            iterrows_s = _timed(build_hierarchy_iterrows, df)
+            row.update({'iterrows_s': iterrows_s, 'speedup': iterrows_s / vectorised_s})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorised vs iterrows hierarchy building.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--max-iterrows-rows', type=int, default=1000000,
+                        help="Skip the slow iterrows baseline above this size.")
+    parser.add_argument('--output-csv', default=r'output\benchmark_hierarchy.csv')
+    args = parser.parse_args()
+
+    report = benchmark_hierarchy(args.rows, args.max_iterrows_rows)
+    report.to_csv(args.output_csv, index=False)
+    print(report.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
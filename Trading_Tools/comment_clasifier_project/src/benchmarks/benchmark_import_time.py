@@ -0,0 +1,94 @@
+import argparse
+import re
+import subprocess
+import sys
+import time
+from typing import List
+import pandas as pd
+
+# Entry points that must start fast: CLI help and the hierarchy-only commands
+COMMANDS = {
+    'run_production_model --help': ['-m', 'src.run_production_model', '--help'],
+    'run_base_model --help': ['-m', 'src.run_base_model', '--help'],
+    'export_hierarchy --help': ['-m', 'src.util.export_hierarchy', '--help'],
+    'import update_comment_hierarchy': ['-c', 'import src.comment_clustering.update_comment_hierarchy'],
+    'import hierarchy_store': ['-c', 'import src.comment_clustering.hierarchy_store'],
+    'import check_existing_data': ['-c', 'import src.workflow.check_existing_data'],
+    'import initial_build': ['-c', 'import src.workflow.initial_build'],
+}
+
+# Packages that are only needed once comments are encoded, clustered or written to a workbook
+HEAVY_PACKAGES = ('torch', 'sentence_transformers', 'transformers', 'sklearn', 'scipy', 'openpyxl')
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+\d+ \|\s+\d+ \|(\s*)(\S+)$')
+
+def measure_command(args: List[str], repeats: int = 3) -> dict:
+    """
+    Time a Python invocation and list the heavy packages it imports.
+
+    Parameters
+    ----------
+    args : list of str
+        Arguments passed to the interpreter, e.g. ['-m', 'src.run_production_model', '--help'].
+    repeats : int, optional
+        Number of runs; the fastest wall time is kept. Default is 3.
+
+    Returns
+    -------
+    dict
+        Fastest wall time in seconds and the heavy top-level packages imported.
+    """
+    wall_times = []
+    heavy = set()
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', *args], capture_output=True, text=True)
+        wall_times.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            raise RuntimeError(f"'python {' '.join(args)}' failed:\n{result.stderr[-2000:]}")
+        for line in result.stderr.splitlines():
+            match = _IMPORTTIME_LINE.match(line)
+            if match and match.group(2).split('.')[0] in HEAVY_PACKAGES:
+                heavy.add(match.group(2).split('.')[0])
+    return {'wall_s': min(wall_times), 'heavy_imports': sorted(heavy)}
+
+def benchmark_import_time(budget_s: float, repeats: int = 3) -> pd.DataFrame:
+    """
+    Check the start-up time of every command in `COMMANDS` against a budget.
+
+    Parameters
+    ----------
+    budget_s : float
+        Largest accepted wall time of a command, in seconds.
+    repeats : int, optional
+        Runs per command. Default is 3.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per command: wall time, heavy packages imported and whether it is within budget.
+    """
+    rows = []
+    for name, args in COMMANDS.items():
+        measured = measure_command(args, repeats=repeats)
+        rows.append({
+            'command': name,
+            'wall_s': round(measured['wall_s'], 3),
+            'heavy_imports': ', '.join(measured['heavy_imports']),
+            'ok': measured['wall_s'] <= budget_s and not measured['heavy_imports'],
+        })
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that CLI entry points start without loading heavy dependencies.")
+    parser.add_argument('--budget', type=float, default=1.0, help="Largest accepted start-up time in seconds.")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    results = benchmark_import_time(args.budget, repeats=args.repeats)
+    print(results.to_string(index=False))
+    if not results['ok'].all():
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
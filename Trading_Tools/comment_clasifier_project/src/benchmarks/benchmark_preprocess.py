@@ -0,0 +1,102 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.comment_clustering.preprocess import clean_comment, normalize_comments
+from src.logs.logger import logger  # Import the logger
+
+def synthetic_comments(n_rows: int, n_distinct: int = 5000, random_state: int = 0) -> pd.Series:
+    """
+    Generate raw comments with punctuation, mixed case, padding, unicode and missing values.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of comments.
+    n_distinct : int, optional
+        Numbers drawn per template, which bounds the number of distinct comments. Default is 5000.
+    random_state : int, optional
+        Seed. Default is 0.
+
+    Returns
+    -------
+    pandas.Series
+        The comments, about 1% missing.
+    """
+    rng = np.random.default_rng(random_state)
+    templates = np.array([
+        "Curve delayed by Vendor #{i}; awaiting file.", "  Broker quote MISSING (ticket {i})  ",
+        "Publication calendar: holiday on {i}/12!", "Raised with ICE - WIP [{i}]", "Café price fixed — ok {i}",
+        "", "   ", "N/A",
+    ], dtype=object)
+    comments = pd.Series(
+        [templates[t].format(i=i) for t, i in zip(rng.integers(0, len(templates), n_rows), rng.integers(0, n_distinct, n_rows))],
+        dtype=object
+    )
+    comments[rng.random(n_rows) < 0.01] = np.nan
+    return comments
+
+def _rows_per_s(n_rows: int, started: float) -> float:
+    return n_rows / (time.perf_counter() - started)
+
+def benchmark_preprocess(row_counts, n_jobs: int, chunk_size: int, n_distinct: int = 5000) -> pd.DataFrame:
+    """
+    Compare the throughput of `clean_comment` per row with the batch normaliser, serial and in a process pool.
+
+    Parameters
+    ----------
+    row_counts : list of int
+        Numbers of comments to benchmark.
+    n_jobs : int
+        Worker processes for the parallel run.
+    chunk_size : int
+        Distinct comments per chunk for the parallel run.
+    n_distinct : int, optional
+        Passed to `synthetic_comments`; raise it to benchmark mostly-unique comments. Default is 5000.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per size: rows/sec of each variant.
+    """
+    rows = []
+    for n_rows in row_counts:
+        comments = synthetic_comments(n_rows, n_distinct=n_distinct)
+        logger.info(f"Benchmarking comment normalisation on {n_rows} rows.")
+
+        started = time.perf_counter()
+        comments.apply(clean_comment)
+        apply_rate = _rows_per_s(n_rows, started)
+
+        started = time.perf_counter()
+        normalize_comments(comments, n_jobs=1)
+        serial_rate = _rows_per_s(n_rows, started)
+
+        started = time.perf_counter()
+        normalize_comments(comments, n_jobs=n_jobs, chunk_size=chunk_size, parallel_min_rows=0)
+        parallel_rate = _rows_per_s(n_rows, started)
+
+        rows.append({
+            'rows': n_rows,
+            'apply_rows_per_s': apply_rate,
+            'vectorised_rows_per_s': serial_rate,
+            'parallel_rows_per_s': parallel_rate,
+        })
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the comment normaliser in rows/sec.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--n-jobs', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=200000)
+    parser.add_argument('--distinct', type=int, default=5000,
+                        help="Numbers drawn per comment template; raise it for mostly-unique comments.")
+    parser.add_argument('--output-csv', default=r'output\benchmark_preprocess.csv')
+    args = parser.parse_args()
+
+    report = benchmark_preprocess(args.rows, args.n_jobs, args.chunk_size, args.distinct)
+    report.to_csv(args.output_csv, index=False)
+    print(report.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
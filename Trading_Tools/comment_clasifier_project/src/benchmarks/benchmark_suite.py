@@ -0,0 +1,317 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from src.comment_clustering.assign_labels_based_on_similarity import assign_labels_based_on_similarity
+from src.comment_clustering.build_hierarchy import build_hierarchy
+from src.comment_clustering.hierarchy_store import HierarchyStore
+from src.comment_clustering.pivot_table import render_pivot_xlsx, update_pivot_table, load_pivot_table
+from src.comment_clustering.preprocess import preprocess_comments
+from src.config.config import get_config_data, load_similarity_threshold
+from src.logs.memory_profiling import MemoryProfiler
+from src.logs.logger import logger  # Import the logger
+
+# Words mixed into every synthetic comment around its label's words
+_FILLER_WORDS = ['curve', 'price', 'file', 'today', 'awaiting', 'vendor', 'update', 'missing', 'late', 'ticket',
+                 'confirmed', 'expected', 'data', 'feed', 'holiday', 'month', 'week', 'source', 'issue', 'ok']
+
+class HashingEncoder:
+    """
+    Deterministic offline stand-in for the SentenceTransformer encoder.
+
+    Word unigrams and bigrams are hashed into `dim` signed buckets and L2-normalised,
+    so equal texts get equal vectors and texts sharing words are close in cosine
+    similarity, like MiniLM embeddings but without a model download.
+
+    Parameters
+    ----------
+    dim : int, optional
+        Embedding dimension. Default is 384 (MiniLM).
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._vectorizer = HashingVectorizer(n_features=dim, ngram_range=(1, 2), alternate_sign=True, norm='l2')
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Encode texts; same signature as `SentenceTransformer.encode` for the arguments the pipelines use.
+        """
+        return self._vectorizer.transform(texts).toarray().astype(np.float32)
+
+def label_vocabulary() -> List[str]:
+    """
+    Return the distinct standard labels of `cluster_label_mapping` in config.json.
+    """
+    return sorted(set(get_config_data().get("cluster_label_mapping", {}).values()))
+
+def synthetic_corpus(n_rows: int, n_curves: Optional[int] = None, n_dates: int = 60,
+                     random_state: int = 0) -> pd.DataFrame:
+    """
+    Generate comment rows shaped like `data.csv`, with text drawn from the label vocabulary.
+
+    Each comment is built from the words of one standard label (e.g. 'Raised_and_Work_in_Progress'
+    gives 'raised and work in progress'), a few filler words, casing, punctuation and a
+    ticket number; about 1% of comments are empty or missing.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+    n_curves : int, optional
+        Number of distinct curves. Defaults to one per 20 rows.
+    n_dates : int, optional
+        Number of distinct business dates. Default is 60.
+    random_state : int, optional
+        Seed. Default is 0.
+
+    Returns
+    -------
+    pandas.DataFrame
+        'source', 'date' (datetime64), 'curve_list', 'comment', 'grouping_var' and the
+        generating 'label'.
+    """
+    rng = np.random.default_rng(random_state)
+    labels = np.array(label_vocabulary(), dtype=object)
+    label_words = [label.replace('_', ' ').lower() for label in labels]
+    n_curves = n_curves or max(n_rows // 20, 1)
+
+    label_idx = rng.integers(0, len(labels), n_rows)
+    fillers = np.array(_FILLER_WORDS, dtype=object)
+    filler_a = fillers[rng.integers(0, len(fillers), n_rows)]
+    filler_b = fillers[rng.integers(0, len(fillers), n_rows)]
+    tickets = rng.integers(0, 5000, n_rows)
+    style = rng.integers(0, 4, n_rows)
+    comments = np.array([
+        (f"{a.title()} {words}: {b} #{ticket}" if s == 0 else
+         f"  {words.upper()} - {a} {b}  " if s == 1 else
+         f"{words}, {a} ({ticket})!" if s == 2 else
+         f"{a} {b} {words}")
+        for words, a, b, ticket, s in zip((label_words[i] for i in label_idx), filler_a, filler_b, tickets, style)
+    ], dtype=object)
+    missing = rng.random(n_rows)
+    comments[missing < 0.005] = np.nan
+    comments[(missing >= 0.005) & (missing < 0.01)] = ''
+
+    dates = pd.bdate_range('2024-01-01', periods=n_dates)
+    return pd.DataFrame({
+        'source': rng.choice(['Bloomberg', 'Refinitiv', 'ICE', 'Platts'], n_rows).astype(object),
+        'date': dates[rng.integers(0, n_dates, n_rows)],
+        'curve_list': np.char.add('CURVE_', rng.integers(0, n_curves, n_rows).astype(str)).astype(object),
+        'comment': comments,
+        'grouping_var': rng.choice(['Power', 'Gas', 'Oil', 'Coal', 'Emissions'], n_rows).astype(object),
+        'label': labels[label_idx],
+    })
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class _StageTimer:
+    def __init__(self, profiler: MemoryProfiler):
+        self.profiler = profiler
+        self.stages: List[Dict] = []
+
+    @contextmanager
+    def stage(self, name: str, rows: int) -> Iterator[None]:
+        self.profiler.start_stage(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_s = time.perf_counter() - started
+            memory = self.profiler.end_stage()
+            self.stages.append({
+                'stage': name, 'rows': rows, 'duration_s': round(duration_s, 6),
+                'rows_per_s': round(rows / duration_s, 1) if duration_s else None,
+                'peak_rss_mb': memory['peak_rss_mb'], 'rss_growth_mb': memory['rss_growth_mb'],
+            })
+            logger.info(f"Benchmark stage '{name}' on {rows} rows took {duration_s:.3f}s, "
+                        f"peak RSS {memory['peak_rss_mb']} MB.")
+
+def run_benchmark(n_rows: int, reference_rows: int = 20000, encoder: Optional[HashingEncoder] = None,
+                  work_dir: Optional[str] = None) -> Dict:
+    """
+    Time the classifier stages on a synthetic corpus and record their peak RSS.
+
+    The stages are `preprocess_comments`, encoding with the stub encoder,
+    `assign_labels_based_on_similarity` against a labelled reference corpus, `build_hierarchy`,
+    and the steps of `update_comment_hierarchy`: appending to a hierarchy store, updating the
+    long-format pivot table and rendering the pivot workbook. Stores and reports are written to
+    `work_dir`, never to the configured output paths.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of comments.
+    reference_rows : int, optional
+        Size of the labelled reference corpus the comments are classified against. Default is 20000.
+    encoder : HashingEncoder, optional
+        Encoder to use. Defaults to `HashingEncoder()`.
+    work_dir : str, optional
+        Directory for the stores and the workbook. Defaults to a temporary directory.
+
+    Returns
+    -------
+    dict
+        One result: 'rows' and a list of 'stages' with 'duration_s', 'rows_per_s', 'peak_rss_mb'
+        and 'rss_growth_mb'.
+    """
+    encoder = encoder or HashingEncoder()
+    threshold = load_similarity_threshold() or 0.5
+    labels = label_vocabulary()
+    cluster_to_label = {str(i): label for i, label in enumerate(labels)}
+
+    # Reference set: one cluster per label, encoded outside the timed stages
+    reference = preprocess_comments(synthetic_corpus(reference_rows, random_state=1))
+    reference_embeddings = encoder.encode(reference['cleaned_comment'].tolist())
+    reference_clusters = pd.Series(reference['label']).map({label: i for i, label in enumerate(labels)}).to_numpy()
+
+    df = synthetic_corpus(n_rows)
+    profiler = MemoryProfiler(trace_allocations=False)
+    timer = _StageTimer(profiler)
+    profiler.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            work_dir = work_dir or tmp_dir
+            with timer.stage('preprocess', n_rows):
+                df = preprocess_comments(df)
+            with timer.stage('embed', n_rows):
+                embeddings = encoder.encode(df['cleaned_comment'].tolist())
+            with timer.stage('assign_labels', n_rows):
+                df['standard_label'] = assign_labels_based_on_similarity(
+                    df, embeddings, reference_embeddings, reference_clusters, cluster_to_label, threshold
+                )
+            del embeddings
+            with timer.stage('build_hierarchy', n_rows):
+                build_hierarchy(df.sort_values(by='date'))
+            with HierarchyStore(os.path.join(work_dir, 'benchmark_hierarchy.sqlite')) as store:
+                store.clear()
+                with timer.stage('hierarchy_append', n_rows):
+                    store.append(df)
+                pivot_path = os.path.join(work_dir, 'benchmark_pivot')
+                if os.path.exists(pivot_path):
+                    shutil.rmtree(pivot_path)
+                with timer.stage('pivot_update', n_rows):
+                    update_pivot_table(df, pivot_path)
+            cells = load_pivot_table(pivot_path)
+            with timer.stage('pivot_render', len(cells)):
+                render_pivot_xlsx(cells, os.path.join(work_dir, 'benchmark_pivot.xlsx'))
+    finally:
+        profiler.stop()
+    return {'rows': n_rows, 'reference_rows': reference_rows, 'stages': timer.stages}
+
+def run_suite(row_counts: List[int], results_file: str, reference_rows: int = 20000) -> List[Dict]:
+    """
+    Run `run_benchmark` for each size and append the results to a JSON-lines file.
+
+    Every line holds one size of one run: run id, start time, git commit, pandas and numpy
+    versions, and the per-stage timings and peak RSS, so runs can be compared with `compare_runs`.
+
+    Parameters
+    ----------
+    row_counts : list of int
+        Corpus sizes, e.g. 10k, 100k and 1M.
+    results_file : str
+        JSON-lines results file. Created if it does not exist.
+    reference_rows : int, optional
+        Size of the labelled reference corpus. Default is 20000.
+
+    Returns
+    -------
+    list of dict
+        The appended results.
+    """
+    run_id = uuid.uuid4().hex
+    started_at = datetime.now().isoformat(timespec='seconds')
+    commit = _git_commit()
+    encoder = HashingEncoder()
+    results = []
+    for n_rows in row_counts:
+        logger.info(f"Running the benchmark suite on {n_rows} rows.")
+        result = {'run_id': run_id, 'started_at': started_at, 'git_commit': commit,
+                  'pandas': pd.__version__, 'numpy': np.__version__,
+                  **run_benchmark(n_rows, reference_rows=reference_rows, encoder=encoder)}
+        results.append(result)
+        gc.collect()
+
+    directory = os.path.dirname(results_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(results_file, 'a') as f:
+        for result in results:
+            f.write(json.dumps(result) + '\n')
+    logger.info(f"Benchmark results appended to {results_file}.")
+    return results
+
+def compare_runs(results_file: str) -> pd.DataFrame:
+    """
+    Compare the latest run of each corpus size with the run before it.
+
+    Parameters
+    ----------
+    results_file : str
+        JSON-lines file written by `run_suite`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per size and stage: duration and peak RSS of both runs, the duration ratio
+        (latest / previous, above 1 is slower) and the peak RSS change in MB.
+    """
+    with open(results_file, 'r') as f:
+        results = [json.loads(line) for line in f if line.strip()]
+
+    rows = []
+    for n_rows in sorted({result['rows'] for result in results}):
+        runs = [result for result in results if result['rows'] == n_rows]
+        if len(runs) < 2:
+            continue
+        previous = {stage['stage']: stage for stage in runs[-2]['stages']}
+        for stage in runs[-1]['stages']:
+            before = previous.get(stage['stage'])
+            if before is None:
+                continue
+            rows.append({
+                'rows': n_rows, 'stage': stage['stage'],
+                'previous_commit': runs[-2]['git_commit'], 'latest_commit': runs[-1]['git_commit'],
+                'previous_s': before['duration_s'], 'latest_s': stage['duration_s'],
+                'duration_ratio': stage['duration_s'] / before['duration_s'] if before['duration_s'] else None,
+                'previous_peak_rss_mb': before['peak_rss_mb'], 'latest_peak_rss_mb': stage['peak_rss_mb'],
+                'peak_rss_change_mb': round(stage['peak_rss_mb'] - before['peak_rss_mb'], 1),
+            })
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the classifier stages on a synthetic corpus.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--reference-rows', type=int, default=20000)
+    parser.add_argument('--results-file', default=r'output\benchmark_suite.jsonl')
+    parser.add_argument('--compare', action='store_true',
+                        help="Only compare the latest run of each size with the previous one.")
+    args = parser.parse_args()
+
+    if not args.compare:
+        results = run_suite(args.rows, args.results_file, reference_rows=args.reference_rows)
+        report = pd.DataFrame([{'rows': result['rows'], **stage} for result in results for stage in result['stages']])
+        print(report.to_string(index=False))
+    comparison = compare_runs(args.results_file)
+    if not comparison.empty:
+        print(comparison.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+import os
+import numpy as np
+from typing import Optional, Tuple
+from src.comment_clustering.similarity_search import ExactSimilaritySearch, DEFAULT_BLOCK_SIZE, prepare_reference
+from src.comment_clustering.quantization import build_exact_search
+from src.comment_clustering.prototypes import PrototypeSimilaritySearch, prototypes_path
+from src.config.config import load_similarity_threshold
+from src.logs.logger import logger  # Import the logger
+
+ANN_INDEX_FILE = 'ann_index.ivf.npz'
+
+def ann_index_path(artifact_dir: str) -> str:
+    """
+    Return the path of the ANN index stored next to the saved embeddings.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Artifact directory holding the saved embeddings (see `artifact_store`).
+
+    Returns
+    -------
+    str
+        Path of the index file inside `artifact_dir`.
+    """
+    return os.path.join(artifact_dir, ANN_INDEX_FILE)
+
+class IVFSimilaritySearch:
+    """
+    Approximate cosine nearest-neighbour search using an inverted file (IVF) index.
+
+    The normalised reference set is partitioned with spherical k-means into `n_lists`
+    inverted lists. A query is only scored against the members of its `n_probe`
+    closest lists, so the cost of a search grows with `n_probe / n_lists` of the
+    reference set rather than with all of it.
+
+    Parameters
+    ----------
+    reference_embeddings : numpy.ndarray of shape (n_reference, dim)
+        Embeddings of the existing comments, in the same order as the saved labels.
+    centroids : numpy.ndarray of shape (n_lists, dim)
+        Normalised list centroids.
+    list_offsets : numpy.ndarray of shape (n_lists + 1,)
+        Start offset of each inverted list inside `list_ids`.
+    list_ids : numpy.ndarray of shape (n_reference,)
+        Reference row indices grouped by inverted list.
+    n_probe : int, optional (default=8)
+        Number of closest lists scanned per query.
+    block_size : int, optional (default=1024)
+        Number of query rows processed at a time.
+    normalized : bool, optional (default=False)
+        Set when the reference rows are already L2-normalised, so they are used without copying.
+    """
+
+    def __init__(self, reference_embeddings, centroids, list_offsets, list_ids,
+                 n_probe: int = 8, block_size: int = DEFAULT_BLOCK_SIZE, normalized: bool = False):
+        if len(list_ids) != len(reference_embeddings):
+            raise ValueError(
+                f"ANN index covers {len(list_ids)} rows but {len(reference_embeddings)} embeddings were given; "
+                "rebuild the index."
+            )
+        self.reference = prepare_reference(reference_embeddings, normalized)
+        # float16 and int8 references are gathered per list and scored in float32
+        self.dtype = np.float64 if self.reference.dtype == np.float64 else np.float32
+        self.centroids = np.asarray(centroids, dtype=self.dtype)
+        self.list_offsets = np.asarray(list_offsets)
+        self.list_ids = np.asarray(list_ids)
+        self.n_probe = max(1, min(n_probe, len(self.centroids)))
+        self.block_size = block_size
+
+    def __len__(self) -> int:
+        return len(self.reference)
+
+    @classmethod
+    def build(cls, reference_embeddings, n_lists: Optional[int] = None, n_probe: int = 8,
+              n_iter: int = 10, random_state: int = 0, block_size: int = DEFAULT_BLOCK_SIZE,
+              normalized: bool = False) -> "IVFSimilaritySearch":
+        """
+        Partition the reference set with spherical k-means and build the inverted lists.
+
+        Parameters
+        ----------
+        reference_embeddings : numpy.ndarray of shape (n_reference, dim)
+            Embeddings of the existing comments.
+        n_lists : int, optional
+            Number of inverted lists. Defaults to sqrt(n_reference).
+        n_probe : int, optional (default=8)
+            Number of closest lists scanned per query.
+        n_iter : int, optional (default=10)
+            Number of k-means iterations.
+        random_state : int, optional (default=0)
+            Seed used to pick the initial centroids.
+        block_size : int, optional (default=1024)
+            Number of rows assigned per matrix multiply.
+        normalized : bool, optional (default=False)
+            Whether the reference rows are already L2-normalised.
+
+        Returns
+        -------
+        IVFSimilaritySearch
+            The built index.
+        """
+        from sklearn.preprocessing import normalize
+        # Indexing with [:] also dequantises float16 / int8 artifacts for the offline build
+        reference = prepare_reference(np.asarray(reference_embeddings[:], dtype=np.float32), normalized)
+        n_rows = len(reference)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+        logger.info(f"Building IVF index with {n_lists} lists over {n_rows} embeddings.")
+
+        rng = np.random.default_rng(random_state)
+        centroids = reference[rng.choice(n_rows, size=n_lists, replace=False)]
+        for _ in range(n_iter):
+            assignment, _ = ExactSimilaritySearch(centroids, block_size=block_size).search(reference)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, reference)
+            counts = np.bincount(assignment, minlength=n_lists)
+            empty = counts == 0
+            # Re-seed empty lists with random rows so every list stays populated
+            sums[empty] = reference[rng.choice(n_rows, size=int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assignment, _ = ExactSimilaritySearch(centroids, block_size=block_size).search(reference)
+        list_ids = np.argsort(assignment, kind='stable')
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=n_lists))))
+        logger.info("IVF index built.")
+        return cls(reference, centroids, list_offsets, list_ids, n_probe=n_probe, block_size=block_size,
+                   normalized=True)
+
+    def save(self, filepath: str) -> None:
+        """
+        Save the centroids and inverted lists (not the embeddings themselves) to an .npz file.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the output index file.
+        """
+        logger.info(f"Saving IVF index to {filepath}.")
+        np.savez(filepath, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids)
+
+    @classmethod
+    def load(cls, filepath: str, reference_embeddings, n_probe: int = 8,
+             block_size: int = DEFAULT_BLOCK_SIZE, normalized: bool = False) -> "IVFSimilaritySearch":
+        """
+        Load an index saved with `save` and attach it to its reference embeddings.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the index file.
+        reference_embeddings : numpy.ndarray of shape (n_reference, dim)
+            The embeddings the index was built from.
+        n_probe : int, optional (default=8)
+            Number of closest lists scanned per query.
+        block_size : int, optional (default=1024)
+            Number of query rows processed at a time.
+        normalized : bool, optional (default=False)
+            Whether the reference rows are already L2-normalised.
+
+        Returns
+        -------
+        IVFSimilaritySearch
+            The loaded index.
+        """
+        logger.info(f"Loading IVF index from {filepath}.")
+        with np.load(filepath) as data:
+            return cls(reference_embeddings, data['centroids'], data['list_offsets'], data['list_ids'],
+                       n_probe=n_probe, block_size=block_size, normalized=normalized)
+
+    def search(self, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the (approximately) most similar reference row for every query embedding.
+
+        Parameters
+        ----------
+        query_embeddings : numpy.ndarray of shape (n_queries, dim)
+            Embeddings of the comments to classify.
+
+        Returns
+        -------
+        best_idx : numpy.ndarray of shape (n_queries,)
+            Index of the closest reference embedding found for each query.
+        best_score : numpy.ndarray of shape (n_queries,)
+            Cosine similarity between each query and that reference embedding.
+        """
+        from sklearn.preprocessing import normalize
+        query_embeddings = np.asarray(query_embeddings)
+        n_queries = len(query_embeddings)
+        best_idx = np.zeros(n_queries, dtype=np.intp)
+        best_score = np.full(n_queries, -np.inf, dtype=self.dtype)
+
+        for start in range(0, n_queries, self.block_size):
+            stop = min(start + self.block_size, n_queries)
+            block = normalize(query_embeddings[start:stop]).astype(self.dtype, copy=False)
+
+            # Pick the n_probe closest lists for each query in the block
+            centroid_scores = block @ self.centroids.T
+            if self.n_probe < len(self.centroids):
+                probes = np.argpartition(-centroid_scores, self.n_probe - 1, axis=1)[:, :self.n_probe]
+            else:
+                probes = np.broadcast_to(np.arange(len(self.centroids)), centroid_scores.shape)
+
+            # Scan each probed list once for all the queries that selected it
+            for list_id in np.unique(probes):
+                members = self.list_ids[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+                if len(members) == 0:
+                    continue
+                query_rows = np.flatnonzero((probes == list_id).any(axis=1))
+                scores = block[query_rows] @ np.asarray(self.reference[members], dtype=self.dtype).T
+                local_best = scores.argmax(axis=1)
+                candidate_idx = members[local_best]
+                candidate_score = scores[np.arange(len(query_rows)), local_best]
+
+                # Prefer the higher score; on ties keep the lower row index, like the exact argmax
+                target = start + query_rows
+                current_score = best_score[target]
+                better = (candidate_score > current_score) | (
+                    (candidate_score == current_score) & (candidate_idx < best_idx[target])
+                )
+                best_idx[target[better]] = candidate_idx[better]
+                best_score[target[better]] = candidate_score[better]
+
+        return best_idx, best_score
+
+def build_ann_index(embeddings: np.ndarray, artifact_dir: str, n_lists: Optional[int] = None,
+                    n_probe: int = 8, normalized: bool = False) -> IVFSimilaritySearch:
+    """
+    Build an IVF index for the given embeddings and save it in the artifact directory.
+
+    Parameters
+    ----------
+    embeddings : numpy.ndarray of shape (n_samples, dim)
+        The embeddings saved in `artifact_dir`.
+    artifact_dir : str
+        Artifact directory; the index is written alongside the embeddings.
+    n_lists : int, optional
+        Number of inverted lists. Defaults to sqrt(n_samples).
+    n_probe : int, optional (default=8)
+        Number of closest lists scanned per query.
+    normalized : bool, optional (default=False)
+        Whether the embeddings are already L2-normalised.
+
+    Returns
+    -------
+    IVFSimilaritySearch
+        The built index.
+    """
+    index = IVFSimilaritySearch.build(embeddings, n_lists=n_lists, n_probe=n_probe, normalized=normalized)
+    index.save(ann_index_path(artifact_dir))
+    return index
+
+def load_similarity_search(existing_embeddings: np.ndarray, artifact_dir: str, settings: dict,
+                           normalized: bool = False):
+    """
+    Return the search backend selected by the `similarity_search` config section.
+
+    Falls back to exact search (with a warning) when approximate or prototype search is
+    requested but no index or prototypes have been built in `artifact_dir`, or when
+    prototype search has no calibrated 'prototype_threshold'.
+
+    Parameters
+    ----------
+    existing_embeddings : numpy.ndarray of shape (n_reference, dim)
+        Embeddings of the existing comments.
+    artifact_dir : str
+        Artifact directory of the saved embeddings, used to locate the index.
+    settings : dict
+        The `similarity_search` config section.
+    normalized : bool, optional (default=False)
+        Whether the embeddings are already L2-normalised (true for the artifact store).
+
+    Returns
+    -------
+    ExactSimilaritySearch, IVFSimilaritySearch or PrototypeSimilaritySearch
+        A search object exposing `search(query_embeddings)`.
+    """
+    block_size = settings.get('block_size', DEFAULT_BLOCK_SIZE)
+    if settings.get('mode', 'exact') == 'approximate':
+        index_file = ann_index_path(artifact_dir)
+        if os.path.exists(index_file):
+            return IVFSimilaritySearch.load(index_file, existing_embeddings, n_probe=settings.get('n_probe', 8),
+                                            block_size=block_size, normalized=normalized)
+        logger.warning(f"Approximate search requested but {index_file} was not found. Using exact search.")
+    elif settings.get('mode', 'exact') == 'prototype':
+        prototypes_file = prototypes_path(artifact_dir)
+        if settings.get('prototype_threshold') is None:
+            logger.warning("Prototype search requested but similarity_search.prototype_threshold is not set "
+                           "(see prototype_agreement_report). Using exact search.")
+        elif os.path.exists(prototypes_file):
+            return PrototypeSimilaritySearch.load(prototypes_file, block_size=block_size)
+        else:
+            logger.warning(f"Prototype search requested but {prototypes_file} was not found. Using exact search.")
+    return build_exact_search(existing_embeddings, block_size=block_size, normalized=normalized)
+
+def search_similarity_threshold(search, settings: dict) -> Optional[float]:
+    """
+    Return the similarity threshold that applies to the scores of a search backend.
+
+    Prototype search scores the similarity to a centroid or medoid and is labelled with
+    'prototype_threshold'; the other backends score the nearest saved comment and use
+    `similarity_threshold`.
+
+    Parameters
+    ----------
+    search : ExactSimilaritySearch, IVFSimilaritySearch or PrototypeSimilaritySearch
+        The backend returned by `load_similarity_search`.
+    settings : dict
+        The `similarity_search` config section.
+
+    Returns
+    -------
+    Optional[float]
+        The threshold to pass to `assign_labels_based_on_similarity`.
+    """
+    if isinstance(search, PrototypeSimilaritySearch):
+        return settings.get('prototype_threshold')
+    return load_similarity_threshold()
@@ -0,0 +1,424 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+import numpy as np
+from src.comment_clustering.quantization import quantize_embeddings, QuantizedEmbeddings
+from src.logs.logger import logger  # Import the logger
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+CLUSTER_LABELS_FILE = 'cluster_labels.npy'
+EMBEDDING_SCALES_FILE = 'embedding_scales.npy'
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+# Fixed .npy header size, so the shape can be rewritten in place once the row count is known
+NPY_HEADER_SIZE = 128
+
+def _sha256(filepath: str, offset: int = 0, length: Optional[int] = None, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        remaining = float('inf') if length is None else length
+        while remaining > 0:
+            chunk = f.read(int(min(chunk_size, remaining)))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+def _read_npy_header(f) -> Tuple[Tuple[int, int], Tuple[int, ...], np.dtype, int]:
+    # Version, shape, dtype and data offset of an open .npy file
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if fortran_order:
+        raise ValueError("Fortran-ordered artifact files cannot be appended to.")
+    return version, shape, dtype, f.tell()
+
+def _file_entry(artifact_dir: str, filename: str) -> Dict:
+    # Checksums cover the array data in segments, so appended rows only hash the new bytes
+    filepath = os.path.join(artifact_dir, filename)
+    with open(filepath, 'rb') as f:
+        _, _, _, offset = _read_npy_header(f)
+    length = os.path.getsize(filepath) - offset
+    segment = {'offset': offset, 'length': length, 'sha256': _sha256(filepath, offset, length)}
+    return {'path': filename, 'segments': [segment]}
+
+def _append_npy_rows(filepath: str, rows: np.ndarray) -> Dict:
+    """
+    Append rows to a .npy file in place and rewrite the shape in its header.
+
+    The data is written before the header, so an interrupted append leaves the file
+    describing its previous rows.
+
+    Parameters
+    ----------
+    filepath : str
+        Existing .npy file (version 1.0 header, C order).
+    rows : np.ndarray
+        Rows to append, in the file's dtype and trailing shape.
+
+    Returns
+    -------
+    dict
+        Checksum segment of the appended bytes.
+    """
+    with open(filepath, 'r+b') as f:
+        version, shape, dtype, offset = _read_npy_header(f)
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        if version != (1, 0) or rows.shape[1:] != shape[1:]:
+            raise ValueError(f"Cannot append rows of shape {rows.shape} to {filepath} ({shape}, version {version}).")
+        header = _npy_header((shape[0] + len(rows),) + tuple(shape[1:]), dtype, size=offset)
+        end = offset + int(np.prod(shape)) * dtype.itemsize
+        data = rows.tobytes()
+        f.seek(end)
+        f.truncate()
+        f.write(data)
+        f.flush()
+        f.seek(0)
+        f.write(header)
+    return {'offset': end, 'length': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+def _save_npy_atomic(filepath: str, array: np.ndarray) -> None:
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, filepath)
+
+def _write_artifacts(artifact_dir: str, stored: np.ndarray, scales: Optional[np.ndarray],
+                     cluster_labels: np.ndarray, model_name: str, dtype: str) -> Dict:
+    files = {}
+    _save_npy_atomic(os.path.join(artifact_dir, EMBEDDINGS_FILE), stored)
+    if scales is not None:
+        _save_npy_atomic(os.path.join(artifact_dir, EMBEDDING_SCALES_FILE), scales)
+        files['embedding_scales'] = _file_entry(artifact_dir, EMBEDDING_SCALES_FILE)
+    _save_npy_atomic(os.path.join(artifact_dir, CLUSTER_LABELS_FILE), np.asarray(cluster_labels).astype(np.int32))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_name': model_name,
+        'dim': int(stored.shape[1]),
+        'rows': int(stored.shape[0]),
+        'embedding_dtype': dtype,
+        'normalized': True,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'files': {
+            'embeddings': _file_entry(artifact_dir, EMBEDDINGS_FILE),
+            'cluster_labels': _file_entry(artifact_dir, CLUSTER_LABELS_FILE),
+            **files,
+        },
+    }
+    _write_manifest(artifact_dir, manifest)
+    return manifest
+
+def _write_manifest(artifact_dir: str, manifest: Dict) -> None:
+    manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def _npy_header(shape: Tuple[int, ...], dtype: np.dtype, size: int = NPY_HEADER_SIZE) -> bytes:
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': shape})
+    padded_length = size - len(np.lib.format.MAGIC_PREFIX) - 4 - 1
+    if len(header) > padded_length:
+        raise ValueError(f"A .npy header for shape {shape} does not fit in {size} bytes.")
+    header = header.ljust(padded_length) + '\n'
+    return np.lib.format.MAGIC_PREFIX + bytes([1, 0]) + struct.pack('<H', len(header)) + header.encode('latin1')
+
+class NpyAppendWriter:
+    """
+    Write a 2D `.npy` array to disk chunk by chunk.
+
+    Rows are appended straight to the file, so only the chunk being written is held
+    in memory; the header is rewritten with the final row count by `close`, after
+    which the file is an ordinary `.npy` that `np.load` can memory-map.
+
+    Parameters
+    ----------
+    filepath : str
+        Output `.npy` file. Overwritten if it exists.
+    dtype : str, optional
+        Dtype of the stored rows. Default is 'float32'.
+
+    Examples
+    --------
+    >>> with NpyAppendWriter('embeddings.npy') as writer:
+    ...     for chunk in chunks:
+    ...         writer.append(model.encode(chunk))
+    >>> embeddings = np.load('embeddings.npy', mmap_mode='r')
+    """
+
+    def __init__(self, filepath: str, dtype: str = 'float32'):
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filepath = filepath
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.dim = None
+        self._file = open(filepath, 'wb')
+        self._file.write(_npy_header((0, 0), self.dtype))
+
+    def append(self, rows: np.ndarray) -> None:
+        """
+        Append rows to the array.
+
+        Parameters
+        ----------
+        rows : np.ndarray of shape (n_rows, dim)
+            Rows to append; `dim` must match the earlier rows.
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if rows.ndim != 2 or (self.dim is not None and rows.shape[1] != self.dim):
+            raise ValueError(f"Expected rows of shape (n, {self.dim}), got {rows.shape}.")
+        self.dim = rows.shape[1]
+        self._file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        """
+        Write the final shape into the header and close the file.
+        """
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(_npy_header((self.rows, self.dim or 0), self.dtype))
+        self._file.close()
+
+    def __enter__(self) -> "NpyAppendWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def read_manifest(artifact_dir: str) -> Dict:
+    """
+    Read the JSON manifest of an artifact directory.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Directory written by `save_artifacts`.
+
+    Returns
+    -------
+    dict
+        The manifest (format version, model name, dimension, row count, dtype and file checksums).
+    """
+    with open(os.path.join(artifact_dir, MANIFEST_FILE), 'r') as f:
+        return json.load(f)
+
+def save_artifacts(artifact_dir: str, embeddings: np.ndarray, cluster_labels: np.ndarray,
+                   model_name: str = 'all-MiniLM-L6-v2', dtype: str = 'float32') -> Dict:
+    """
+    Save embeddings and cluster labels as a versioned, memory-mappable artifact set.
+
+    The directory holds `embeddings.npy` (L2-normalised rows in `dtype`),
+    `cluster_labels.npy` (int32) and `manifest.json`; int8 storage adds the per-row
+    scales in `embedding_scales.npy`. The manifest is written last, so a directory
+    with a manifest is always complete.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Output directory. Created if needed.
+    embeddings : np.ndarray of shape (n_samples, dim)
+        Comment embeddings.
+    cluster_labels : np.ndarray of shape (n_samples,)
+        Cluster label of each embedding.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the model that produced the embeddings.
+    dtype : str, optional (default='float32')
+        Storage dtype of the embeddings: 'float32', 'float16' or 'int8' (per-row scaled).
+
+    Returns
+    -------
+    dict
+        The written manifest.
+    """
+    from sklearn.preprocessing import normalize
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'. Expected one of {SUPPORTED_DTYPES}.")
+    embeddings = np.asarray(embeddings)
+    cluster_labels = np.asarray(cluster_labels)
+    if embeddings.ndim != 2 or len(embeddings) != len(cluster_labels):
+        raise ValueError("Embeddings must be 2D and aligned with the cluster labels.")
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    logger.info(f"Saving {len(embeddings)} embeddings and cluster labels to {artifact_dir}.")
+
+    # Rows are stored normalised so similarity search can use the memory map without copying it
+    normalized = normalize(embeddings).astype(np.float32)
+    if dtype == 'float32':
+        stored, scales = normalized, None
+    else:
+        stored, scales = quantize_embeddings(normalized, dtype)
+    manifest = _write_artifacts(artifact_dir, stored, scales, cluster_labels, model_name, dtype)
+    logger.info(f"Artifacts saved to {artifact_dir}.")
+    return manifest
+
+def append_artifacts(artifact_dir: str, embeddings: np.ndarray, cluster_labels: np.ndarray) -> Dict:
+    """
+    Append embeddings and cluster labels to an existing artifact directory.
+
+    The new rows are normalised, stored in the dtype recorded in the manifest and
+    written to the end of the existing files, whose headers are then updated in place;
+    the existing rows are neither read nor rewritten, and only the new bytes are hashed.
+    The manifest is rewritten last, as in `save_artifacts`.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Directory written by `save_artifacts`.
+    embeddings : np.ndarray of shape (n_new, dim)
+        Embeddings of the appended comments.
+    cluster_labels : np.ndarray of shape (n_new,)
+        Cluster label of each appended embedding.
+
+    Returns
+    -------
+    dict
+        The rewritten manifest.
+    """
+    from sklearn.preprocessing import normalize
+    embeddings = np.asarray(embeddings)
+    cluster_labels = np.asarray(cluster_labels)
+    manifest = read_manifest(artifact_dir)
+    if embeddings.ndim != 2 or len(embeddings) != len(cluster_labels):
+        raise ValueError("Embeddings must be 2D and aligned with the cluster labels.")
+    if embeddings.shape[1] != manifest['dim']:
+        raise ValueError(f"Cannot append {embeddings.shape[1]}-dimensional embeddings to "
+                         f"{manifest['dim']}-dimensional artifacts in {artifact_dir}.")
+
+    dtype = manifest['embedding_dtype']
+    logger.info(f"Appending {len(embeddings)} embeddings to the {manifest['rows']} in {artifact_dir}.")
+    normalized = normalize(embeddings).astype(np.float32)
+    if dtype == 'float32':
+        new_rows = {'embeddings': normalized}
+    else:
+        codes, scales = quantize_embeddings(normalized, dtype)
+        new_rows = {'embeddings': codes} if scales is None else {'embeddings': codes, 'embedding_scales': scales}
+    new_rows['cluster_labels'] = cluster_labels.astype(np.int32)
+
+    for name, rows in new_rows.items():
+        entry = manifest['files'][name]
+        if 'segments' not in entry:
+            # Manifests written before segmented checksums hash the whole file; hash the current data once
+            entry.update(_file_entry(artifact_dir, entry['path']))
+            entry.pop('sha256', None)
+        entry['segments'].append(_append_npy_rows(os.path.join(artifact_dir, entry['path']), rows))
+
+    manifest['rows'] += len(embeddings)
+    manifest['updated_at'] = datetime.now(timezone.utc).isoformat()
+    _write_manifest(artifact_dir, manifest)
+    logger.info(f"Artifacts in {artifact_dir} now hold {manifest['rows']} rows.")
+    return manifest
+
+def verify_artifacts(artifact_dir: str) -> None:
+    """
+    Check the artifact files against the checksums in the manifest.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Directory written by `save_artifacts`.
+
+    Raises
+    ------
+    ValueError
+        If a file does not match its recorded checksum.
+    """
+    manifest = read_manifest(artifact_dir)
+    for name, entry in manifest['files'].items():
+        filepath = os.path.join(artifact_dir, entry['path'])
+        if 'segments' in entry:
+            matches = all(_sha256(filepath, segment['offset'], segment['length']) == segment['sha256']
+                          for segment in entry['segments'])
+        else:
+            matches = _sha256(filepath) == entry['sha256']
+        if not matches:
+            raise ValueError(f"Checksum mismatch for {name} in {artifact_dir}.")
+    logger.info(f"Artifacts in {artifact_dir} match their checksums.")
+
+def load_artifacts(artifact_dir: str, mmap: bool = True, verify: bool = False) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Load embeddings and cluster labels saved with `save_artifacts`.
+
+    With `mmap=True` (the default) the arrays are read-only memory maps: nothing is
+    copied into process memory and several processes on one machine share the
+    same page cache.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Directory written by `save_artifacts`.
+    mmap : bool, optional (default=True)
+        Memory-map the arrays instead of reading them into memory.
+    verify : bool, optional (default=False)
+        Check file checksums first (reads every byte once).
+
+    Returns
+    -------
+    embeddings : np.ndarray of shape (rows, dim) or QuantizedEmbeddings
+        L2-normalised embeddings (float32 or float16 array, or `QuantizedEmbeddings`
+        wrapping the int8 codes and their scales).
+    cluster_labels : np.ndarray of shape (rows,)
+        int32 cluster labels.
+    manifest : dict
+        The artifact manifest.
+    """
+    manifest = read_manifest(artifact_dir)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version {manifest.get('format_version')} in {artifact_dir}.")
+    if verify:
+        verify_artifacts(artifact_dir)
+
+    mmap_mode = 'r' if mmap else None
+    logger.info(f"Loading artifacts from {artifact_dir} (mmap={mmap}).")
+    embeddings = np.load(os.path.join(artifact_dir, manifest['files']['embeddings']['path']), mmap_mode=mmap_mode)
+    if 'embedding_scales' in manifest['files']:
+        scales = np.load(os.path.join(artifact_dir, manifest['files']['embedding_scales']['path']))
+        embeddings = QuantizedEmbeddings(embeddings, scales)
+    cluster_labels = np.load(os.path.join(artifact_dir, manifest['files']['cluster_labels']['path']), mmap_mode=mmap_mode)
+    if embeddings.shape != (manifest['rows'], manifest['dim']) or len(cluster_labels) != manifest['rows']:
+        raise ValueError(f"Artifacts in {artifact_dir} do not match their manifest.")
+    return embeddings, cluster_labels, manifest
+
+def migrate_pickle_artifacts(embeddings_pkl: str, labels_pkl: str, artifact_dir: str,
+                             model_name: str = 'all-MiniLM-L6-v2', dtype: str = 'float32') -> Dict:
+    """
+    Convert the legacy `saved_embeddings.pkl` / `saved_cluster_labels.pkl` pair into an artifact directory.
+
+    Parameters
+    ----------
+    embeddings_pkl : str
+        Path to the pickled embeddings.
+    labels_pkl : str
+        Path to the pickled cluster labels.
+    artifact_dir : str
+        Output artifact directory.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the model that produced the embeddings.
+    dtype : str, optional (default='float32')
+        Storage dtype of the embeddings.
+
+    Returns
+    -------
+    dict
+        The written manifest.
+    """
+    logger.info(f"Migrating {embeddings_pkl} and {labels_pkl} to {artifact_dir}.")
+    with open(embeddings_pkl, 'rb') as f:
+        embeddings = pickle.load(f)
+    with open(labels_pkl, 'rb') as f:
+        cluster_labels = pickle.load(f)
+    manifest = save_artifacts(artifact_dir, embeddings, cluster_labels, model_name=model_name, dtype=dtype)
+    verify_artifacts(artifact_dir)
+    return manifest
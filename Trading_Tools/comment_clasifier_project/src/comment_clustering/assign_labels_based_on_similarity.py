@@ -1,12 +1,39 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import json
 import pandas as pd
+from src.comment_clustering.similarity_search import DEFAULT_BLOCK_SIZE
+from src.comment_clustering.quantization import build_exact_search
+from src.logs.logger import logger  # Import the logger
 
-def assign_labels_based_on_similarity(df_new, new_embeddings, existing_embeddings, existing_labels, cluster_to_label, threshold):
+NOT_REVIEWED_LABEL = "Not Reviewed / Evidenced"
+# Every spelling of "no reviewed label": the fallback above, the 'Not_Reviewed_or_Evidenced' entry of
+# cluster_label_mapping and the 'Unknown' the base pipeline gives unmapped clusters
+NOT_REVIEWED_ALIASES = frozenset({NOT_REVIEWED_LABEL, "Not_Reviewed_or_Evidenced", "Unknown"})
+
+def is_empty_comment(comments: pd.Series) -> np.ndarray:
+    """
+    Flag comments that are missing, blank, or the literal string 'nan'.
+
+    Parameters
+    ----------
+    comments : pd.Series
+        Raw comment column.
+
+    Returns
+    -------
+    np.ndarray of bool
+        True where the comment should not be scored.
+    """
+    as_text = comments.astype(str)
+    return (comments.isna() | (as_text.str.strip() == "") | (as_text == "nan")).to_numpy()
+
+def assign_labels_based_on_similarity(df_new, new_embeddings, existing_embeddings, existing_labels, cluster_to_label, threshold,
+                                      block_size=DEFAULT_BLOCK_SIZE, search=None):
     """
     Assign labels to new comments based on cosine similarity to existing comment embeddings.
-    
+
+    When `df_new` has a 'cleaned_comment' column, rows with the same cleaned text are
+    scored once and the label is copied back to each of them.
+
     Parameters:
     - df_new (pd.DataFrame): DataFrame containing the new comments and other metadata.
     - new_embeddings (np.ndarray): Embeddings of the new comments.
@@ -14,35 +41,46 @@ def assign_labels_based_on_similarity(df_new, new_embeddings, existing_embedding
     - existing_labels (list): Labels of the existing comments (corresponding to clusters).
     - cluster_to_label (dict): A dictionary that maps cluster labels to human-readable labels.
     - threshold (float): Cosine similarity threshold to classify as 'Not Reviewed / Evidenced' if below this value.
-    
+    - block_size (int): Number of new comments scored per matrix multiply.
+    - search (object, optional): A prebuilt search (e.g. an IVF index from `ann_index`) to query instead of
+      scanning `existing_embeddings` exactly.
+
     Returns:
     - new_labels (list): List of labels assigned to new comments.
     """
-    
-    # Initialize list to store new labels
-    new_labels = []
-
-    # Iterate over new embeddings and assign labels based on cosine similarity
-    for new_embedding, comment in zip(new_embeddings, df_new['comment']):
-        # Check if the comment is empty or NaN
-        if pd.isna(comment) or comment.strip() == "" or comment=="nan":
-            new_label = "Not Reviewed / Evidenced"
-        else:
-            # Calculate cosine similarity between the new embedding and existing embeddings
-            cos_similarity = cosine_similarity([new_embedding], existing_embeddings)
-            
-            # Find the index of the most similar existing embedding
-            closest_idx = np.argmax(cos_similarity)
-            
-            # If the maximum cosine similarity is below the threshold, classify as 'Not Reviewed / Evidenced'
-            if cos_similarity[0][closest_idx] < threshold:
-                new_label = "Not Reviewed / Evidenced"
-            else:
-                # Otherwise, use the cluster label for the closest embedding
-                closest_cluster = existing_labels[closest_idx]
-                new_label = cluster_to_label.get(str(closest_cluster), "Not Reviewed / Evidenced")
-        
-        # Append the assigned label to the new_labels list
-        new_labels.append(new_label)
-
-    return new_labels
+
+    # Every comment starts as 'Not Reviewed / Evidenced'; only non-empty ones are scored
+    new_labels = np.full(len(df_new), NOT_REVIEWED_LABEL, dtype=object)
+    rows_to_score = np.flatnonzero(~is_empty_comment(df_new['comment']))
+    if len(rows_to_score) == 0:
+        return new_labels.tolist()
+
+    # Rows sharing a cleaned comment share an embedding, so score each distinct one once
+    if 'cleaned_comment' in df_new.columns:
+        row_to_unique, unique_comments = pd.factorize(
+            df_new['cleaned_comment'].iloc[rows_to_score], use_na_sentinel=False
+        )
+        unique_rows = rows_to_score[np.unique(row_to_unique, return_index=True)[1]]
+    else:
+        row_to_unique = np.arange(len(rows_to_score))
+        unique_rows = rows_to_score
+    logger.info(
+        f"Similarity dedup: {len(rows_to_score)} comments, {len(unique_rows)} unique "
+        f"(dedup ratio {len(rows_to_score) / len(unique_rows):.2f}x)."
+    )
+
+    # Score the distinct comments against the normalised reference set in blocks
+    if search is None:
+        search = build_exact_search(existing_embeddings, block_size=block_size)
+    closest_idx, closest_score = search.search(np.asarray(new_embeddings)[unique_rows])
+
+    # Comments at or above the threshold take the label of their closest cluster
+    closest_clusters = np.asarray(existing_labels)[closest_idx]
+    unique_labels = np.array([
+        cluster_to_label.get(str(cluster), NOT_REVIEWED_LABEL) if score >= threshold else NOT_REVIEWED_LABEL
+        for cluster, score in zip(closest_clusters, closest_score)
+    ], dtype=object)
+
+    # Scatter the per-comment labels back to every row
+    new_labels[rows_to_score] = unique_labels[row_to_unique]
+    return new_labels.tolist()
@@ -1,28 +1,104 @@
 import json
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 from src.logs.logger import logger  # Import logger
 
+NOT_REVIEWED_COMMENT = '[Not Reviewed / Evidenced]'
+
+def first_appearance_codes(columns: pd.DataFrame) -> np.ndarray:
+    """
+    Number the distinct rows of `columns` in order of first appearance.
+
+    Missing values are treated as one value, like the keys of a nested dictionary.
+
+    Parameters
+    ----------
+    columns : pandas.DataFrame
+        The key columns.
+
+    Returns
+    -------
+    np.ndarray of shape (n_rows,)
+        0 for every row equal to the first row, 1 for the next distinct row, and so on.
+    """
+    codes = np.zeros(len(columns), dtype=np.int64)
+    for name in columns:
+        column_codes, uniques = pd.factorize(columns[name], use_na_sentinel=False)
+        codes = pd.factorize(codes * (len(uniques) + 1) + column_codes)[0]
+    return codes
+
+def nest_records(keys: pd.DataFrame, dates: list, comments: list, labels: list) -> dict:
+    """
+    Group comment records into the nested {source: {curve: {grouping_var: [entries]}}} hierarchy.
+
+    Keys are ordered by first appearance at every level and each leaf keeps the row
+    order, exactly as appending the rows one by one to nested dictionaries would.
+
+    Parameters
+    ----------
+    keys : pandas.DataFrame
+        Three columns: source, curve and grouping variable.
+    dates : list
+        Formatted date of each row.
+    comments : list
+        Comment of each row.
+    labels : list
+        Standard label of each row.
+
+    Returns
+    -------
+    dict
+        The nested hierarchy.
+    """
+    source_col, curve_col, grouping_col = keys.columns
+    source_codes = first_appearance_codes(keys[[source_col]])
+    curve_codes = first_appearance_codes(keys[[source_col, curve_col]])
+    key_codes = first_appearance_codes(keys)
+    order = np.lexsort((np.arange(len(keys)), key_codes, curve_codes, source_codes))
+    boundaries = np.flatnonzero(np.diff(key_codes[order], prepend=-1, append=-1))
+
+    sources, curves, grouping_vars = (keys[col].tolist() for col in keys.columns)
+    nested_dict = {}
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        first = order[start]
+        curve_dict = nested_dict.setdefault(sources[first], {}).setdefault(curves[first], {})
+        curve_dict[grouping_vars[first]] = [
+            {'date': dates[i], 'comment': comments[i], 'standard_label': labels[i]}
+            for i in order[start:stop]
+        ]
+    return nested_dict
+
 def build_hierarchy(df: pd.DataFrame) -> dict:
     """
     Build a nested dictionary hierarchy from a pandas DataFrame.
-    ...
+
+    Works on whole columns: empty comments are replaced, dates are formatted with
+    `dt.strftime` and the rows are grouped by (source, curve_list, grouping_var).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Rows with 'source', 'curve_list', 'grouping_var', 'date' (datetime),
+        'comment' and 'standard_label' columns.
+
+    Returns
+    -------
+    dict
+        `{source: {curve_list: {grouping_var: [{'date', 'comment', 'standard_label'}, ...]}}}`,
+        with dates as 'YYYY-MM-DD' (None when missing) and empty comments as
+        '[Not Reviewed / Evidenced]'.
     """
-    logger.info("Starting hierarchy building.")
-    nested_dict = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-
-    for idx, row in df.iterrows():
-        logger.info(f"Processing row {idx}.")
-        comment = row['comment'] if pd.notna(row['comment']) and row['comment'].strip() != '' else '[Not Reviewed / Evidenced]'
-        source = row['source']
-        curve = row['curve_list']
-        grouping_var = row['grouping_var']
-
-        nested_dict[source][curve][grouping_var].append({
-            'date': row['date'].strftime('%Y-%m-%d') if pd.notna(row['date']) else None,
-            'comment': comment,
-            'standard_label': row['standard_label']
-        })
+    logger.info(f"Starting hierarchy building for {len(df)} rows.")
+    comments = df['comment']
+    has_comment = comments.notna() & (comments.astype(str).str.strip() != '')
+    dates = df['date'].dt.strftime('%Y-%m-%d').astype(object)
+
+    nested_dict = nest_records(
+        df[['source', 'curve_list', 'grouping_var']],
+        dates=dates.where(df['date'].notna(), None).tolist(),
+        comments=comments.astype(object).where(has_comment, NOT_REVIEWED_COMMENT).tolist(),
+        labels=df['standard_label'].tolist()
+    )
     logger.info("Hierarchy building completed.")
     return nested_dict
 
@@ -1,13 +1,91 @@
-from sklearn.cluster import AgglomerativeClustering
+import numpy as np
+from typing import Optional
+from src.comment_clustering.merge_tree import MergeTree
+from src.config.config import get_clustering_settings
 from src.logs.logger import logger  # Import logger
 
-def cluster_embeddings(embeddings, distance_threshold=1):
+CLUSTERING_BACKENDS = ('agglomerative', 'birch', 'knn_graph')
+
+def _agglomerative(embeddings, distance_threshold, connectivity=None):
+    from sklearn.cluster import AgglomerativeClustering
+    clustering_model = AgglomerativeClustering(n_clusters=None, distance_threshold=distance_threshold,
+                                               connectivity=connectivity)
+    labels = clustering_model.fit_predict(embeddings)
+    # The full tree and merge distances are computed anyway when a distance threshold is set
+    return labels, MergeTree(clustering_model.children_, clustering_model.distances_,
+                             distance_threshold=distance_threshold)
+
+def _birch(embeddings, distance_threshold, birch_threshold, birch_branching_factor):
+    # Pre-aggregate into CF-tree sub-clusters, then merge the sub-cluster centroids
+    from sklearn.cluster import Birch
+    birch = Birch(threshold=birch_threshold, branching_factor=birch_branching_factor, n_clusters=None)
+    subcluster_of_row = birch.fit_predict(embeddings)
+    centroids = birch.subcluster_centers_
+    logger.info(f"BIRCH reduced {len(embeddings)} embeddings to {len(centroids)} sub-clusters.")
+    if len(centroids) < 2:
+        return np.zeros(len(embeddings), dtype=np.intp), None
+    cluster_of_subcluster, tree = _agglomerative(centroids, distance_threshold)
+    tree.leaf_of_row = np.asarray(subcluster_of_row, dtype=np.intp)
+    return cluster_of_subcluster[subcluster_of_row], tree
+
+def _knn_graph(embeddings, distance_threshold, n_neighbors):
+    # Only merges along k-nearest-neighbour edges are considered, so memory is O(n * k)
+    from sklearn.neighbors import kneighbors_graph
+    n_neighbors = min(n_neighbors, len(embeddings) - 1)
+    connectivity = kneighbors_graph(embeddings, n_neighbors=n_neighbors, include_self=False)
+    return _agglomerative(embeddings, distance_threshold, connectivity=connectivity)
+
+def cluster_embeddings(embeddings, distance_threshold=1, backend: Optional[str] = None, return_tree: bool = False):
     """
     Perform agglomerative clustering on a set of embeddings.
-    ...
+
+    The backend is taken from the `clustering` config section unless given:
+
+    - 'agglomerative': Ward agglomerative clustering on the full matrix (quadratic memory).
+    - 'birch': a BIRCH CF-tree first groups the embeddings into sub-clusters of radius
+      `birch_threshold`; Ward agglomerative clustering then runs on the sub-cluster
+      centroids and every embedding takes the cluster of its sub-cluster.
+    - 'knn_graph': Ward agglomerative clustering restricted to merges along a
+      `n_neighbors`-nearest-neighbour graph.
+
+    All backends stop merging at `distance_threshold` on the Ward linkage distance.
+    Cluster ids are backend-specific, so `cluster_label_mapping` has to be reviewed
+    after switching backend.
+
+    Parameters
+    ----------
+    embeddings : numpy.ndarray of shape (n_samples, dim)
+        The embeddings to cluster.
+    distance_threshold : float, optional (default=1)
+        Linkage distance above which clusters are not merged.
+    backend : str, optional
+        One of 'agglomerative', 'birch' or 'knn_graph'. Defaults to the config.
+    return_tree : bool, optional (default=False)
+        Also return the merge tree, so the clustering can be cut again at other thresholds.
+
+    Returns
+    -------
+    numpy.ndarray of shape (n_samples,)
+        Cluster label of each embedding.
+    MergeTree or None
+        Only with `return_tree`: the full merge tree (None when BIRCH found a single sub-cluster).
     """
-    logger.info("Starting embedding clustering.")
-    clustering_model = AgglomerativeClustering(n_clusters=None, distance_threshold=distance_threshold)
-    cluster_labels = clustering_model.fit_predict(embeddings)
+    settings = get_clustering_settings()
+    backend = backend or settings['backend']
+    if backend not in CLUSTERING_BACKENDS:
+        raise ValueError(f"Unknown clustering backend '{backend}'. Expected one of {CLUSTERING_BACKENDS}.")
+
+    logger.info(f"Starting embedding clustering with the '{backend}' backend.")
+    if backend == 'birch':
+        cluster_labels, tree = _birch(embeddings, distance_threshold,
+                                settings['birch_threshold'], settings['birch_branching_factor'])
+    elif backend == 'knn_graph':
+        cluster_labels, tree = _knn_graph(embeddings, distance_threshold, settings['n_neighbors'])
+    else:
+        cluster_labels, tree = _agglomerative(embeddings, distance_threshold)
     logger.info("Embedding clustering completed.")
+    if return_tree:
+        if tree is not None:
+            tree.backend = backend
+        return cluster_labels, tree
     return cluster_labels
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+from typing import Iterator, List, Optional
+import pandas as pd
+from src.config.config import get_dataset_store_settings
+from src.logs.logger import logger  # Import the logger
+
+DATASET_COLUMNS = ['source', 'date', 'curve_list', 'comment', 'grouping_var']
+KEY_COLUMNS = ['source', 'curve_list', 'grouping_var', 'date', 'comment']
+ROW_KEY = 'row_key'
+UNDATED_PARTITION = 'undated'
+MANIFEST_FILE = 'manifest.json'
+_PARTITION_PATTERN = re.compile(r'^date=(\d{4}-\d{2}-\d{2}|' + UNDATED_PARTITION + r')$')
+# Separates key fields; missing values get their own marker so they differ from ''
+_KEY_SEPARATOR = '\x1f'
+_MISSING = '\x00'
+
+def _text_value(value) -> str:
+    # Integral numbers read as floats (a numeric column with gaps) are keyed without '.0'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def _text(values: pd.Series) -> pd.Series:
+    values = values.astype(object)
+    return values.map(_text_value, na_action='ignore').where(values.notna(), None)
+
+def normalize_dataset_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bring raw comment rows into the form the dataset store keeps them in.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Rows with the `DATASET_COLUMNS` columns. 'date' may be datetimes or strings;
+        strings are parsed as the pipelines parse `data.csv` (mixed formats, day first).
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `DATASET_COLUMNS` columns ('date' as datetime64, NaT when missing or unparseable,
+        text columns as str or None) plus the deterministic `ROW_KEY`.
+    """
+    rows = pd.DataFrame({column: _text(df[column]) for column in DATASET_COLUMNS if column != 'date'})
+    dates = df['date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='mixed', dayfirst=True, errors='coerce')
+    rows['date'] = dates.dt.normalize().to_numpy()
+    rows = rows[DATASET_COLUMNS]
+    rows[ROW_KEY] = row_keys(rows)
+    return rows.reset_index(drop=True)
+
+def row_keys(rows: pd.DataFrame) -> pd.Series:
+    """
+    Deterministic key of each row over (source, curve_list, grouping_var, date, comment).
+
+    Parameters
+    ----------
+    rows : pandas.DataFrame
+        Normalised rows (see `normalize_dataset_rows`).
+
+    Returns
+    -------
+    pandas.Series
+        32-character hex BLAKE2b digest per row; equal rows always get the same key.
+    """
+    parts = [rows['date'].dt.strftime('%Y-%m-%d').fillna(_MISSING) if column == 'date'
+             else rows[column].fillna(_MISSING).astype(str)
+             for column in KEY_COLUMNS]
+    joined = parts[0].str.cat(parts[1:], sep=_KEY_SEPARATOR)
+    return joined.map(lambda text: hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest())
+
+def _partition_name(dates: pd.Series) -> pd.Series:
+    return ('date=' + dates.dt.strftime('%Y-%m-%d')).fillna('date=' + UNDATED_PARTITION)
+
+class DatasetStore:
+    """
+    Date-partitioned, deduplicated comment dataset backed by Parquet files.
+
+    Rows live in `<root>/date=YYYY-MM-DD/part-NNNNN.parquet` (rows without a valid date in
+    `date=undated`). Every row carries a deterministic key over (source, curve_list,
+    grouping_var, date, comment), so `upsert` is idempotent: rows already stored are
+    skipped and appending the same file twice adds nothing. An append only writes one
+    new part file per date it touches; existing files are never rewritten. The row
+    count is kept in `<root>/manifest.json`.
+
+    Parameters
+    ----------
+    root : str
+        Dataset directory. Created if it does not exist.
+    """
+
+    def __init__(self, root: str):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+
+    def partitions(self) -> List[str]:
+        """
+        Return the partition directory names, dated ones in date order, then 'date=undated'.
+        """
+        names = [name for name in os.listdir(self.root)
+                 if _PARTITION_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name))]
+        return sorted(names, key=lambda name: (name.endswith(UNDATED_PARTITION), name))
+
+    def _part_files(self, partition: str) -> List[str]:
+        directory = os.path.join(self.root, partition)
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if name.startswith('part-') and name.endswith('.parquet')]
+
+    def _read_partition(self, partition: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        files = self._part_files(partition)
+        if not files:
+            return pd.DataFrame(columns=columns or DATASET_COLUMNS + [ROW_KEY])
+        return pd.concat([pd.read_parquet(path, columns=columns) for path in files], ignore_index=True)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def _write_manifest(self, n_rows: int) -> None:
+        path = self._manifest_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'rows': n_rows}, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self) -> int:
+        path = self._manifest_path()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)['rows']
+        # Stores written before the manifest existed are counted once
+        n_rows = sum(len(self._read_partition(partition, columns=[ROW_KEY])) for partition in self.partitions())
+        self._write_manifest(n_rows)
+        return n_rows
+
+    def upsert(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add the rows of `df` that are not stored yet.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Rows with the `DATASET_COLUMNS` columns.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The rows that were added (normalised, with `ROW_KEY`), in input order.
+            Rows already in the store, and repeats within `df`, are not returned.
+        """
+        stored = len(self)
+        rows = normalize_dataset_rows(df)
+        rows = rows[~rows[ROW_KEY].duplicated()]
+        partition_names = _partition_name(rows['date'])
+
+        added = []
+        for partition in pd.unique(partition_names):
+            new_rows = rows[(partition_names == partition).to_numpy()]
+            directory = os.path.join(self.root, partition)
+            if os.path.isdir(directory):
+                existing_keys = self._read_partition(partition, columns=[ROW_KEY])[ROW_KEY]
+                new_rows = new_rows[~new_rows[ROW_KEY].isin(existing_keys)]
+            if new_rows.empty:
+                continue
+            os.makedirs(directory, exist_ok=True)
+            part_path = os.path.join(directory, f"part-{len(self._part_files(partition)):05d}.parquet")
+            new_rows.to_parquet(part_path + '.tmp', index=False)
+            os.replace(part_path + '.tmp', part_path)
+            added.append(new_rows)
+
+        partitions_written = len(added)
+        added = pd.concat(added).sort_index() if added else rows.iloc[:0]
+        if partitions_written:
+            self._write_manifest(stored + len(added))
+        logger.info(f"Dataset upsert into {self.root}: {len(added)} new rows, {len(df) - len(added)} already stored "
+                    f"or repeated, {partitions_written} partitions written.")
+        return added.reset_index(drop=True)
+
+    def iter_partitions(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield the rows of each partition in the date range, oldest first.
+
+        Parameters
+        ----------
+        start_date, end_date : str, optional
+            Inclusive 'YYYY-MM-DD' bounds. Undated rows are only included when neither is given.
+        columns : list of str, optional
+            Columns to read. Defaults to `DATASET_COLUMNS`.
+
+        Yields
+        ------
+        pandas.DataFrame
+            One partition, rows in insertion order.
+        """
+        columns = columns or DATASET_COLUMNS
+        ranged = start_date is not None or end_date is not None
+        for partition in self.partitions():
+            day = partition[len('date='):]
+            if day == UNDATED_PARTITION:
+                if ranged:
+                    continue
+            elif (start_date is not None and day < str(pd.Timestamp(start_date).date())) or \
+                    (end_date is not None and day > str(pd.Timestamp(end_date).date())):
+                continue
+            yield self._read_partition(partition, columns=columns)
+
+    def read(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Read the rows in a date range (see `iter_partitions`) into one DataFrame.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The requested columns, ordered by date partition and insertion order.
+        """
+        frames = list(self.iter_partitions(start_date, end_date, columns))
+        if not frames:
+            return pd.DataFrame(columns=columns or DATASET_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def import_csv(self, filepath: str) -> pd.DataFrame:
+        """
+        Upsert the rows of a legacy `data.csv`.
+
+        Parameters
+        ----------
+        filepath : str
+            CSV with at least the `DATASET_COLUMNS` columns.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The rows that were added.
+        """
+        logger.info(f"Importing {filepath} into dataset store {self.root}.")
+        return self.upsert(pd.read_csv(filepath))
+
+def is_dataset_store(path: str) -> bool:
+    """
+    Whether `path` is a dataset store directory rather than a CSV file.
+    """
+    return os.path.isdir(path)
+
+def open_dataset_store(legacy_csv: Optional[str] = None) -> DatasetStore:
+    """
+    Open the dataset store configured in the `dataset_store` config section.
+
+    When the store is empty and `legacy_csv` exists, that CSV is imported once so existing
+    training data is kept.
+
+    Parameters
+    ----------
+    legacy_csv : str, optional
+        Path to the existing `data.csv`.
+
+    Returns
+    -------
+    DatasetStore
+        The opened store.
+    """
+    settings = get_dataset_store_settings()
+    logger.info(f"Opening dataset store at {settings['path']}.")
+    store = DatasetStore(settings['path'])
+    if not store.partitions() and legacy_csv and os.path.exists(legacy_csv):
+        store.import_csv(legacy_csv)
+    return store
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from src.config.config import get_embedding_cache_settings
+from src.logs.logger import logger  # Import the logger
+
+# SQLite caps the number of bound parameters per statement, so lookups are chunked
+_SQL_CHUNK = 500
+
+def cache_key(model_name: str, text: str) -> str:
+    """
+    Return the content address of an embedding: a hash of the model name and cleaned text.
+
+    Parameters
+    ----------
+    model_name : str
+        Name of the SentenceTransformer model that produced the embedding.
+    text : str
+        The cleaned comment text that was encoded.
+
+    Returns
+    -------
+    str
+        Hex SHA-256 digest identifying the (model, text) pair.
+    """
+    return hashlib.sha256(f"{model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    On-disk, size-bounded LRU cache of sentence embeddings backed by SQLite.
+
+    Entries are keyed by `cache_key(model_name, text)`. Every hit refreshes the
+    entry's access time, and once the cache holds more than `max_entries` rows the
+    least recently used ones are evicted. The SQLite file can be shared by several
+    pipelines and processes.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the SQLite cache file. Created if it does not exist.
+    max_entries : int
+        Maximum number of embeddings kept in the cache.
+    """
+
+    def __init__(self, filepath: str, max_entries: int):
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filepath = filepath
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(filepath)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        # Upper bound of the row count: counted once here and raised by every `put_many`
+        self._rows = len(self)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model_name: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings for a list of texts.
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model the embeddings must come from.
+        texts : list of str
+            Cleaned comment texts.
+
+        Returns
+        -------
+        dict
+            Mapping from text to its cached float32 embedding, for the texts that were found.
+        """
+        keys = {cache_key(model_name, text): text for text in texts}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), _SQL_CHUNK):
+            chunk = key_list[start:start + _SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, dim, vector in rows:
+                found[keys[key]] = np.frombuffer(vector, dtype=np.float32, count=dim)
+            if rows:
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_access = ? WHERE key IN ({','.join('?' * len(rows))})",
+                    [time.time_ns()] + [row[0] for row in rows]
+                )
+        self._conn.commit()
+        return found
+
+    def put_many(self, model_name: str, texts: List[str], embeddings: np.ndarray) -> None:
+        """
+        Store embeddings for a list of texts and evict the least recently used overflow.
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model that produced the embeddings.
+        texts : list of str
+            Cleaned comment texts.
+        embeddings : np.ndarray of shape (len(texts), dim)
+            Embeddings aligned with `texts`.
+        """
+        now = time.time_ns()
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, dim, vector, last_access) VALUES (?, ?, ?, ?)",
+            ((cache_key(model_name, text), len(vector), vector.tobytes(), now)
+             for text, vector in zip(texts, embeddings))
+        )
+        self._rows += len(texts)
+        if self._rows > self.max_entries:
+            # Replaced keys and other processes make the running count inexact, so recount before evicting
+            self._rows = len(self)
+            overflow = self._rows - self.max_entries
+            if overflow > 0:
+                logger.info(f"Evicting {overflow} least recently used entries from embedding cache.")
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (overflow,)
+                )
+                self._rows = self.max_entries
+        self._conn.commit()
+
+def open_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Open the shared embedding cache configured in the `embedding_cache` config section.
+
+    Returns
+    -------
+    EmbeddingCache or None
+        The cache, or None when caching is disabled.
+    """
+    settings = get_embedding_cache_settings()
+    if not settings['enabled']:
+        return None
+    logger.info(f"Opening embedding cache at {settings['path']}.")
+    return EmbeddingCache(settings['path'], settings['max_entries'])
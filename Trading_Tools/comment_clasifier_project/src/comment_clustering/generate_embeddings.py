@@ -1,15 +1,180 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
 import numpy as np
+import pandas as pd
+from src.comment_clustering.embedding_cache import open_embedding_cache
+from src.config.config import get_encoding_settings
 from src.logs.logger import logger  # Import logger
+from src.logs.tracing import count
 
-def generate_embeddings(comments: List[str], model_name: str = 'all-MiniLM-L6-v2') -> np.ndarray:
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+@lru_cache(maxsize=None)
+def load_model(model_name: str = 'all-MiniLM-L6-v2') -> "SentenceTransformer":
+    """
+    Load a SentenceTransformer model once per process and reuse it on later calls.
+
+    Parameters
+    ----------
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+
+    Returns
+    -------
+    SentenceTransformer
+        The loaded (and cached) model.
+    """
+    # Imported here so modules that only read saved artifacts never load torch
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading SentenceTransformer model '{model_name}'.")
+    return SentenceTransformer(model_name)
+
+def length_buckets(texts: List[str], bucket_size: int) -> List[np.ndarray]:
+    """
+    Split text positions into buckets of texts with similar lengths.
+
+    Parameters
+    ----------
+    texts : List[str]
+        The texts.
+    bucket_size : int
+        Texts per bucket.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        Positions into `texts`, shortest texts first; every bucket but the last holds
+        `bucket_size` positions.
+    """
+    order = np.argsort(np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts)), kind='stable')
+    return [order[start:start + bucket_size] for start in range(0, len(order), bucket_size)]
+
+def _init_encoder_worker(model_name: str, threads: int) -> None:
+    import torch
+    torch.set_num_threads(threads)
+    load_model(model_name)
+
+def _encode_bucket(model_name: str, texts: List[str], batch_size: int) -> np.ndarray:
+    return np.asarray(load_model(model_name).encode(texts, batch_size=batch_size, show_progress_bar=False),
+                      dtype=np.float32)
+
+def encode_texts(texts: List[str], model_name: str = 'all-MiniLM-L6-v2', n_workers: Optional[int] = None,
+                 batch_size: Optional[int] = None, bucket_size: Optional[int] = None,
+                 parallel_min_texts: Optional[int] = None) -> np.ndarray:
+    """
+    Encode texts with the SentenceTransformer model, in a pool of encoder processes when there are many.
+
+    With fewer than `parallel_min_texts` texts, or one worker, the texts are encoded
+    in-process with `model.encode` (which already orders each call by length). Otherwise
+    the texts are sorted into `length_buckets` of `bucket_size`, so every forward pass
+    pads to a similar length, and the buckets are encoded by `n_workers` processes that
+    each load the model once and use their share of the CPU threads. Embeddings are
+    returned in the order of `texts`.
+
+    Parameters
+    ----------
+    texts : List[str]
+        The texts to encode.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+    n_workers : int, optional
+        Encoder processes. Defaults to `encoding.n_workers` in config.json (None for one per CPU).
+    batch_size : int, optional
+        Texts per forward pass. Defaults to `encoding.batch_size`.
+    bucket_size : int, optional
+        Texts per worker task. Defaults to `encoding.bucket_size`.
+    parallel_min_texts : int, optional
+        Fewest texts encoded in the pool. Defaults to `encoding.parallel_min_texts`.
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(texts), dim)
+        The embeddings, in input order.
+    """
+    settings = get_encoding_settings()
+    n_workers = n_workers if n_workers is not None else (settings['n_workers'] or os.cpu_count() or 1)
+    batch_size = batch_size or settings['batch_size']
+    bucket_size = bucket_size or settings['bucket_size']
+    parallel_min_texts = parallel_min_texts if parallel_min_texts is not None else settings['parallel_min_texts']
+
+    buckets = length_buckets(texts, bucket_size)
+    if n_workers <= 1 or len(buckets) < 2 or len(texts) < parallel_min_texts:
+        return load_model(model_name).encode(texts, batch_size=batch_size, show_progress_bar=True)
+
+    n_workers = min(n_workers, len(buckets))
+    threads = settings['threads_per_worker'] or max((os.cpu_count() or 1) // n_workers, 1)
+    logger.info(f"Encoding {len(texts)} texts in {len(buckets)} length buckets on {n_workers} processes "
+                f"({threads} threads each, batch size {batch_size}).")
+    embeddings = None
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context(settings['start_method']),
+                             initializer=_init_encoder_worker, initargs=(model_name, threads)) as pool:
+        futures = [(positions, pool.submit(_encode_bucket, model_name, [texts[i] for i in positions], batch_size))
+                   for positions in buckets]
+        for positions, future in futures:
+            bucket_embeddings = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), bucket_embeddings.shape[1]), dtype=np.float32)
+            embeddings[positions] = bucket_embeddings
+    return embeddings
+
+def generate_embeddings(comments: List[str], model_name: str = 'all-MiniLM-L6-v2',
+                        use_cache: Optional[bool] = None) -> np.ndarray:
     """
     Generate embeddings for a list of textual comments using a pre-trained SentenceTransformer model.
-    ...
+
+    Duplicate comments are collapsed first so every distinct string is encoded once.
+    Embeddings are then looked up in the shared on-disk embedding cache (see
+    `embedding_cache`); only cache misses are sent to the model, and they are
+    written back to the cache afterwards. Encoding goes through `encode_texts`, so large
+    batches of misses are encoded in parallel, length-bucketed worker processes when
+    `encoding.n_workers` is above 1.
+
+    Parameters
+    ----------
+    comments : List[str]
+        The cleaned comments to encode.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+    use_cache : bool, optional
+        Set to False to bypass the cache. Defaults to the `embedding_cache` config.
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(comments), dim)
+        The comment embeddings, in input order.
     """
     logger.info(f"Starting embedding generation using model '{model_name}'.")
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(comments, show_progress_bar=True)
+
+    # Encode each distinct comment once and scatter the vectors back to every row
+    row_to_unique, unique_comments = pd.factorize(pd.Series(comments, dtype=object), use_na_sentinel=False)
+    unique_comments = unique_comments.tolist()
+    logger.info(
+        f"Embedding dedup: {len(comments)} comments, {len(unique_comments)} unique "
+        f"(dedup ratio {len(comments) / max(len(unique_comments), 1):.2f}x)."
+    )
+
+    cache = open_embedding_cache() if use_cache is not False else None
+    if cache is None:
+        unique_embeddings = encode_texts(unique_comments, model_name)
+    else:
+        with cache:
+            cached = cache.get_many(model_name, unique_comments)
+            missing = [comment for comment in unique_comments if comment not in cached]
+            logger.info(f"Embedding cache: {len(unique_comments) - len(missing)} hits, {len(missing)} misses.")
+            count('embedding_cache.hits', len(unique_comments) - len(missing))
+            count('embedding_cache.misses', len(missing))
+
+            if missing:
+                missing_embeddings = encode_texts(missing, model_name)
+                cache.put_many(model_name, missing, missing_embeddings)
+                cached.update(zip(missing, missing_embeddings))
+
+        unique_embeddings = np.array([cached[comment] for comment in unique_comments], dtype=np.float32)
+
+    embeddings = np.asarray(unique_embeddings)[row_to_unique]
     logger.info("Embedding generation completed.")
     return embeddings
@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+from typing import Dict, Optional
+import pandas as pd
+from src.comment_clustering.build_hierarchy import nest_records
+from src.config.config import get_hierarchy_store_settings
+from src.logs.logger import logger  # Import the logger
+
+HIERARCHY_COLUMNS = ['source', 'curve_list', 'grouping_var', 'date', 'comment', 'standard_label']
+
+def normalize_hierarchy_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bring comment rows into the form the hierarchy store keeps them in.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Rows with the `HIERARCHY_COLUMNS` columns. 'date' may be datetimes or parseable strings.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `HIERARCHY_COLUMNS` columns as text ('YYYY-MM-DD' dates), with None for missing values.
+    """
+    df = df[HIERARCHY_COLUMNS].copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    # Same text conversion SQLite applies to the TEXT columns, so keys compare equal after a round trip
+    return df.astype(object).apply(lambda col: col.map(lambda value: None if pd.isna(value) else str(value)))
+
+def nested_to_rows(data: Dict) -> pd.DataFrame:
+    """
+    Flatten a hierarchy in the nested `comment_hierarchy.json` shape into rows.
+
+    Parameters
+    ----------
+    data : dict
+        `{source: {curve_list: {grouping_var: [{'date', 'comment', 'standard_label'}, ...]}}}`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per comment with the `HIERARCHY_COLUMNS` columns.
+    """
+    records = [
+        {'source': source, 'curve_list': curve, 'grouping_var': grouping_var, **entry}
+        for source, curves in data.items()
+        for curve, groups in curves.items()
+        for grouping_var, entries in groups.items()
+        for entry in entries
+    ]
+    return pd.DataFrame(records, columns=HIERARCHY_COLUMNS)
+
+class HierarchyStore:
+    """
+    Append-only comment hierarchy backed by SQLite.
+
+    Every classified comment is one row keyed by source / curve_list / grouping_var / date,
+    so adding comments costs O(new rows) instead of rewriting the whole
+    `comment_hierarchy.json`. Rows keep their insertion order, and `export_json`
+    writes the existing nested JSON shape
+    (`{source: {curve_list: {grouping_var: [{date, comment, standard_label}, ...]}}}`)
+    when it is needed.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the SQLite file. Created if it does not exist.
+    """
+
+    def __init__(self, filepath: str):
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filepath = filepath
+        self._conn = sqlite3.connect(filepath)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hierarchy ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, curve_list TEXT, grouping_var TEXT, "
+            "date TEXT, comment TEXT, standard_label TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_hierarchy_key ON hierarchy (source, curve_list, grouping_var, date)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_hierarchy_curve ON hierarchy (curve_list, date)")
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "HierarchyStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM hierarchy").fetchone()[0]
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Append comments to the hierarchy.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Rows with 'source', 'curve_list', 'grouping_var', 'date', 'comment' and
+            'standard_label' columns. 'date' may be datetimes or parseable strings.
+
+        Returns
+        -------
+        int
+            Number of rows appended.
+        """
+        rows = list(normalize_hierarchy_rows(df).itertuples(index=False, name=None))
+        self._conn.executemany(
+            f"INSERT INTO hierarchy ({', '.join(HIERARCHY_COLUMNS)}) VALUES ({', '.join('?' * len(HIERARCHY_COLUMNS))})",
+            rows
+        )
+        self._conn.commit()
+        logger.info(f"Appended {len(rows)} rows to hierarchy store {self.filepath}.")
+        return len(rows)
+
+    def clear(self) -> None:
+        """
+        Delete every stored comment, e.g. before a full base-model rebuild.
+        """
+        self._conn.execute("DELETE FROM hierarchy")
+        self._conn.commit()
+        logger.info(f"Cleared hierarchy store {self.filepath}.")
+
+    def get_curve(self, curve_list: str, source: Optional[str] = None,
+                  grouping_var: Optional[str] = None) -> pd.DataFrame:
+        """
+        Return the comments of one curve, in insertion order.
+
+        Parameters
+        ----------
+        curve_list : str
+            The curve to look up.
+        source : str, optional
+            Restrict to one source.
+        grouping_var : str, optional
+            Restrict to one grouping variable.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The matching rows with the `HIERARCHY_COLUMNS` columns.
+        """
+        query = f"SELECT {', '.join(HIERARCHY_COLUMNS)} FROM hierarchy WHERE curve_list = ?"
+        params = [curve_list]
+        if source is not None:
+            query += " AND source = ?"
+            params.append(source)
+        if grouping_var is not None:
+            query += " AND grouping_var = ?"
+            params.append(grouping_var)
+        return pd.read_sql_query(query + " ORDER BY id", self._conn, params=params)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Return every stored comment, in insertion order.
+
+        Returns
+        -------
+        pandas.DataFrame
+            All rows with the `HIERARCHY_COLUMNS` columns.
+        """
+        return pd.read_sql_query(f"SELECT {', '.join(HIERARCHY_COLUMNS)} FROM hierarchy ORDER BY id", self._conn)
+
+    def to_nested(self) -> Dict:
+        """
+        Return the hierarchy in the nested `comment_hierarchy.json` shape.
+
+        Returns
+        -------
+        dict
+            `{source: {curve_list: {grouping_var: [{'date', 'comment', 'standard_label'}, ...]}}}`,
+            with None for comments without a date, as `build_hierarchy` writes them.
+        """
+        rows = self.to_dataframe()
+        # NULLs come back as NaN; keep them None as in the JSON hierarchy
+        rows = rows.astype(object).where(rows.notna(), None)
+        return nest_records(rows[['source', 'curve_list', 'grouping_var']], dates=rows['date'].tolist(),
+                            comments=rows['comment'].tolist(), labels=rows['standard_label'].tolist())
+
+    def export_json(self, filepath: str) -> None:
+        """
+        Write the hierarchy to `filepath` in the nested `comment_hierarchy.json` shape.
+
+        Parameters
+        ----------
+        filepath : str
+            Output JSON file.
+        """
+        logger.info(f"Exporting hierarchy store {self.filepath} to {filepath}.")
+        with open(filepath, 'w') as f:
+            json.dump(self.to_nested(), f, indent=2)
+        logger.info(f"Hierarchy exported to {filepath}.")
+
+    def import_nested(self, data: Dict) -> int:
+        """
+        Append the comments of a hierarchy in the nested `comment_hierarchy.json` shape.
+
+        Parameters
+        ----------
+        data : dict
+            Nested hierarchy, e.g. from `build_hierarchy`.
+
+        Returns
+        -------
+        int
+            Number of rows appended.
+        """
+        return self.append(nested_to_rows(data))
+
+    def import_json(self, filepath: str) -> int:
+        """
+        Append the comments of an existing `comment_hierarchy.json`.
+
+        Parameters
+        ----------
+        filepath : str
+            JSON hierarchy file.
+
+        Returns
+        -------
+        int
+            Number of rows appended.
+        """
+        logger.info(f"Importing hierarchy from {filepath} into {self.filepath}.")
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        return self.import_nested(data)
+
+def open_hierarchy_store(legacy_json: Optional[str] = None) -> HierarchyStore:
+    """
+    Open the hierarchy store configured in the `hierarchy_store` config section.
+
+    When the store file does not exist yet and `legacy_json` exists, that JSON hierarchy
+    is imported once so existing history is kept. The JSON is not read again afterwards:
+    unless `hierarchy_store.export_json` is set it is only current up to its last export.
+
+    Parameters
+    ----------
+    legacy_json : str, optional
+        Path to an existing `comment_hierarchy.json`.
+
+    Returns
+    -------
+    HierarchyStore
+        The opened store.
+    """
+    settings = get_hierarchy_store_settings()
+    logger.info(f"Opening hierarchy store at {settings['path']}.")
+    is_new = not os.path.exists(settings['path'])
+    store = HierarchyStore(settings['path'])
+    if is_new and legacy_json and os.path.exists(legacy_json):
+        store.import_json(legacy_json)
+    return store
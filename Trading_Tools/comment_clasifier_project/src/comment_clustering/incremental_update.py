@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from src.comment_clustering.preprocess import preprocess_comments
+from src.comment_clustering.generate_embeddings import generate_embeddings
+from src.comment_clustering.cluster_embeddings import cluster_embeddings
+from src.comment_clustering.mapping import map_clusters_to_labels
+from src.comment_clustering.build_hierarchy import build_hierarchy
+from src.comment_clustering.hierarchy_store import open_hierarchy_store, nested_to_rows
+from src.comment_clustering.pivot_table import update_pivot_table
+from src.comment_clustering.ann_index import ann_index_path, build_ann_index
+from src.comment_clustering.prototypes import cluster_centroids, prototypes_path, build_prototypes
+from src.comment_clustering.artifact_store import load_artifacts, append_artifacts, read_manifest
+from src.comment_clustering.similarity_search import DEFAULT_BLOCK_SIZE
+from src.config.config import (get_similarity_search_settings, get_hierarchy_store_settings, get_pivot_table_settings,
+                               load_mapping)
+from src.logs.logger import logger  # Import the logger
+from src.logs.tracing import count, span
+
+def attach_to_clusters(new_embeddings: np.ndarray, centroids: np.ndarray, sizes: np.ndarray,
+                       distance_threshold: float = 1,
+                       block_size: int = DEFAULT_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find, for every new embedding, the existing cluster it would be merged into.
+
+    The cost of adding a single embedding x to a cluster of size n and centroid c
+    is the Ward linkage distance `sqrt(2 * n / (n + 1)) * ||x - c||`, the quantity
+    `AgglomerativeClustering` compares with `distance_threshold`. An embedding is
+    attached to the cluster with the lowest cost when that cost is within the threshold.
+
+    Parameters
+    ----------
+    new_embeddings : np.ndarray of shape (n_new, dim)
+        L2-normalised embeddings of the new comments.
+    centroids : np.ndarray of shape (n_clusters, dim)
+        Centroids of the existing clusters.
+    sizes : np.ndarray of shape (n_clusters,)
+        Sizes of the existing clusters.
+    distance_threshold : float, optional (default=1)
+        Linkage distance above which an embedding is not attached.
+    block_size : int, optional (default=1024)
+        Number of new embeddings scored per matrix multiply.
+
+    Returns
+    -------
+    best_cluster : np.ndarray of shape (n_new,)
+        Position (in `centroids`) of the cheapest cluster for each embedding.
+    attached : np.ndarray of shape (n_new,), bool
+        Whether that cluster is within the distance threshold.
+    """
+    new_embeddings = np.asarray(new_embeddings, dtype=np.float32)
+    centroids = np.asarray(centroids, dtype=np.float32)
+    ward_scale = 2.0 * sizes / (sizes + 1.0)
+    centroid_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+
+    best_cluster = np.zeros(len(new_embeddings), dtype=np.intp)
+    best_cost = np.zeros(len(new_embeddings), dtype=np.float64)
+    for start in range(0, len(new_embeddings), block_size):
+        block = new_embeddings[start:start + block_size]
+        sq_dist = np.einsum('ij,ij->i', block, block)[:, None] + centroid_sq_norms - 2.0 * (block @ centroids.T)
+        cost = ward_scale * np.maximum(sq_dist, 0.0)
+        best_cluster[start:start + len(block)] = cost.argmin(axis=1)
+        best_cost[start:start + len(block)] = cost[np.arange(len(block)), best_cluster[start:start + len(block)]]
+    return best_cluster, np.sqrt(best_cost) <= distance_threshold
+
+def assign_incremental_clusters(new_embeddings: np.ndarray, embeddings, cluster_labels: np.ndarray,
+                                distance_threshold: float = 1) -> Tuple[np.ndarray, List[int]]:
+    """
+    Give every new embedding an existing cluster or a newly created one.
+
+    Embeddings within `distance_threshold` of an existing cluster (see
+    `attach_to_clusters`) take that cluster. The rest are clustered among
+    themselves with `cluster_embeddings` and numbered after the largest existing label.
+
+    Parameters
+    ----------
+    new_embeddings : np.ndarray of shape (n_new, dim)
+        Embeddings of the new comments.
+    embeddings : np.ndarray of shape (n_samples, dim) or QuantizedEmbeddings
+        Existing (normalised) embeddings.
+    cluster_labels : np.ndarray of shape (n_samples,)
+        Existing cluster labels.
+    distance_threshold : float, optional (default=1)
+        Same linkage distance threshold as the full clustering.
+
+    Returns
+    -------
+    new_labels : np.ndarray of shape (n_new,)
+        Cluster label of each new embedding.
+    created_clusters : list of int
+        Labels of the clusters opened by this update.
+    """
+    from sklearn.preprocessing import normalize
+    new_embeddings = normalize(np.asarray(new_embeddings, dtype=np.float32))
+    cluster_ids, centroids, sizes = cluster_centroids(embeddings, cluster_labels)
+    best_cluster, attached = attach_to_clusters(new_embeddings, centroids, sizes, distance_threshold)
+
+    new_labels = np.empty(len(new_embeddings), dtype=np.int64)
+    new_labels[attached] = cluster_ids[best_cluster[attached]]
+    logger.info(f"{int(attached.sum())} of {len(new_embeddings)} new comments attached to existing clusters.")
+
+    unattached = np.flatnonzero(~attached)
+    if len(unattached) == 0:
+        return new_labels, []
+    next_label = int(cluster_ids.max()) + 1 if len(cluster_ids) else 0
+    if len(unattached) == 1:
+        local_labels = np.zeros(1, dtype=np.int64)
+    else:
+        local_labels = cluster_embeddings(new_embeddings[unattached], distance_threshold=distance_threshold)
+    local_ids, local_labels = np.unique(local_labels, return_inverse=True)
+    new_labels[unattached] = next_label + local_labels
+    created_clusters = list(range(next_label, next_label + len(local_ids)))
+    logger.info(f"{len(unattached)} new comments formed {len(created_clusters)} new clusters.")
+    return new_labels, created_clusters
+
+def save_new_clusters(df_new: pd.DataFrame, created_clusters: List[int], mapping: Dict[str, str],
+                      filepath: str, sample_size: int = 5) -> List[Dict]:
+    """
+    Write the clusters that still need an entry in `cluster_label_mapping`.
+
+    Clusters listed by an earlier update are kept until they are mapped.
+
+    Parameters
+    ----------
+    df_new : pandas.DataFrame
+        The new comments with 'cluster' and 'cleaned_comment' columns.
+    created_clusters : list of int
+        Labels of the clusters opened by this update.
+    mapping : Dict[str, str]
+        The current cluster label mapping.
+    filepath : str
+        Path of the JSON file to write.
+    sample_size : int, optional (default=5)
+        Number of distinct example comments stored per cluster.
+
+    Returns
+    -------
+    list of dict
+        The listed clusters ('cluster', 'size', 'sample_comments', 'created_at').
+    """
+    pending = []
+    if os.path.exists(filepath):
+        with open(filepath, 'r') as f:
+            pending = [entry for entry in json.load(f) if str(entry['cluster']) not in mapping]
+
+    created_at = datetime.now(timezone.utc).isoformat()
+    for cluster in created_clusters:
+        comments = df_new.loc[df_new['cluster'] == cluster, 'cleaned_comment']
+        pending.append({
+            'cluster': int(cluster),
+            'size': int(len(comments)),
+            'sample_comments': comments.drop_duplicates().head(sample_size).tolist(),
+            'created_at': created_at,
+        })
+
+    with open(filepath, 'w') as f:
+        json.dump(pending, f, indent=2)
+    logger.info(f"{len(pending)} clusters awaiting a label written to {filepath}.")
+    return pending
+
+def _csv_rows_and_columns(filepath: str) -> Tuple[int, List[str]]:
+    # Streams the records (quoted line breaks included) without loading the file
+    with open(filepath, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        return sum(1 for record in reader if record), columns
+
+def update_base_model_incrementally(
+    df_new: pd.DataFrame,
+    output_csv: str,
+    artifact_dir: str,
+    mapping_file: str,
+    hierarchy_file: str,
+    new_clusters_file: str,
+    distance_threshold: float = 1,
+    sample_size: int = 5,
+    model_name: str = 'all-MiniLM-L6-v2'
+) -> List[int]:
+    """
+    Add newly appended comments to the base model without re-embedding or re-clustering the existing data.
+
+    Only `df_new` is embedded. Each new comment joins the nearest existing cluster
+    when it is within `distance_threshold`; the others open new clusters. The new
+    embeddings and labels are appended to the artifacts, the new rows to `output_csv`
+    and the hierarchy store, and the new clusters are listed in `new_clusters_file`
+    so they can be given a label in `cluster_label_mapping`.
+
+    Parameters
+    ----------
+    df_new : pandas.DataFrame
+        The appended rows, with at least 'comment' and 'date' columns.
+    output_csv : str
+        Labeled comments CSV written by `process_and_cluster_comments`.
+    artifact_dir : str
+        Artifact directory written by `process_and_cluster_comments`.
+    mapping_file : str
+        Path to the JSON file containing the cluster-to-label mapping.
+    hierarchy_file : str
+        Path of the JSON hierarchy, rewritten from the hierarchy store when
+        `hierarchy_store.export_json` is set.
+    new_clusters_file : str
+        Path of the JSON list of clusters that need a label.
+    distance_threshold : float, optional (default=1)
+        Linkage distance threshold used by the full clustering.
+    sample_size : int, optional (default=5)
+        Number of example comments listed per new cluster.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model. Must match the artifacts.
+
+    Returns
+    -------
+    list of int
+        Labels of the clusters created by this update.
+
+    Raises
+    ------
+    ValueError
+        If the artifacts and `output_csv` are out of step or were built with another model;
+        run the full pipeline in that case.
+    """
+    logger.info(f"Starting incremental base-model update with {len(df_new)} new comments.")
+    n_new = len(df_new)
+    with span('load') as stage:
+        n_existing, columns = _csv_rows_and_columns(output_csv)
+        stage.set_rows(n_existing)
+    manifest = read_manifest(artifact_dir)
+    if manifest['rows'] != n_existing:
+        raise ValueError(f"{artifact_dir} holds {manifest['rows']} rows but {output_csv} has {n_existing}. "
+                         f"Run a full rebuild.")
+    if manifest['model_name'] != model_name:
+        raise ValueError(f"{artifact_dir} was built with '{manifest['model_name']}', not '{model_name}'. "
+                         f"Run a full rebuild.")
+
+    with span('preprocess', rows=n_new):
+        df_new = df_new.copy()
+        df_new['comment'] = df_new['comment'].astype(str)
+        df_new = preprocess_comments(df_new, comment_col='comment')
+    with span('embed', rows=n_new):
+        new_embeddings = generate_embeddings(df_new['cleaned_comment'].tolist(), model_name=model_name)
+
+    with span('cluster', rows=n_new):
+        embeddings, cluster_labels, _ = load_artifacts(artifact_dir)
+        new_labels, created_clusters = assign_incremental_clusters(new_embeddings, embeddings, cluster_labels,
+                                                                   distance_threshold=distance_threshold)
+        # Release the memory maps before the files are replaced
+        del embeddings, cluster_labels
+    count('incremental.created_clusters', len(created_clusters))
+
+    with span('map', rows=n_new):
+        mapping = load_mapping(mapping_file)
+        df_new['cluster'] = new_labels
+        df_new['standard_label'] = map_clusters_to_labels(new_labels, mapping)
+
+    with span('save', rows=n_new):
+        append_artifacts(artifact_dir, new_embeddings, new_labels)
+        search_settings = get_similarity_search_settings()
+        if os.path.exists(ann_index_path(artifact_dir)) or search_settings['build_ann_index']:
+            logger.info("Rebuilding approximate-nearest-neighbour index.")
+            build_ann_index(load_artifacts(artifact_dir)[0], artifact_dir, n_lists=search_settings['n_lists'],
+                            n_probe=search_settings['n_probe'], normalized=True)
+        if os.path.exists(prototypes_path(artifact_dir)) or search_settings['build_prototypes']:
+            logger.info("Rebuilding cluster prototypes.")
+            build_prototypes(*load_artifacts(artifact_dir)[:2], artifact_dir,
+                             method=search_settings['prototype_method'], n_medoids=search_settings['n_medoids'])
+
+        # Append the new rows in the existing column order instead of rewriting the file
+        extra_columns = [column for column in df_new.columns if column not in columns]
+        if extra_columns:
+            logger.warning(f"Columns {extra_columns} are not in {output_csv} and are not saved.")
+        logger.info(f"Appending {n_new} rows to {output_csv}.")
+        df_new.reindex(columns=columns).to_csv(output_csv, mode='a', header=False, index=False)
+
+    # Only the new rows are added to the hierarchy and the pivot table
+    with open_hierarchy_store(legacy_json=hierarchy_file) as store:
+        with span('hierarchy', rows=n_new):
+            df_new['date'] = pd.to_datetime(df_new['date'], format='mixed', dayfirst=True)
+            hierarchy_rows = nested_to_rows(build_hierarchy(df_new.sort_values(by='date')))
+            store.append(hierarchy_rows)
+        with span('pivot', rows=n_new):
+            update_pivot_table(hierarchy_rows, get_pivot_table_settings()['path'], store=store)
+        if get_hierarchy_store_settings()['export_json']:
+            store.export_json(hierarchy_file)
+
+    save_new_clusters(df_new, created_clusters, mapping, new_clusters_file, sample_size=sample_size)
+    logger.info("Incremental base-model update completed successfully.")
+    return created_clusters
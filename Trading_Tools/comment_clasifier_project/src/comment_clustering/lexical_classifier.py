@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from src.comment_clustering.assign_labels_based_on_similarity import NOT_REVIEWED_LABEL, is_empty_comment
+from src.comment_clustering.preprocess import normalize_comments
+from src.config.config import get_lexical_classifier_settings
+from src.logs.logger import logger  # Import the logger
+from src.logs.tracing import count, span
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Tier of each comment: answered by the exact-match memo, by TF-IDF, or left for the embedding path
+TIER_EMPTY = 'empty'
+TIER_MEMO = 'memo'
+TIER_TFIDF = 'tfidf'
+TIER_EMBEDDING = 'embedding'
+
+# Bumped when the saved classifier's layout changes, so older model files are retrained
+LEXICAL_MODEL_FORMAT = 2
+
+def history_labels(history: pd.DataFrame, cluster_to_label: Dict[str, str]) -> pd.Series:
+    """
+    Label each history row the way the embedding path would label the same text.
+
+    Parameters
+    ----------
+    history : pandas.DataFrame
+        Rows of `labeled_comments.csv` with a 'cluster' (or, failing that, 'standard_label') column.
+    cluster_to_label : dict
+        Cluster-to-label mapping used in production.
+
+    Returns
+    -------
+    pandas.Series
+        One label per row: the mapped label of its cluster, 'Not Reviewed / Evidenced' for unmapped clusters.
+    """
+    if 'cluster' in history.columns:
+        mapping = {int(cluster): label for cluster, label in cluster_to_label.items()}
+        return history['cluster'].map(mapping).fillna(NOT_REVIEWED_LABEL).astype(object)
+    return history['standard_label'].fillna(NOT_REVIEWED_LABEL).astype(object)
+
+class LexicalClassifier:
+    """
+    Cheap first-stage classifier that labels near-verbatim repeats of historical comments.
+
+    Two tiers are tried in order:
+
+    1. an exact-match memo on the cleaned comment, for texts whose historical rows
+       (nearly) all share one label;
+    2. a character n-gram TF-IDF nearest neighbour over the distinct historical texts,
+       accepted only when the closest text is at least `min_similarity` similar and beats
+       the closest text with a different label by `margin`.
+
+    Comments neither tier is confident about are left for the embedding path.
+
+    Parameters
+    ----------
+    memo : dict
+        Cleaned comment -> label of the exact-match tier.
+    vectorizer : TfidfVectorizer
+        Fitted character n-gram vectoriser.
+    matrix : scipy.sparse.csr_matrix of shape (n_texts, n_features)
+        L2-normalised TF-IDF rows of the distinct historical texts.
+    labels : numpy.ndarray of shape (n_texts,)
+        Label of each historical text.
+    min_similarity : float
+        Smallest cosine similarity accepted by the TF-IDF tier.
+    margin : float
+        Smallest lead of the best label over the best other label.
+    block_size : int, optional (default=256)
+        Comments scored per sparse matrix multiply.
+    """
+
+    def __init__(self, memo: Dict[str, str], vectorizer: "TfidfVectorizer", matrix, labels: np.ndarray,
+                 min_similarity: float, margin: float, block_size: int = 256):
+        self.memo = memo
+        self.vectorizer = vectorizer
+        # Integer label codes, with the TF-IDF rows grouped by label so per-label maxima are one reduceat
+        label_codes, label_names = pd.factorize(pd.Series(np.asarray(labels, dtype=object)))
+        order = np.argsort(label_codes, kind='stable')
+        self.matrix = matrix[order] if matrix is not None else None
+        self.label_names = np.asarray(label_names, dtype=object)
+        self.label_starts = np.searchsorted(label_codes[order], np.arange(len(self.label_names)))
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.block_size = block_size
+
+    @classmethod
+    def train(cls, cleaned_comments: pd.Series, labels: pd.Series, ngram_range: Tuple[int, int] = (3, 5),
+              min_similarity: float = 0.9, margin: float = 0.1, memo_min_agreement: float = 1.0,
+              max_train_texts: Optional[int] = None, block_size: int = 256,
+              random_state: int = 0) -> "LexicalClassifier":
+        """
+        Train both tiers from the labelled history.
+
+        Parameters
+        ----------
+        cleaned_comments : pandas.Series
+            Cleaned historical comments.
+        labels : pandas.Series
+            Their labels (see `history_labels`).
+        ngram_range : tuple of int, optional (default=(3, 5))
+            Character n-gram sizes, within word boundaries.
+        min_similarity : float, optional (default=0.9)
+            Smallest cosine similarity accepted by the TF-IDF tier.
+        margin : float, optional (default=0.1)
+            Smallest lead of the best label over the best other label.
+        memo_min_agreement : float, optional (default=1.0)
+            Smallest share of a text's historical rows that must carry its majority label
+            for the text to enter the memo.
+        max_train_texts : int, optional
+            Largest number of distinct texts indexed by the TF-IDF tier; a random sample is
+            kept when there are more. None for all.
+        block_size : int, optional (default=256)
+            Comments scored per sparse matrix multiply.
+        random_state : int, optional
+            Seed of the sample. Default is 0.
+
+        Returns
+        -------
+        LexicalClassifier
+            The trained classifier.
+        """
+        history = pd.DataFrame({'text': cleaned_comments.fillna('').astype(str).to_numpy(),
+                                'label': labels.to_numpy(dtype=object)})
+        history = history[history['text'] != '']
+
+        # Majority label of each distinct text and the share of its rows carrying it
+        counts = history.groupby(['text', 'label'], sort=False).size().rename('n').reset_index()
+        totals = counts.groupby('text', sort=False)['n'].transform('sum')
+        counts['share'] = counts['n'] / totals
+        majority = counts.sort_values(['text', 'n'], ascending=[True, False]).drop_duplicates('text')
+        memo_rows = majority[majority['share'] >= memo_min_agreement]
+        memo = dict(zip(memo_rows['text'], memo_rows['label']))
+
+        texts = majority.reset_index(drop=True)
+        if max_train_texts is not None and len(texts) > max_train_texts:
+            texts = texts.sample(n=max_train_texts, random_state=random_state).reset_index(drop=True)
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=tuple(ngram_range), sublinear_tf=True,
+                                     dtype=np.float32)
+        matrix = vectorizer.fit_transform(texts['text']) if len(texts) else None
+        logger.info(f"Lexical classifier trained: {len(memo)} memo entries, {len(texts)} TF-IDF texts "
+                    f"from {len(history)} labelled comments.")
+        return cls(memo, vectorizer, matrix, texts['label'].to_numpy(dtype=object),
+                   min_similarity=min_similarity, margin=margin, block_size=block_size)
+
+    def _nearest(self, texts: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        best_codes = np.zeros(len(texts), dtype=np.intp)
+        best_scores = np.zeros(len(texts), dtype=np.float32)
+        other_scores = np.zeros(len(texts), dtype=np.float32)
+        for start in range(0, len(texts), self.block_size):
+            stop = min(start + self.block_size, len(texts))
+            # Character n-gram products are mostly non-zero, so a dense block is the cheapest form
+            scores = (self.vectorizer.transform(texts[start:stop]) @ self.matrix.T).toarray()
+            # Rows are grouped by label, so one reduceat gives the best score of every label
+            label_scores = np.maximum.reduceat(scores, self.label_starts, axis=1)
+            block_rows = np.arange(stop - start)
+            best = label_scores.argmax(axis=1)
+            best_codes[start:stop] = best
+            best_scores[start:stop] = label_scores[block_rows, best]
+            # Closest text carrying a different label than the closest text overall
+            label_scores[block_rows, best] = 0.0
+            other_scores[start:stop] = label_scores.max(axis=1)
+        return best_codes, best_scores, other_scores
+
+    def predict(self, comments: pd.Series, cleaned_comments: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Label the comments the lexical tiers are confident about.
+
+        Parameters
+        ----------
+        comments : pandas.Series
+            Raw comments (empty ones are answered directly, as the embedding path would).
+        cleaned_comments : pandas.Series
+            The same comments after `normalize_comments`.
+
+        Returns
+        -------
+        labels : numpy.ndarray of object
+            The label of each comment, None where it is left for the embedding path.
+        tiers : numpy.ndarray of object
+            'empty', 'memo', 'tfidf' or 'embedding' per comment.
+        """
+        labels = np.full(len(comments), None, dtype=object)
+        tiers = np.full(len(comments), TIER_EMBEDDING, dtype=object)
+
+        empty = is_empty_comment(comments)
+        labels[empty] = NOT_REVIEWED_LABEL
+        tiers[empty] = TIER_EMPTY
+
+        cleaned = cleaned_comments.to_numpy(dtype=object)
+        memo_labels = pd.Series(cleaned).map(self.memo).to_numpy(dtype=object)
+        in_memo = ~empty & pd.notna(memo_labels)
+        labels[in_memo] = memo_labels[in_memo]
+        tiers[in_memo] = TIER_MEMO
+
+        remaining = np.flatnonzero(tiers == TIER_EMBEDDING)
+        if len(remaining) and self.matrix is not None:
+            # Score each distinct remaining text once
+            codes, unique_texts = pd.factorize(pd.Series(cleaned[remaining]))
+            best_codes, best_scores, other_scores = self._nearest(list(unique_texts))
+            confident = ((best_scores > 0) & (best_scores >= self.min_similarity)
+                         & (best_scores - other_scores >= self.margin))
+            accepted = confident[codes]
+            labels[remaining[accepted]] = self.label_names[best_codes[codes][accepted]]
+            tiers[remaining[accepted]] = TIER_TFIDF
+        return labels, tiers
+
+def log_tier_fractions(tiers: np.ndarray) -> Dict[str, float]:
+    """
+    Log the share of comments served by each tier and add the counts to the traced run
+    ('lexical.empty', 'lexical.memo', 'lexical.tfidf', 'lexical.embedding').
+
+    Parameters
+    ----------
+    tiers : numpy.ndarray
+        Tier of each comment, as returned by `LexicalClassifier.predict`.
+
+    Returns
+    -------
+    dict
+        Fraction of the comments per tier.
+    """
+    fractions = {}
+    for tier in (TIER_EMPTY, TIER_MEMO, TIER_TFIDF, TIER_EMBEDDING):
+        n = int(np.count_nonzero(tiers == tier))
+        count(f'lexical.{tier}', n)
+        fractions[tier] = n / len(tiers) if len(tiers) else 0.0
+    logger.info("Comments served per tier: " + ", ".join(f"{tier} {share:.1%}" for tier, share in fractions.items()))
+    return fractions
+
+def classify_with_lexical_tiers(df: pd.DataFrame, classifier: LexicalClassifier,
+                                classify_embeddings: Callable[[pd.DataFrame], List[str]]) -> List[str]:
+    """
+    Label comments lexically where the classifier is confident and send only the rest
+    through the embedding path.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Comments with 'comment' and 'cleaned_comment' columns.
+    classifier : LexicalClassifier
+        The trained lexical classifier.
+    classify_embeddings : callable
+        Labels a DataFrame of the remaining comments (index reset) through the embedding path.
+
+    Returns
+    -------
+    list of str
+        One standard label per comment.
+    """
+    started = time.perf_counter()
+    with span('lexical', rows=len(df)):
+        labels, tiers = classifier.predict(df['comment'], df['cleaned_comment'])
+    lexical_s = time.perf_counter() - started
+    log_tier_fractions(tiers)
+
+    embedding_rows = np.flatnonzero(tiers == TIER_EMBEDDING)
+    if len(embedding_rows) == 0:
+        logger.info(f"All {len(df)} comments labelled lexically in {lexical_s:.3f}s; the encoder was not used.")
+        return labels.tolist()
+
+    started = time.perf_counter()
+    labels[embedding_rows] = classify_embeddings(df.iloc[embedding_rows].reset_index(drop=True))
+    embedding_s = time.perf_counter() - started
+    # Speed-up over sending every comment through the embedding path at the same per-comment cost
+    all_embedding_s = embedding_s / len(embedding_rows) * len(df)
+    logger.info(f"Labelled {len(df)} comments in {lexical_s + embedding_s:.3f}s "
+                f"(lexical {lexical_s:.3f}s, embedding {embedding_s:.3f}s for {len(embedding_rows)} comments); "
+                f"estimated {all_embedding_s:.3f}s without the lexical tiers, "
+                f"speed-up {all_embedding_s / (lexical_s + embedding_s):.2f}x.")
+    return labels.tolist()
+
+def _history_fingerprint(labeled_csv: str, cluster_to_label: Dict[str, str], settings: Dict) -> str:
+    stat = os.stat(labeled_csv)
+    key = json.dumps({'format': LEXICAL_MODEL_FORMAT, 'csv': [os.path.abspath(labeled_csv), stat.st_size, stat.st_mtime_ns],
+                      'mapping': cluster_to_label, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def load_lexical_classifier(labeled_csv: str, cluster_to_label: Dict[str, str],
+                            settings: Optional[Dict] = None) -> LexicalClassifier:
+    """
+    Load the lexical classifier saved in `lexical_classifier.model_file`, training it from
+    `labeled_csv` first when the history, the mapping or the settings changed.
+
+    Parameters
+    ----------
+    labeled_csv : str
+        Path to `labeled_comments.csv` ('comment', 'cleaned_comment' and 'cluster' or 'standard_label').
+    cluster_to_label : dict
+        Cluster-to-label mapping used in production.
+    settings : dict, optional
+        The `lexical_classifier` config section. Read from config.json when omitted.
+
+    Returns
+    -------
+    LexicalClassifier
+        The trained classifier.
+    """
+    settings = settings or get_lexical_classifier_settings()
+    training_settings = {key: settings[key] for key in
+                         ('ngram_range', 'min_similarity', 'margin', 'memo_min_agreement', 'max_train_texts')}
+    fingerprint = _history_fingerprint(labeled_csv, cluster_to_label, training_settings)
+    model_file = settings['model_file']
+    if os.path.exists(model_file):
+        with open(model_file, 'rb') as f:
+            saved = pickle.load(f)
+        if saved.get('fingerprint') == fingerprint:
+            logger.info(f"Loaded lexical classifier from {model_file}.")
+            return saved['classifier']
+        logger.info(f"{labeled_csv} or the mapping changed since {model_file} was trained. Retraining.")
+
+    history = pd.read_csv(labeled_csv, converters={'comment': str})
+    cleaned = history['cleaned_comment'] if 'cleaned_comment' in history.columns \
+        else normalize_comments(history['comment'])
+    classifier = LexicalClassifier.train(
+        cleaned, history_labels(history, cluster_to_label), ngram_range=settings['ngram_range'],
+        min_similarity=settings['min_similarity'], margin=settings['margin'],
+        memo_min_agreement=settings['memo_min_agreement'], max_train_texts=settings['max_train_texts'],
+        block_size=settings['block_size']
+    )
+    directory = os.path.dirname(model_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(model_file + '.tmp', 'wb') as f:
+        pickle.dump({'fingerprint': fingerprint, 'classifier': classifier}, f)
+    os.replace(model_file + '.tmp', model_file)
+    logger.info(f"Lexical classifier saved to {model_file}.")
+    return classifier
@@ -1,7 +1,6 @@
 import json
 from typing import Dict
 import numpy as np
-from src.config.config import load_mapping
 from src.logs.logger import logger  # Import the logger
 
 def map_clusters_to_labels(cluster_labels: np.ndarray, mapping: Dict[int, str]) -> list:
@@ -26,12 +25,6 @@ def map_clusters_to_labels(cluster_labels: np.ndarray, mapping: Dict[int, str])
     logger.info("Mapping of cluster labels completed.")
     return mapped_labels
 
-# Load the mapping from JSON file
-mapping_file = r"output\cluster_label_mapping.json"
-logger.info(f"Loading cluster label mapping from {mapping_file}.")
-CLUSTER_LABEL_MAPPING = load_mapping(mapping_file)
-logger.info(f"Cluster label mapping loaded successfully from {mapping_file}.")
-
 def save_mapping(mapping: Dict[int, str], filepath: str) -> None:
     """
     Save a dictionary mapping of cluster labels to a JSON file.
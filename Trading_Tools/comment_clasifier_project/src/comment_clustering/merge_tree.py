@@ -0,0 +1,209 @@
+import os
+from heapq import heappush, heappushpop
+from typing import Optional
+import numpy as np
+import pandas as pd
+from src.logs.logger import logger  # Import the logger
+
+MERGE_TREE_FILE = 'merge_tree.npz'
+
+def merge_tree_path(artifact_dir: str) -> str:
+    """
+    Return the path of the merge tree stored next to the saved embeddings.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Artifact directory holding the saved embeddings (see `artifact_store`).
+
+    Returns
+    -------
+    str
+        Path of the merge tree file inside `artifact_dir`.
+    """
+    return os.path.join(artifact_dir, MERGE_TREE_FILE)
+
+def cut_tree(children: np.ndarray, n_leaves: int, n_clusters: int) -> np.ndarray:
+    """
+    Cut an agglomerative merge tree into `n_clusters` clusters.
+
+    Clusters are numbered exactly as `AgglomerativeClustering` numbers them, so the ids
+    in `cluster_label_mapping` stay valid. The leaves' clusters are found by pointer
+    jumping up the tree instead of walking every cluster's descendants.
+
+    Parameters
+    ----------
+    children : np.ndarray of shape (n_leaves - 1, 2)
+        `children_` of the fitted model: merge i joins the two nodes of row i into node `n_leaves + i`.
+    n_leaves : int
+        Number of leaves of the tree.
+    n_clusters : int
+        Number of clusters to form.
+
+    Returns
+    -------
+    np.ndarray of shape (n_leaves,)
+        Cluster label of each leaf.
+    """
+    if n_clusters > n_leaves:
+        raise ValueError(f"Cannot extract {n_clusters} clusters from a tree with {n_leaves} leaves.")
+    if n_leaves == 1:
+        return np.zeros(1, dtype=np.intp)
+    # Undo the latest merges first, keeping the heap in the same order as scikit-learn
+    nodes = [-(int(max(children[-1])) + 1)]
+    for _ in range(n_clusters - 1):
+        these_children = children[-nodes[0] - n_leaves]
+        heappush(nodes, -int(these_children[0]))
+        heappushpop(nodes, -int(these_children[1]))
+    roots = -np.asarray(nodes, dtype=np.intp)
+
+    n_nodes = 2 * n_leaves - 1
+    up = np.empty(n_nodes, dtype=np.intp)
+    up[children.ravel()] = np.repeat(np.arange(n_leaves, n_nodes, dtype=np.intp), 2)
+    up[-1] = n_nodes - 1
+    up[roots] = roots
+    while True:
+        jumped = up[up]
+        if np.array_equal(jumped, up):
+            break
+        up = jumped
+
+    cluster_of_root = np.empty(n_nodes, dtype=np.intp)
+    cluster_of_root[roots] = np.arange(len(roots))
+    return cluster_of_root[up[:n_leaves]]
+
+class MergeTree:
+    """
+    Full merge tree of an agglomerative clustering run, cut again at any distance threshold.
+
+    With the 'birch' backend the leaves are BIRCH sub-clusters and `leaf_of_row` maps each
+    embedding to its sub-cluster; otherwise every leaf is an embedding.
+
+    Parameters
+    ----------
+    children : numpy.ndarray of shape (n_leaves - 1, 2)
+        `children_` of the fitted `AgglomerativeClustering`.
+    distances : numpy.ndarray of shape (n_leaves - 1,)
+        Linkage distance of each merge (`distances_`).
+    leaf_of_row : numpy.ndarray of shape (n_rows,), optional
+        Leaf of each embedding, when leaves are not embeddings.
+    backend : str, optional (default='agglomerative')
+        Clustering backend that built the tree.
+    distance_threshold : float, optional
+        Threshold of the clustering run that built the tree.
+    """
+
+    def __init__(self, children: np.ndarray, distances: np.ndarray, leaf_of_row: Optional[np.ndarray] = None,
+                 backend: str = 'agglomerative', distance_threshold: Optional[float] = None):
+        self.children = np.asarray(children, dtype=np.intp)
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.leaf_of_row = None if leaf_of_row is None else np.asarray(leaf_of_row, dtype=np.intp)
+        self.backend = backend
+        self.distance_threshold = distance_threshold
+        self.n_leaves = len(self.children) + 1
+        self._sorted_distances = np.sort(self.distances)
+
+    def __len__(self) -> int:
+        # Number of embeddings the tree labels
+        return self.n_leaves if self.leaf_of_row is None else len(self.leaf_of_row)
+
+    def n_clusters(self, distance_threshold: float) -> int:
+        """
+        Count the clusters left when merging stops at `distance_threshold`.
+
+        Parameters
+        ----------
+        distance_threshold : float
+            Linkage distance at or above which clusters are not merged.
+
+        Returns
+        -------
+        int
+            Number of clusters, as `AgglomerativeClustering.n_clusters_` would report it.
+        """
+        n_above = len(self._sorted_distances) - np.searchsorted(self._sorted_distances, distance_threshold, side='left')
+        return int(n_above) + 1
+
+    def cut(self, distance_threshold: float) -> np.ndarray:
+        """
+        Cluster labels of every embedding at `distance_threshold`.
+
+        Parameters
+        ----------
+        distance_threshold : float
+            Linkage distance at or above which clusters are not merged.
+
+        Returns
+        -------
+        numpy.ndarray of shape (n_rows,)
+            The labels `cluster_embeddings` returns for this threshold with the same backend.
+        """
+        labels = cut_tree(self.children, self.n_leaves, self.n_clusters(distance_threshold))
+        return labels if self.leaf_of_row is None else labels[self.leaf_of_row]
+
+    def sweep(self, distance_thresholds) -> pd.DataFrame:
+        """
+        Cluster count and size distribution at each threshold.
+
+        Parameters
+        ----------
+        distance_thresholds : iterable of float
+            Thresholds to cut at.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per threshold: number of clusters, largest, median and mean cluster size
+            and number of single-comment clusters.
+        """
+        rows = []
+        for distance_threshold in distance_thresholds:
+            sizes = np.bincount(self.cut(distance_threshold))
+            rows.append({
+                'distance_threshold': float(distance_threshold),
+                'n_clusters': len(sizes),
+                'largest': int(sizes.max()),
+                'median_size': float(np.median(sizes)),
+                'mean_size': float(sizes.mean()),
+                'singletons': int(np.count_nonzero(sizes == 1)),
+            })
+        return pd.DataFrame(rows)
+
+    def save(self, filepath: str) -> None:
+        """
+        Save the merge tree to an .npz file.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the output merge tree file.
+        """
+        logger.info(f"Saving {self.backend} merge tree with {self.n_leaves} leaves to {filepath}.")
+        arrays = {'children': self.children, 'distances': self.distances, 'backend': self.backend,
+                  'distance_threshold': np.nan if self.distance_threshold is None else self.distance_threshold}
+        if self.leaf_of_row is not None:
+            arrays['leaf_of_row'] = self.leaf_of_row
+        np.savez(filepath, **arrays)
+
+    @classmethod
+    def load(cls, filepath: str) -> "MergeTree":
+        """
+        Load a merge tree saved with `save`.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the merge tree file.
+
+        Returns
+        -------
+        MergeTree
+            The loaded merge tree.
+        """
+        logger.info(f"Loading merge tree from {filepath}.")
+        with np.load(filepath) as data:
+            distance_threshold = float(data['distance_threshold'])
+            return cls(data['children'], data['distances'],
+                       leaf_of_row=data['leaf_of_row'] if 'leaf_of_row' in data else None,
+                       backend=str(data['backend']),
+                       distance_threshold=None if np.isnan(distance_threshold) else distance_threshold)
@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+import pandas as pd
+from src.comment_clustering.preprocess import preprocess_comments
+from src.comment_clustering.generate_embeddings import generate_embeddings, load_model
+from src.comment_clustering.assign_labels_based_on_similarity import assign_labels_based_on_similarity
+from src.comment_clustering.ann_index import load_similarity_search, search_similarity_threshold
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.lexical_classifier import load_lexical_classifier, classify_with_lexical_tiers
+from src.config.config import get_similarity_search_settings, get_model_server_settings, get_lexical_classifier_settings
+from src.logs.logger import logger  # Import the logger
+
+class ClassificationService:
+    """
+    Hold everything needed to label comments in memory: the encoder, the reference
+    embeddings (as a search object), the cluster labels, the label mapping and, when
+    enabled, the lexical classifier.
+
+    The artifacts are read into memory rather than memory-mapped, so the base pipeline
+    can replace them while the server runs. Before each batch the service checks the
+    artifact directory, the mapping and the lexical history for changes and reloads
+    them, so labels always come from the latest model.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Directory holding the saved embeddings and cluster labels.
+    mapping_file : str
+        Path to the JSON cluster-to-label mapping.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+    """
+
+    def __init__(self, artifact_dir: str, mapping_file: str, model_name: str = 'all-MiniLM-L6-v2'):
+        self.artifact_dir = artifact_dir
+        self.mapping_file = mapping_file
+        self.model_name = model_name
+        self._signature = None
+        logger.info("Loading classification service state.")
+        self.reload_if_changed()
+        if self._signature is None:
+            raise RuntimeError(f"Could not load the model artifacts from {artifact_dir}.")
+        load_model(model_name)
+        logger.info("Classification service ready.")
+
+    def _state_signature(self) -> tuple:
+        # Size and modification time of every file the service state is loaded from
+        paths = [entry.path for entry in os.scandir(self.artifact_dir) if entry.is_file()]
+        paths.append(self.mapping_file)
+        lexical_settings = get_lexical_classifier_settings()
+        if lexical_settings['enabled']:
+            paths.append(lexical_settings['labeled_csv'])
+        signature = []
+        for path in sorted(paths):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature.append((path, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the artifacts, the mapping and the lexical classifier when any of their files changed.
+
+        A failed reload (e.g. while the pipeline is still writing) keeps the current state
+        and is retried on the next batch.
+
+        Returns
+        -------
+        bool
+            True when the state was reloaded.
+        """
+        signature = self._state_signature()
+        if signature == self._signature:
+            return False
+        if self._signature is not None:
+            logger.info(f"Model artifacts or mapping changed. Reloading from {self.artifact_dir}.")
+        try:
+            existing_embeddings, existing_labels, _ = load_artifacts(self.artifact_dir, mmap=False)
+            with open(self.mapping_file, 'r') as f:
+                cluster_to_label = json.load(f)
+            search_settings = get_similarity_search_settings()
+            search = load_similarity_search(existing_embeddings, self.artifact_dir, search_settings, normalized=True)
+            lexical_settings = get_lexical_classifier_settings()
+            lexical = (load_lexical_classifier(lexical_settings['labeled_csv'], cluster_to_label, lexical_settings)
+                       if lexical_settings['enabled'] else None)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Reloading the classification service state failed ({exc}); keeping the current state.")
+            return False
+        self.existing_embeddings, self.existing_labels = existing_embeddings, existing_labels
+        self.cluster_to_label = cluster_to_label
+        self.search = search
+        self.lexical = lexical
+        self.threshold = search_similarity_threshold(search, search_settings)
+        self._signature = signature
+        return True
+
+    def _classify_with_embeddings(self, df: pd.DataFrame) -> List[str]:
+        embeddings = generate_embeddings(df['cleaned_comment'].tolist(), model_name=self.model_name)
+        return assign_labels_based_on_similarity(
+            df, embeddings, self.existing_embeddings, self.existing_labels, self.cluster_to_label,
+            threshold=self.threshold, search=self.search
+        )
+
+    def classify(self, comments: List[str]) -> List[str]:
+        """
+        Label a batch of raw comments, through the lexical tiers first when they are enabled.
+
+        Parameters
+        ----------
+        comments : list of str
+            Raw comment strings.
+
+        Returns
+        -------
+        list of str
+            One standard label per comment.
+        """
+        self.reload_if_changed()
+        df = pd.DataFrame({'comment': pd.Series(comments, dtype=object).astype(str)})
+        df = preprocess_comments(df, comment_col='comment')
+        if self.lexical is None:
+            return self._classify_with_embeddings(df)
+        return classify_with_lexical_tiers(df, self.lexical, self._classify_with_embeddings)
+
+class MicroBatcher:
+    """
+    Merge concurrent classification requests into single encode-and-search calls.
+
+    A background thread takes the first waiting request, then keeps collecting
+    requests for up to `max_wait_ms` (or until `max_batch_size` comments are queued)
+    and classifies them all in one call.
+
+    Parameters
+    ----------
+    service : ClassificationService
+        The service doing the actual classification.
+    max_batch_size : int
+        Maximum number of comments merged into one call.
+    max_wait_ms : float
+        How long to wait for more requests after the first one arrives.
+    """
+
+    def __init__(self, service: ClassificationService, max_batch_size: int, max_wait_ms: float):
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, comments: List[str]) -> Future:
+        future = Future()
+        self._requests.put((comments, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            while size < self.max_batch_size:
+                try:
+                    request = self._requests.get(timeout=self.max_wait)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            comments = [comment for request_comments, _ in batch for comment in request_comments]
+            logger.info(f"Classifying micro-batch of {len(batch)} requests ({len(comments)} comments).")
+            try:
+                labels = self.service.classify(comments)
+            except Exception as exc:
+                logger.error(f"Micro-batch classification failed: {exc}")
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            offset = 0
+            for request_comments, future in batch:
+                future.set_result(labels[offset:offset + len(request_comments)])
+                offset += len(request_comments)
+
+def _make_handler(batcher: MicroBatcher):
+    class ClassificationHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/classify':
+                self._send_json(404, {'error': 'not found'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                comments = [str(comment) for comment in payload['comments']]
+            except (ValueError, KeyError, TypeError) as exc:
+                self._send_json(400, {'error': f"invalid request: {exc}"})
+                return
+            try:
+                labels = batcher.submit(comments).result()
+            except Exception as exc:
+                self._send_json(500, {'error': str(exc)})
+                return
+            self._send_json(200, {'labels': labels})
+
+        def log_message(self, format, *args):
+            logger.info("Model server: " + format % args)
+
+    return ClassificationHandler
+
+def serve(artifact_dir: str, mapping_file: str, host: str, port: int, max_batch_size: int, max_wait_ms: float) -> None:
+    """
+    Run the classification daemon on localhost HTTP until interrupted.
+
+    Endpoints: `POST /classify` with `{"comments": [...]}` returns `{"labels": [...]}`,
+    and `GET /health` returns `{"status": "ok"}` once the model is loaded.
+
+    Parameters
+    ----------
+    artifact_dir, mapping_file : str
+        Saved model artifacts and label mapping, reloaded whenever they change.
+    host : str
+        Interface to bind (use 127.0.0.1 to stay local).
+    port : int
+        Port to listen on.
+    max_batch_size : int
+        Maximum number of comments merged into one encode call.
+    max_wait_ms : float
+        Micro-batching window in milliseconds.
+    """
+    service = ClassificationService(artifact_dir, mapping_file)
+    batcher = MicroBatcher(service, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher))
+    logger.info(f"Model server listening on http://{host}:{port}.")
+    print(f"Model server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("Model server stopped.")
+
+def classify_with_server(comments: List[str], host: str, port: int, timeout: float) -> Optional[List[str]]:
+    """
+    Label comments through a running model server.
+
+    Parameters
+    ----------
+    comments : list of str
+        Raw comment strings.
+    host : str
+        Host of the model server.
+    port : int
+        Port of the model server.
+    timeout : float
+        Request timeout in seconds.
+
+    Returns
+    -------
+    list of str or None
+        The labels, or None when the server is unreachable or returns an error, so the
+        caller can fall back to in-process classification.
+    """
+    request = urllib.request.Request(
+        f"http://{host}:{port}/classify",
+        data=json.dumps({'comments': comments}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            labels = json.loads(response.read())['labels']
+    except (urllib.error.URLError, OSError, ValueError, KeyError) as exc:
+        logger.warning(f"Model server at {host}:{port} unavailable ({exc}).")
+        return None
+    logger.info(f"Model server classified {len(labels)} comments.")
+    return labels
+
+def main():
+    settings = get_model_server_settings()
+    parser = argparse.ArgumentParser(description="Long-lived local comment classification server.")
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--mapping-file', default=r'output\cluster_label_mapping.json')
+    parser.add_argument('--host', default=settings['host'])
+    parser.add_argument('--port', type=int, default=settings['port'])
+    parser.add_argument('--max-batch-size', type=int, default=settings['max_batch_size'])
+    parser.add_argument('--max-wait-ms', type=float, default=settings['max_wait_ms'])
+    args = parser.parse_args()
+    serve(args.artifact_dir, args.mapping_file, args.host, args.port, args.max_batch_size, args.max_wait_ms)
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,36 @@
+import os
+import numpy as np
 import pandas as pd
-import pickle
+from typing import Iterable, Iterator, Optional
 from src.comment_clustering.preprocess import preprocess_comments
 from src.comment_clustering.generate_embeddings import generate_embeddings
 from src.comment_clustering.cluster_embeddings import cluster_embeddings
-from src.comment_clustering.mapping import map_clusters_to_labels, save_mapping, load_mapping
+from src.comment_clustering.mapping import map_clusters_to_labels, save_mapping
 from src.comment_clustering.build_hierarchy import build_hierarchy, save_hierarchy
+from src.comment_clustering.hierarchy_store import open_hierarchy_store, nested_to_rows
+from src.comment_clustering.pivot_table import pivot_cells, save_pivot_table
+from src.comment_clustering.ann_index import build_ann_index
+from src.comment_clustering.prototypes import build_prototypes
+from src.comment_clustering.merge_tree import MergeTree, merge_tree_path
+from src.comment_clustering.artifact_store import save_artifacts, load_artifacts, NpyAppendWriter
+from src.comment_clustering.dataset_store import DatasetStore, is_dataset_store
+from src.config.config import (get_similarity_search_settings, get_embedding_storage_settings, get_pivot_table_settings,
+                               get_pipeline_settings, get_clustering_settings, load_mapping)
 from src.logs.logger import logger  # Import the logger
+from src.logs.tracing import span
 
 def process_and_cluster_comments(
     input_csv: str,
     output_csv: str,
-    embeddings_file: str,
-    cluster_labels_file: str,
+    artifact_dir: str,
     mapping_file: str,
-    hierarchy_file: str
+    hierarchy_file: str,
+    build_index: Optional[bool] = None,
+    model_name: str = 'all-MiniLM-L6-v2',
+    streaming: Optional[bool] = None,
+    chunk_size: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
 ) -> None:
     """
     Process a CSV file of comments, generate embeddings, cluster the embeddings, map clusters to labels,
@@ -22,71 +39,333 @@ def process_and_cluster_comments(
     Parameters
     ----------
     input_csv : str
-        Path to the input CSV file containing at least a 'comment' and 'date' column.
+        Path to the input CSV file containing at least a 'comment' and 'date' column, or to a
+        date-partitioned dataset store directory (see `dataset_store.DatasetStore`).
     output_csv : str
         Path to save the processed DataFrame with assigned cluster and standard labels.
-    embeddings_file : str
-        Path to save the generated embeddings as a pickle file.
-    cluster_labels_file : str
-        Path to save the cluster labels as a pickle file.
+    artifact_dir : str
+        Directory to save the embeddings and cluster labels as memory-mappable
+        artifacts (see `artifact_store.save_artifacts`), stored in the
+        `embedding_storage.dtype` configured in config.json.
     mapping_file : str
         Path to the JSON file containing the cluster-to-label mapping.
     hierarchy_file : str
-        Path to save the built hierarchy as a JSON file.
+        Path to save the built hierarchy as a JSON file. The hierarchy store and the
+        long-format pivot table are rebuilt from the same hierarchy.
+    build_index : bool, optional
+        Whether to build an approximate-nearest-neighbour index in `artifact_dir`.
+        Defaults to the `similarity_search` config (built when 'build_ann_index' is true or
+        'mode' is 'approximate'). Cluster prototypes (see `prototypes`) are built when
+        'build_prototypes' is true or 'mode' is 'prototype'.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model, recorded in the artifact manifest.
+    streaming : bool, optional
+        Read, preprocess and embed `input_csv` in chunks (see `stream_embeddings`) instead of
+        loading it whole. Defaults to `pipeline.mode` == 'streaming' in config.json.
+    chunk_size : int, optional
+        Rows per chunk in streaming mode. Defaults to `pipeline.chunk_size`.
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM-DD' range of rows to read when `input_csv` is a dataset store.
 
     Returns
     -------
     None
+
+    Notes
+    -----
+    Each stage (load, preprocess, embed, cluster, map, save, hierarchy, pivot) runs in a
+    `tracing.span`, so its duration and throughput are logged and recorded in the run summary
+    when called inside `tracing.trace_run`. In streaming mode load, preprocess and embed are
+    interleaved per chunk and recorded as one 'ingest' span.
     """
+    settings = get_pipeline_settings()
+    if streaming is None:
+        streaming = settings['mode'] == 'streaming'
+    if streaming:
+        _process_and_cluster_streaming(input_csv, output_csv, artifact_dir, mapping_file, hierarchy_file,
+                                       build_index, model_name, chunk_size or settings['chunk_size'],
+                                       start_date, end_date)
+        return
+
     logger.info(f"Starting comment processing and clustering pipeline for {input_csv}.")
 
     # Load data
-    logger.info("Loading data from CSV.")
-    df = pd.read_csv(input_csv)
-    df['comment'] = df['comment'].astype(str)
+    with span('load') as stage:
+        df = load_comments(input_csv, start_date, end_date)
+        df['comment'] = df['comment'].astype(str)
+        stage.set_rows(len(df))
+    n_rows = len(df)
 
     # Preprocess
-    logger.info("Preprocessing comments.")
-    df = preprocess_comments(df, comment_col='comment')
+    with span('preprocess', rows=n_rows):
+        logger.info("Preprocessing comments.")
+        df = preprocess_comments(df, comment_col='comment')
 
     # Generate embeddings
-    logger.info("Generating embeddings.")
-    embeddings = generate_embeddings(df['cleaned_comment'].tolist())
+    with span('embed', rows=n_rows):
+        logger.info("Generating embeddings.")
+        embeddings = generate_embeddings(df['cleaned_comment'].tolist(), model_name=model_name)
 
     # Cluster
-    logger.info("Clustering embeddings.")
-    cluster_labels = cluster_embeddings(embeddings)
-    df['cluster'] = cluster_labels
+    with span('cluster', rows=n_rows):
+        logger.info("Clustering embeddings.")
+        cluster_labels, merge_tree = cluster_embeddings(embeddings, return_tree=True)
+        df['cluster'] = cluster_labels
 
     # Map clusters
-    logger.info(f"Loading cluster label mapping from {mapping_file}.")
-    CLUSTER_LABEL_MAPPING = load_mapping(mapping_file)
+    with span('map', rows=n_rows):
+        logger.info(f"Loading cluster label mapping from {mapping_file}.")
+        CLUSTER_LABEL_MAPPING = load_mapping(mapping_file)
+
+        logger.info("Mapping cluster labels to standard labels.")
+        df['standard_label'] = map_clusters_to_labels(cluster_labels, CLUSTER_LABEL_MAPPING)
+
+    with span('save', rows=n_rows):
+        _save_model_artifacts(artifact_dir, embeddings, cluster_labels, model_name, build_index, merge_tree)
+
+        # Save DataFrame with labels
+        logger.info(f"Saving processed DataFrame to {output_csv}.")
+        df.to_csv(output_csv, index=False)
+
+    _rebuild_hierarchy(df, hierarchy_file)
 
-    logger.info("Mapping cluster labels to standard labels.")
-    df['standard_label'] = map_clusters_to_labels(cluster_labels, CLUSTER_LABEL_MAPPING)
+    logger.info("Comment processing and clustering pipeline completed successfully.")
 
+def _save_model_artifacts(artifact_dir: str, embeddings: np.ndarray, cluster_labels: np.ndarray,
+                          model_name: str, build_index: Optional[bool], merge_tree: Optional[MergeTree] = None) -> None:
     # Save embeddings and clusters
-    logger.info(f"Saving embeddings to {embeddings_file}.")
-    with open(embeddings_file, 'wb') as f:
-        pickle.dump(embeddings, f)
+    logger.info(f"Saving embeddings and cluster labels to {artifact_dir}.")
+    save_artifacts(artifact_dir, embeddings, cluster_labels, model_name=model_name,
+                   dtype=get_embedding_storage_settings()['dtype'])
 
-    logger.info(f"Saving cluster labels to {cluster_labels_file}.")
-    with open(cluster_labels_file, 'wb') as f:
-        pickle.dump(cluster_labels, f)
+    # Keep the merge tree so the distance threshold can be re-cut without re-clustering
+    tree_path = merge_tree_path(artifact_dir)
+    if merge_tree is not None and get_clustering_settings()['save_merge_tree']:
+        merge_tree.save(tree_path)
+    elif os.path.exists(tree_path):
+        os.remove(tree_path)
 
-    # Save DataFrame with labels
-    logger.info(f"Saving processed DataFrame to {output_csv}.")
-    df.to_csv(output_csv, index=False)
+    # Build the optional ANN index used by approximate search in production
+    search_settings = get_similarity_search_settings()
+    if build_index is None:
+        build_index = search_settings['build_ann_index'] or search_settings['mode'] == 'approximate'
+    if build_index:
+        logger.info("Building approximate-nearest-neighbour index.")
+        build_ann_index(embeddings, artifact_dir,
+                        n_lists=search_settings['n_lists'], n_probe=search_settings['n_probe'])
 
-    # Sort by date
-    logger.info("Sorting DataFrame by date.")
-    df['date'] = pd.to_datetime(df['date'], format='mixed', dayfirst=True)
-    df = df.sort_values(by='date')
+    # Build the optional cluster prototypes used by prototype search in production
+    if search_settings['build_prototypes'] or search_settings['mode'] == 'prototype':
+        logger.info("Building cluster prototypes.")
+        build_prototypes(*load_artifacts(artifact_dir)[:2], artifact_dir,
+                         method=search_settings['prototype_method'], n_medoids=search_settings['n_medoids'])
 
-    # Build hierarchy and save
-    logger.info("Building hierarchy.")
-    hierarchy = build_hierarchy(df)
-    logger.info(f"Saving hierarchy to {hierarchy_file}.")
-    save_hierarchy(hierarchy, hierarchy_file)
+def _rebuild_hierarchy(df: pd.DataFrame, hierarchy_file: str) -> None:
+    with span('hierarchy', rows=len(df)):
+        # Sort by date
+        logger.info("Sorting DataFrame by date.")
+        df['date'] = pd.to_datetime(df['date'], format='mixed', dayfirst=True)
+        df = df.sort_values(by='date')
 
-    logger.info("Comment processing and clustering pipeline completed successfully.")
+        # Build hierarchy and save
+        logger.info("Building hierarchy.")
+        hierarchy = build_hierarchy(df)
+        logger.info(f"Saving hierarchy to {hierarchy_file}.")
+        save_hierarchy(hierarchy, hierarchy_file)
+
+        # Reset the hierarchy store that production runs append to
+        logger.info("Rebuilding hierarchy store.")
+        hierarchy_rows = nested_to_rows(hierarchy)
+        with open_hierarchy_store() as store:
+            store.clear()
+            store.append(hierarchy_rows)
+
+    # Rebuild the pivot table that production runs update
+    with span('pivot', rows=len(df)):
+        save_pivot_table(pivot_cells(hierarchy_rows), get_pivot_table_settings()['path'])
+
+def _check_date_range(input_csv: str, start_date: Optional[str], end_date: Optional[str]) -> None:
+    if (start_date is not None or end_date is not None) and not is_dataset_store(input_csv):
+        raise ValueError(f"A date range can only be read from a dataset store, not from {input_csv}.")
+
+def load_comments(input_csv: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    """
+    Load the training comments from a CSV file or a dataset store directory.
+
+    Parameters
+    ----------
+    input_csv : str
+        Path to a CSV file or to a `DatasetStore` directory.
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM-DD' range; only supported for a dataset store.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The comment rows. Rows from a dataset store come in date order, with datetime64 dates.
+    """
+    _check_date_range(input_csv, start_date, end_date)
+    if is_dataset_store(input_csv):
+        logger.info(f"Loading data from dataset store {input_csv} ({start_date or 'start'} to {end_date or 'end'}).")
+        return DatasetStore(input_csv).read(start_date, end_date)
+    logger.info("Loading data from CSV.")
+    return pd.read_csv(input_csv)
+
+def read_comment_chunks(input_csv: str, chunk_size: int, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a comments CSV or dataset store in chunks of about `chunk_size` rows, with 'comment' as text.
+
+    Parameters
+    ----------
+    input_csv : str
+        Path to the CSV file or `DatasetStore` directory. Dataset partitions are combined
+        until a chunk holds at least `chunk_size` rows.
+    chunk_size : int
+        Rows per chunk.
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM-DD' range; only supported for a dataset store.
+
+    Yields
+    ------
+    pandas.DataFrame
+        The next chunk.
+    """
+    _check_date_range(input_csv, start_date, end_date)
+    if is_dataset_store(input_csv):
+        chunks = _coalesce(DatasetStore(input_csv).iter_partitions(start_date, end_date), chunk_size)
+    else:
+        chunks = pd.read_csv(input_csv, chunksize=chunk_size)
+    for chunk in chunks:
+        chunk['comment'] = chunk['comment'].astype(str)
+        yield chunk
+
+def _coalesce(frames: Iterable[pd.DataFrame], chunk_size: int) -> Iterator[pd.DataFrame]:
+    pending, pending_rows = [], 0
+    for frame in frames:
+        pending.append(frame)
+        pending_rows += len(frame)
+        if pending_rows >= chunk_size:
+            yield pd.concat(pending, ignore_index=True)
+            pending, pending_rows = [], 0
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+def preprocess_chunks(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """
+    Add the 'cleaned_comment' column to each chunk (see `preprocess_comments`).
+    """
+    for chunk in chunks:
+        yield preprocess_comments(chunk, comment_col='comment')
+
+def embed_chunks(chunks: Iterable[pd.DataFrame], writer: NpyAppendWriter,
+                 model_name: str = 'all-MiniLM-L6-v2') -> Iterator[pd.DataFrame]:
+    """
+    Embed the cleaned comments of each chunk and append the vectors to `writer`.
+
+    Parameters
+    ----------
+    chunks : iterable of pandas.DataFrame
+        Preprocessed chunks.
+    writer : NpyAppendWriter
+        On-disk array receiving the embeddings, in row order.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Each chunk once its embeddings are on disk.
+    """
+    for chunk in chunks:
+        writer.append(generate_embeddings(chunk['cleaned_comment'].tolist(), model_name=model_name))
+        yield chunk
+
+def stream_embeddings(input_csv: str, rows_csv: str, embeddings_file: str, chunk_size: int,
+                      model_name: str = 'all-MiniLM-L6-v2', start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> int:
+    """
+    Read, preprocess and embed a comments CSV chunk by chunk.
+
+    The chunks flow through the `read_comment_chunks` -> `preprocess_chunks` -> `embed_chunks`
+    generators; embeddings are appended to the on-disk `embeddings_file` and the preprocessed
+    rows to `rows_csv`, so memory during ingestion and encoding is bounded by `chunk_size`
+    rather than by the size of `input_csv`.
+
+    Parameters
+    ----------
+    input_csv : str
+        Path to the input CSV file containing at least a 'comment' column, or to a dataset store.
+    rows_csv : str
+        CSV receiving the preprocessed rows.
+    embeddings_file : str
+        `.npy` file receiving the embeddings; memory-map it with `np.load(..., mmap_mode='r')`.
+    chunk_size : int
+        Rows per chunk.
+    model_name : str, optional (default='all-MiniLM-L6-v2')
+        Name of the SentenceTransformer model.
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM-DD' range; only supported for a dataset store.
+
+    Returns
+    -------
+    int
+        Number of rows streamed.
+    """
+    n_rows = 0
+    with NpyAppendWriter(embeddings_file) as writer:
+        chunks = embed_chunks(preprocess_chunks(read_comment_chunks(input_csv, chunk_size, start_date, end_date)),
+                              writer, model_name)
+        for chunk in chunks:
+            chunk.to_csv(rows_csv, mode='w' if n_rows == 0 else 'a', header=n_rows == 0, index=False)
+            n_rows += len(chunk)
+            logger.info(f"Streamed {n_rows} rows.")
+    return n_rows
+
+def _process_and_cluster_streaming(input_csv: str, output_csv: str, artifact_dir: str, mapping_file: str,
+                                   hierarchy_file: str, build_index: Optional[bool], model_name: str,
+                                   chunk_size: int, start_date: Optional[str], end_date: Optional[str]) -> None:
+    logger.info(f"Starting streaming comment processing and clustering pipeline for {input_csv} "
+                f"in chunks of {chunk_size} rows.")
+    rows_csv = output_csv + '.rows.tmp'
+    embeddings_file = os.path.join(artifact_dir, 'embeddings.stream.npy')
+
+    with span('ingest') as stage:
+        n_rows = stream_embeddings(input_csv, rows_csv, embeddings_file, chunk_size, model_name=model_name,
+                                   start_date=start_date, end_date=end_date)
+        stage.set_rows(n_rows)
+    embeddings = np.load(embeddings_file, mmap_mode='r')
+
+    with span('cluster', rows=n_rows):
+        logger.info("Clustering embeddings.")
+        cluster_labels, merge_tree = cluster_embeddings(embeddings, return_tree=True)
+        cluster_labels = np.asarray(cluster_labels)
+
+    with span('map', rows=n_rows):
+        logger.info(f"Loading cluster label mapping from {mapping_file}.")
+        standard_labels = np.asarray(map_clusters_to_labels(cluster_labels, load_mapping(mapping_file)), dtype=object)
+
+    with span('save', rows=n_rows):
+        _save_model_artifacts(artifact_dir, embeddings, cluster_labels, model_name, build_index, merge_tree)
+        del embeddings
+        os.remove(embeddings_file)
+
+        # Copy the streamed rows to output_csv with their labels, one chunk at a time
+        logger.info(f"Saving processed rows to {output_csv}.")
+        start = 0
+        for chunk in pd.read_csv(rows_csv, chunksize=chunk_size, converters={'comment': str}):
+            chunk['cluster'] = cluster_labels[start:start + len(chunk)]
+            chunk['standard_label'] = standard_labels[start:start + len(chunk)]
+            chunk.to_csv(output_csv + '.tmp', mode='w' if start == 0 else 'a', header=start == 0, index=False)
+            start += len(chunk)
+        os.replace(output_csv + '.tmp', output_csv)
+        os.remove(rows_csv)
+
+    # The hierarchy needs only its own columns
+    df = pd.read_csv(output_csv, usecols=['source', 'curve_list', 'grouping_var', 'date', 'comment', 'standard_label'],
+                     converters={'comment': str})
+    if is_dataset_store(input_csv):
+        # Dataset store dates were written to the CSV as ISO dates, which day-first parsing would swap
+        df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+    _rebuild_hierarchy(df, hierarchy_file)
+    logger.info("Streaming comment processing and clustering pipeline completed successfully.")
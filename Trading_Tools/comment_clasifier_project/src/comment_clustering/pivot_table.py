@@ -0,0 +1,314 @@
+import os
+import re
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from src.comment_clustering.build_hierarchy import first_appearance_codes
+from src.comment_clustering.hierarchy_store import HierarchyStore, normalize_hierarchy_rows
+from src.logs.logger import logger  # Import the logger
+
+PIVOT_KEY = ['source', 'curve', 'grouping_var']
+PIVOT_COLUMNS = PIVOT_KEY + ['date', 'cell']
+# Excel allows 16384 columns; three of them hold the key
+MAX_EXCEL_DATE_COLUMNS = 16384 - len(PIVOT_KEY)
+KEYS_DIRECTORY = 'keys'
+UNDATED_PARTITION = 'undated'
+_PARTITION_PATTERN = re.compile(r'^date=(\d{4}-\d{2}-\d{2}|' + UNDATED_PARTITION + r')\.parquet$')
+
+def _partition_file(date: Optional[str]) -> str:
+    return f"date={UNDATED_PARTITION if pd.isna(date) else date}.parquet"
+
+def pivot_cells(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn hierarchy rows into long-format pivot cells.
+
+    Each (source, curve, grouping_var, date) holds one cell, "[standard_label] comment";
+    when a key has several comments on one date the last one wins, as in the wide pivot.
+
+    Parameters
+    ----------
+    rows : pandas.DataFrame
+        Comment rows with the hierarchy store columns ('source', 'curve_list',
+        'grouping_var', 'date', 'comment', 'standard_label'), in insertion order.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `PIVOT_COLUMNS` columns, one row per filled cell. Undated comments keep their
+        key with date None; `render_pivot_xlsx` gives them a row but no date column.
+    """
+    rows = normalize_hierarchy_rows(rows)
+    cells = pd.DataFrame({
+        'source': rows['source'],
+        'curve': rows['curve_list'],
+        'grouping_var': rows['grouping_var'],
+        'date': rows['date'],
+        'cell': '[' + rows['standard_label'].fillna('None') + '] ' + rows['comment'].fillna('None'),
+    })
+    # Keep each cell where its (key, date) first appears, with the value of its last comment
+    positions = pd.Series(np.arange(len(cells))).groupby(first_appearance_codes(cells[PIVOT_KEY + ['date']]))
+    deduplicated = cells.iloc[positions.min().to_numpy()].reset_index(drop=True)
+    deduplicated['cell'] = cells['cell'].to_numpy()[positions.max().to_numpy()]
+    return deduplicated
+
+class PivotTableStore:
+    """
+    Long-format pivot table, partitioned by date in Parquet files.
+
+    The cells of each date live in `<root>/date=YYYY-MM-DD.parquet` (undated cells in
+    `date=undated.parquet`), and the (source, curve, grouping_var) keys, in order of first
+    appearance, in `<root>/keys/part-NNNNN.parquet`. An update rewrites only the
+    partitions of the dates it touches and appends its new keys as one more part, so its
+    cost does not grow with the size of the table. A single-file table written by
+    earlier versions is split into partitions when it is opened.
+
+    Parameters
+    ----------
+    root : str
+        Table directory. Created if it does not exist.
+    """
+
+    def __init__(self, root: str):
+        legacy_cells = None
+        if os.path.isfile(root):
+            logger.info(f"Converting single-file pivot table {root} to date partitions.")
+            legacy_cells = pd.read_parquet(root, columns=PIVOT_COLUMNS)
+            legacy_cells['date'] = legacy_cells['date'].replace('', None)
+            os.remove(root)
+        os.makedirs(os.path.join(root, KEYS_DIRECTORY), exist_ok=True)
+        self.root = root
+        if legacy_cells is not None:
+            self.replace(legacy_cells)
+
+    def partitions(self) -> List[str]:
+        """
+        Return the partition file names, dated ones in date order, then 'date=undated.parquet'.
+        """
+        names = [name for name in os.listdir(self.root) if _PARTITION_PATTERN.match(name)]
+        return sorted(names, key=lambda name: (name == _partition_file(None), name))
+
+    def _key_parts(self) -> List[str]:
+        directory = os.path.join(self.root, KEYS_DIRECTORY)
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if name.startswith('part-') and name.endswith('.parquet')]
+
+    def keys(self) -> pd.DataFrame:
+        """
+        Return the `PIVOT_KEY` columns of every key, in order of first appearance.
+        """
+        parts = self._key_parts()
+        if not parts:
+            return pd.DataFrame(columns=PIVOT_KEY, dtype=object)
+        return pd.concat([pd.read_parquet(path, columns=PIVOT_KEY) for path in parts], ignore_index=True)
+
+    def _write(self, frame: pd.DataFrame, path: str) -> None:
+        frame.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def _append_keys(self, cells: pd.DataFrame, known_keys: pd.DataFrame) -> int:
+        # Keys of `cells` that are not known yet, in order of first appearance, become a new part
+        candidates = pd.concat([known_keys[PIVOT_KEY], cells[PIVOT_KEY]], ignore_index=True)
+        first_rows = np.unique(first_appearance_codes(candidates), return_index=True)[1]
+        new_keys = candidates.iloc[np.sort(first_rows[first_rows >= len(known_keys)])]
+        if len(new_keys):
+            part_path = os.path.join(self.root, KEYS_DIRECTORY, f"part-{len(self._key_parts()):05d}.parquet")
+            self._write(new_keys.astype(object), part_path)
+        return len(new_keys)
+
+    def read(self) -> pd.DataFrame:
+        """
+        Read every cell.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The `PIVOT_COLUMNS` columns, grouped by key in order of the keys' first appearance,
+            so `render_pivot_xlsx` lays the rows out as when the cells were added.
+        """
+        frames = [pd.read_parquet(os.path.join(self.root, name), columns=PIVOT_COLUMNS) for name in self.partitions()]
+        if not frames:
+            return pd.DataFrame(columns=PIVOT_COLUMNS, dtype=object)
+        cells = pd.concat(frames, ignore_index=True)
+        keys = self.keys()
+        key_ids = first_appearance_codes(pd.concat([keys, cells[PIVOT_KEY]], ignore_index=True))[len(keys):]
+        return cells.iloc[np.argsort(key_ids, kind='stable')].reset_index(drop=True)
+
+    def replace(self, cells: pd.DataFrame) -> None:
+        """
+        Replace the whole table with `cells`.
+
+        Parameters
+        ----------
+        cells : pandas.DataFrame
+            The `PIVOT_COLUMNS` columns.
+        """
+        for name in self.partitions():
+            os.remove(os.path.join(self.root, name))
+        for path in self._key_parts():
+            os.remove(path)
+        self._append_keys(cells, self.keys())
+        dates = cells['date']
+        for date in pd.unique(dates):
+            in_partition = dates.isna() if pd.isna(date) else dates == date
+            self._write(cells.loc[in_partition.to_numpy(), PIVOT_COLUMNS], os.path.join(self.root, _partition_file(date)))
+        logger.info(f"Pivot table with {len(cells)} cells saved to {self.root}.")
+
+    def update(self, new_cells: pd.DataFrame) -> None:
+        """
+        Overwrite or add cells, rewriting only the partitions of their dates.
+
+        Parameters
+        ----------
+        new_cells : pandas.DataFrame
+            Cells from `pivot_cells`.
+        """
+        n_new_keys = self._append_keys(new_cells, self.keys())
+        dates = new_cells['date']
+        touched = pd.unique(dates)
+        for date in touched:
+            in_partition = dates.isna() if pd.isna(date) else dates == date
+            partition_cells = new_cells.loc[in_partition.to_numpy(), PIVOT_COLUMNS]
+            path = os.path.join(self.root, _partition_file(date))
+            if os.path.exists(path):
+                partition_cells = merge_pivot_cells(pd.read_parquet(path, columns=PIVOT_COLUMNS), partition_cells)
+            self._write(partition_cells, path)
+        logger.info(f"Pivot table {self.root} updated: {len(new_cells)} cells in {len(touched)} date partitions, "
+                    f"{n_new_keys} new keys.")
+
+def load_pivot_table(filepath: str) -> pd.DataFrame:
+    """
+    Load the materialised long-format pivot table.
+
+    Parameters
+    ----------
+    filepath : str
+        Pivot table directory written by `save_pivot_table` or `update_pivot_table`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `PIVOT_COLUMNS` columns.
+    """
+    logger.info(f"Loading pivot table from {filepath}.")
+    return PivotTableStore(filepath).read()
+
+def save_pivot_table(cells: pd.DataFrame, filepath: str) -> None:
+    """
+    Write the long-format pivot table, replacing any previous one.
+
+    Parameters
+    ----------
+    cells : pandas.DataFrame
+        The `PIVOT_COLUMNS` columns.
+    filepath : str
+        Pivot table directory (see `PivotTableStore`).
+    """
+    PivotTableStore(filepath).replace(cells)
+
+def merge_pivot_cells(cells: pd.DataFrame, new_cells: pd.DataFrame) -> pd.DataFrame:
+    """
+    Overwrite or add the cells of the touched keys.
+
+    Existing cells keep their position; new (key, date) cells are appended.
+
+    Parameters
+    ----------
+    cells : pandas.DataFrame
+        The current cells (of one date partition).
+    new_cells : pandas.DataFrame
+        Cells from `pivot_cells` for the new comments.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The updated cells.
+    """
+    on = PIVOT_KEY + ['date']
+    merged = cells.merge(new_cells, on=on, how='left', suffixes=('', '_new'))
+    updated = merged['cell_new'].notna()
+    merged.loc[updated, 'cell'] = merged.loc[updated, 'cell_new']
+    added = new_cells.merge(cells[on], on=on, how='left', indicator=True)
+    added = added[added['_merge'] == 'left_only']
+    logger.info(f"Pivot update: {int(updated.sum())} cells overwritten, {len(added)} cells added.")
+    return pd.concat([merged[PIVOT_COLUMNS], added[PIVOT_COLUMNS]], ignore_index=True)
+
+def update_pivot_table(new_rows: pd.DataFrame, filepath: str, store: Optional[HierarchyStore] = None) -> None:
+    """
+    Apply new comments to the materialised pivot table.
+
+    Only the date partitions of `new_rows` are rewritten (see `PivotTableStore`). When
+    the table does not exist yet it is built once from every row of `store`, which must
+    already contain `new_rows`.
+
+    Parameters
+    ----------
+    new_rows : pandas.DataFrame
+        New comment rows in the hierarchy store format.
+    filepath : str
+        Pivot table directory.
+    store : HierarchyStore, optional
+        Hierarchy store used to build a missing pivot table.
+    """
+    pivot_store = PivotTableStore(filepath)
+    if pivot_store.partitions():
+        pivot_store.update(pivot_cells(new_rows))
+    elif store is not None:
+        logger.info(f"{filepath} is empty. Building the pivot table from the hierarchy store.")
+        pivot_store.replace(pivot_cells(store.to_dataframe()))
+    else:
+        pivot_store.replace(pivot_cells(new_rows))
+
+def render_pivot_xlsx(cells: pd.DataFrame, filepath: str, last_n_dates: Optional[int] = None) -> None:
+    """
+    Write the wide "Pivoted_Comments_Table" report from the long-format pivot table.
+
+    One row per (source, curve, grouping_var), one column per date (ascending), streamed
+    through a write-only workbook so the wide table is never built in memory.
+
+    Parameters
+    ----------
+    cells : pandas.DataFrame
+        The long-format pivot table (`PIVOT_COLUMNS`).
+    filepath : str
+        Output xlsx file.
+    last_n_dates : int, optional
+        Only show the most recent `last_n_dates` date columns. Without it the dates
+        are still capped at Excel's column limit (keeping the most recent ones).
+
+    Returns
+    -------
+    None
+    """
+    from openpyxl import Workbook
+    # Undated cells keep their key's row but get no column, as in the original wide pivot
+    dates = np.sort(cells['date'].dropna().unique())
+    limit = last_n_dates if last_n_dates else MAX_EXCEL_DATE_COLUMNS
+    if len(dates) > limit:
+        if not last_n_dates:
+            logger.warning(f"{len(dates)} dates exceed Excel's column limit; keeping the last {limit}.")
+        dates = dates[-limit:]
+
+    # Rows follow the nested hierarchy: sources, then their curves, then grouping variables, by first appearance
+    source_codes = first_appearance_codes(cells[['source']])
+    curve_codes = first_appearance_codes(cells[['source', 'curve']])
+    key_codes = first_appearance_codes(cells[PIVOT_KEY])
+    order = np.lexsort((np.arange(len(cells)), key_codes, curve_codes, source_codes))
+    boundaries = np.flatnonzero(np.diff(key_codes[order], prepend=-1, append=-1))
+
+    in_window = cells['date'].isin(dates).to_numpy()
+    date_codes = np.searchsorted(dates, cells['date'].fillna('').to_numpy())
+    cell_values = cells['cell'].to_numpy()
+    key_values = cells[PIVOT_KEY].to_numpy()
+
+    logger.info(f"Writing pivoted comments ({len(boundaries) - 1} rows x {len(dates)} dates) to {filepath}.")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(PIVOT_KEY + list(dates))
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        row = [None] * len(dates)
+        for position in order[start:stop]:
+            if in_window[position]:
+                row[date_codes[position]] = cell_values[position]
+        sheet.append(list(key_values[order[start]]) + row)
+    workbook.save(filepath)
+    logger.info(f"Pivoted comments saved to {filepath}.")
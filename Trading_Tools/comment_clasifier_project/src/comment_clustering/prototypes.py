@@ -0,0 +1,269 @@
+import os
+import numpy as np
+from typing import Tuple
+from src.comment_clustering.similarity_search import ExactSimilaritySearch, DEFAULT_BLOCK_SIZE
+from src.logs.logger import logger  # Import the logger
+
+PROTOTYPES_FILE = 'prototypes.npz'
+PROTOTYPE_METHODS = ('centroid', 'medoid')
+
+def prototypes_path(artifact_dir: str) -> str:
+    """
+    Return the path of the cluster prototypes stored next to the saved embeddings.
+
+    Parameters
+    ----------
+    artifact_dir : str
+        Artifact directory holding the saved embeddings (see `artifact_store`).
+
+    Returns
+    -------
+    str
+        Path of the prototypes file inside `artifact_dir`.
+    """
+    return os.path.join(artifact_dir, PROTOTYPES_FILE)
+
+def cluster_centroids(embeddings, cluster_labels: np.ndarray,
+                      block_size: int = 65536) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the centroid and size of every cluster.
+
+    The embeddings are read `block_size` rows at a time, so memory-mapped or
+    quantised artifacts are never expanded as a whole.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray of shape (n_samples, dim) or QuantizedEmbeddings
+        Clustered embeddings.
+    cluster_labels : np.ndarray of shape (n_samples,)
+        Cluster label of each embedding.
+    block_size : int, optional (default=65536)
+        Number of rows summed at a time.
+
+    Returns
+    -------
+    cluster_ids : np.ndarray of shape (n_clusters,)
+        The distinct cluster labels.
+    centroids : np.ndarray of shape (n_clusters, dim), float32
+        Mean embedding of each cluster.
+    sizes : np.ndarray of shape (n_clusters,)
+        Number of embeddings in each cluster.
+    """
+    from scipy import sparse
+    cluster_labels = np.asarray(cluster_labels)
+    cluster_ids, positions = np.unique(cluster_labels, return_inverse=True)
+    sums = np.zeros((len(cluster_ids), embeddings.shape[1]), dtype=np.float64)
+    for start in range(0, len(cluster_labels), block_size):
+        stop = min(start + block_size, len(cluster_labels))
+        block = np.asarray(embeddings[start:stop], dtype=np.float32)
+        # One-hot (cluster x row) matrix times the block adds every row to its cluster sum
+        one_hot = sparse.csr_matrix((np.ones(stop - start, dtype=np.float32), (positions[start:stop], np.arange(stop - start))),
+                                    shape=(len(cluster_ids), stop - start))
+        sums += one_hot @ block
+    sizes = np.bincount(positions, minlength=len(cluster_ids))
+    return cluster_ids, (sums / sizes[:, None]).astype(np.float32), sizes
+
+def _greedy_medoids(members: np.ndarray, n_medoids: int) -> np.ndarray:
+    # Facility-location greedy: each pick adds the most similarity to the members' closest medoid
+    similarity = members @ members.T
+    best = np.full(len(members), -np.inf, dtype=similarity.dtype)
+    chosen = []
+    for _ in range(min(n_medoids, len(members))):
+        gain = np.maximum(similarity, best[:, None]).sum(axis=0)
+        gain[chosen] = -np.inf
+        pick = int(np.argmax(gain))
+        chosen.append(pick)
+        best = np.maximum(best, similarity[:, pick])
+    return np.array(chosen, dtype=np.int64)
+
+def cluster_medoids(embeddings, cluster_labels: np.ndarray, n_medoids: int = 3, max_members: int = 2000,
+                    random_state: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pick up to `n_medoids` representative rows of every cluster.
+
+    Medoids are chosen greedily so that every member is as similar as possible to its
+    closest medoid; the first medoid is the most central member. Clusters larger than
+    `max_members` are represented by a random sample of that size.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray of shape (n_samples, dim) or QuantizedEmbeddings
+        L2-normalised clustered embeddings.
+    cluster_labels : np.ndarray of shape (n_samples,)
+        Cluster label of each embedding.
+    n_medoids : int, optional (default=3)
+        Medoids per cluster.
+    max_members : int, optional (default=2000)
+        Largest number of members compared per cluster.
+    random_state : int, optional
+        Seed of the member sample. Default is 0.
+
+    Returns
+    -------
+    medoid_rows : np.ndarray of shape (n_prototypes,)
+        Row indices of the medoids, grouped by cluster.
+    medoids : np.ndarray of shape (n_prototypes, dim), float32
+        Their embeddings.
+    """
+    rng = np.random.default_rng(random_state)
+    cluster_labels = np.asarray(cluster_labels)
+    order = np.argsort(cluster_labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(cluster_labels[order])) + 1
+    medoid_rows = []
+    for rows in np.split(order, boundaries):
+        if len(rows) > max_members:
+            rows = np.sort(rng.choice(rows, size=max_members, replace=False))
+        members = np.asarray(embeddings[rows], dtype=np.float32)
+        medoid_rows.append(rows[_greedy_medoids(members, n_medoids)])
+    medoid_rows = np.concatenate(medoid_rows) if medoid_rows else np.empty(0, dtype=np.int64)
+    return medoid_rows, np.asarray(embeddings[medoid_rows], dtype=np.float32)
+
+class PrototypeSimilaritySearch:
+    """
+    Nearest-prototype search: new comments are scored against a few prototypes per cluster
+    instead of every saved embedding.
+
+    Each prototype is a cluster centroid or medoid and carries the row of one member of its
+    cluster, so `search` returns reference row indices like the other search backends and
+    `assign_labels_based_on_similarity` can look the cluster up in the saved labels.
+    Scores are the cosine similarity to the prototype.
+
+    Parameters
+    ----------
+    prototypes : numpy.ndarray of shape (n_prototypes, dim)
+        L2-normalised prototype embeddings.
+    prototype_rows : numpy.ndarray of shape (n_prototypes,)
+        Reference row of a member of each prototype's cluster.
+    method : str, optional (default='centroid')
+        How the prototypes were computed, 'centroid' or 'medoid'.
+    block_size : int, optional (default=1024)
+        Number of query rows scored per matrix multiply.
+    """
+
+    def __init__(self, prototypes: np.ndarray, prototype_rows: np.ndarray, method: str = 'centroid',
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        self.prototypes = np.asarray(prototypes, dtype=np.float32)
+        self.prototype_rows = np.asarray(prototype_rows, dtype=np.int64)
+        self.method = method
+        self._search = ExactSimilaritySearch(self.prototypes, block_size=block_size, normalized=True)
+
+    def __len__(self) -> int:
+        return len(self.prototypes)
+
+    @classmethod
+    def build(cls, embeddings, cluster_labels: np.ndarray, method: str = 'centroid', n_medoids: int = 3,
+              block_size: int = DEFAULT_BLOCK_SIZE) -> "PrototypeSimilaritySearch":
+        """
+        Compute the prototypes of every cluster.
+
+        Parameters
+        ----------
+        embeddings : np.ndarray of shape (n_samples, dim) or QuantizedEmbeddings
+            L2-normalised saved embeddings (may be memory-mapped).
+        cluster_labels : np.ndarray of shape (n_samples,)
+            Cluster label of each embedding.
+        method : str, optional (default='centroid')
+            'centroid' for one normalised mean per cluster, 'medoid' for up to `n_medoids`
+            member rows per cluster.
+        n_medoids : int, optional (default=3)
+            Medoids per cluster.
+        block_size : int, optional (default=1024)
+            Number of query rows scored per matrix multiply.
+
+        Returns
+        -------
+        PrototypeSimilaritySearch
+            The prototypes.
+        """
+        from sklearn.preprocessing import normalize
+        if method not in PROTOTYPE_METHODS:
+            raise ValueError(f"Unsupported prototype method '{method}'. Expected one of {PROTOTYPE_METHODS}.")
+        logger.info(f"Computing {method} prototypes of {len(cluster_labels)} embeddings.")
+        cluster_labels = np.asarray(cluster_labels)
+        if method == 'centroid':
+            _, centroids, _ = cluster_centroids(embeddings, cluster_labels)
+            _, prototype_rows = np.unique(cluster_labels, return_index=True)
+            prototypes = normalize(centroids)
+        else:
+            prototype_rows, prototypes = cluster_medoids(embeddings, cluster_labels, n_medoids=n_medoids)
+        logger.info(f"{len(prototypes)} prototypes computed for {len(np.unique(cluster_labels))} clusters.")
+        return cls(prototypes, prototype_rows, method=method, block_size=block_size)
+
+    def save(self, filepath: str) -> None:
+        """
+        Save the prototypes and their rows to an .npz file.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the output prototypes file.
+        """
+        logger.info(f"Saving {len(self)} {self.method} prototypes to {filepath}.")
+        np.savez(filepath, prototypes=self.prototypes, prototype_rows=self.prototype_rows, method=self.method)
+
+    @classmethod
+    def load(cls, filepath: str, block_size: int = DEFAULT_BLOCK_SIZE) -> "PrototypeSimilaritySearch":
+        """
+        Load prototypes saved with `save`.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the prototypes file.
+        block_size : int, optional (default=1024)
+            Number of query rows scored per matrix multiply.
+
+        Returns
+        -------
+        PrototypeSimilaritySearch
+            The loaded prototypes.
+        """
+        logger.info(f"Loading prototypes from {filepath}.")
+        with np.load(filepath) as data:
+            return cls(data['prototypes'], data['prototype_rows'], method=str(data['method']), block_size=block_size)
+
+    def search(self, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the closest prototype of every query.
+
+        Parameters
+        ----------
+        query_embeddings : numpy.ndarray of shape (n_queries, dim)
+            Embeddings of the new comments.
+
+        Returns
+        -------
+        closest_idx : numpy.ndarray of shape (n_queries,)
+            Reference row standing for the closest prototype's cluster.
+        closest_score : numpy.ndarray of shape (n_queries,)
+            Cosine similarity to the closest prototype.
+        """
+        closest_prototype, closest_score = self._search.search(query_embeddings)
+        return self.prototype_rows[closest_prototype], closest_score
+
+def build_prototypes(embeddings, cluster_labels: np.ndarray, artifact_dir: str, method: str = 'centroid',
+                     n_medoids: int = 3) -> PrototypeSimilaritySearch:
+    """
+    Compute the cluster prototypes of the saved embeddings and save them in the artifact directory.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray of shape (n_samples, dim) or QuantizedEmbeddings
+        The L2-normalised embeddings saved in `artifact_dir`.
+    cluster_labels : np.ndarray of shape (n_samples,)
+        The saved cluster labels.
+    artifact_dir : str
+        Artifact directory; the prototypes are written alongside the embeddings.
+    method : str, optional (default='centroid')
+        'centroid' or 'medoid'.
+    n_medoids : int, optional (default=3)
+        Medoids per cluster.
+
+    Returns
+    -------
+    PrototypeSimilaritySearch
+        The built prototypes.
+    """
+    search = PrototypeSimilaritySearch.build(embeddings, cluster_labels, method=method, n_medoids=n_medoids)
+    search.save(prototypes_path(artifact_dir))
+    return search
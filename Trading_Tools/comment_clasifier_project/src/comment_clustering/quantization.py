@@ -0,0 +1,175 @@
+import numpy as np
+from typing import Optional, Tuple
+from src.comment_clustering.similarity_search import ExactSimilaritySearch
+from src.logs.logger import logger  # Import the logger
+
+DEFAULT_REFERENCE_BLOCK_SIZE = 65536
+
+def quantize_embeddings(normalized_embeddings: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Quantise L2-normalised embeddings to float16 or per-row scaled int8.
+
+    For int8 every row is stored as `codes * scale`, where `scale = max(|row|) / 127`,
+    so each row uses the full int8 range.
+
+    Parameters
+    ----------
+    normalized_embeddings : np.ndarray of shape (n_samples, dim)
+        L2-normalised embeddings.
+    dtype : str
+        'float16' or 'int8'.
+
+    Returns
+    -------
+    codes : np.ndarray
+        The quantised rows.
+    scales : np.ndarray of shape (n_samples,) or None
+        float32 per-row scales for int8, None for float16.
+    """
+    normalized_embeddings = np.asarray(normalized_embeddings, dtype=np.float32)
+    if dtype == 'float16':
+        return normalized_embeddings.astype(np.float16), None
+    if dtype == 'int8':
+        scales = np.abs(normalized_embeddings).max(axis=1) / 127.0
+        scales[scales == 0.0] = 1.0
+        codes = np.rint(normalized_embeddings / scales[:, None]).clip(-127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unsupported quantisation dtype '{dtype}'. Expected 'float16' or 'int8'.")
+
+class QuantizedEmbeddings:
+    """
+    Per-row scaled int8 embeddings that behave like a read-only float32 matrix.
+
+    Indexing returns dequantised float32 rows, so code that gathers a few rows
+    (e.g. the IVF index) works unchanged, while `QuantizedSimilaritySearch` scores
+    the int8 codes directly.
+
+    Parameters
+    ----------
+    codes : np.ndarray of shape (n_samples, dim), int8
+        Quantised rows (may be a memory map).
+    scales : np.ndarray of shape (n_samples,), float32
+        Per-row scales.
+    """
+
+    dtype = np.dtype(np.float32)
+    ndim = 2
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.codes.shape
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, rows) -> np.ndarray:
+        codes = np.asarray(self.codes[rows], dtype=np.float32)
+        scales = self.scales[rows]
+        return codes * (scales[..., None] if codes.ndim == 2 else scales)
+
+    def dequantize(self) -> np.ndarray:
+        return self[:]
+
+class QuantizedSimilaritySearch:
+    """
+    Exact cosine nearest-neighbour search over float16 or int8 reference rows.
+
+    The reference rows must have been L2-normalised before quantisation. They are
+    never expanded as a whole: each query block is scored against `reference_block_size`
+    reference rows at a time, converted to float32 on the fly (and, for int8, the
+    per-row scale is applied to the scores), with a running best kept per query.
+
+    Parameters
+    ----------
+    reference : np.ndarray (float16) or QuantizedEmbeddings
+        Quantised, normalised reference rows.
+    block_size : int, optional (default=1024)
+        Number of query rows scored per pass.
+    reference_block_size : int, optional (default=65536)
+        Number of reference rows converted and multiplied at a time.
+    """
+
+    def __init__(self, reference, block_size: int = 1024,
+                 reference_block_size: int = DEFAULT_REFERENCE_BLOCK_SIZE):
+        if isinstance(reference, QuantizedEmbeddings):
+            self.codes, self.scales = reference.codes, reference.scales
+        else:
+            self.codes, self.scales = reference, None
+        if len(self.codes) == 0:
+            raise ValueError("Reference embeddings must be a non-empty 2D array.")
+        self.reference = reference
+        self.block_size = block_size
+        self.reference_block_size = reference_block_size
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def search(self, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the most similar reference row for every query embedding.
+
+        Parameters
+        ----------
+        query_embeddings : numpy.ndarray of shape (n_queries, dim)
+            Embeddings of the comments to classify.
+
+        Returns
+        -------
+        best_idx : numpy.ndarray of shape (n_queries,)
+            Index of the closest reference embedding for each query.
+        best_score : numpy.ndarray of shape (n_queries,)
+            Cosine similarity (float32) between each query and that reference embedding.
+        """
+        from sklearn.preprocessing import normalize
+        query_embeddings = np.asarray(query_embeddings)
+        n_queries = len(query_embeddings)
+        best_idx = np.zeros(n_queries, dtype=np.intp)
+        best_score = np.full(n_queries, -np.inf, dtype=np.float32)
+
+        for start in range(0, n_queries, self.block_size):
+            stop = min(start + self.block_size, n_queries)
+            block = normalize(query_embeddings[start:stop]).astype(np.float32, copy=False)
+            rows = np.arange(stop - start)
+            for ref_start in range(0, len(self.codes), self.reference_block_size):
+                ref_stop = min(ref_start + self.reference_block_size, len(self.codes))
+                scores = block @ np.asarray(self.codes[ref_start:ref_stop], dtype=np.float32).T
+                if self.scales is not None:
+                    scores *= self.scales[ref_start:ref_stop]
+                local_idx = scores.argmax(axis=1)
+                local_score = scores[rows, local_idx]
+                # Strictly greater keeps the earliest row on ties, like a single argmax
+                better = local_score > best_score[start:stop]
+                best_idx[start:stop][better] = ref_start + local_idx[better]
+                best_score[start:stop][better] = local_score[better]
+
+        return best_idx, best_score
+
+def build_exact_search(reference, block_size: int = 1024, normalized: bool = False):
+    """
+    Return the exact search that fits the storage type of `reference`.
+
+    float32/float64 rows use `ExactSimilaritySearch`; float16 and int8
+    (`QuantizedEmbeddings`) rows use `QuantizedSimilaritySearch`.
+
+    Parameters
+    ----------
+    reference : np.ndarray or QuantizedEmbeddings
+        Reference embeddings.
+    block_size : int, optional (default=1024)
+        Number of query rows scored per matrix multiply.
+    normalized : bool, optional (default=False)
+        Whether the reference rows are already L2-normalised. Quantised rows always are.
+
+    Returns
+    -------
+    ExactSimilaritySearch or QuantizedSimilaritySearch
+        A search object exposing `search(query_embeddings)`.
+    """
+    if isinstance(reference, QuantizedEmbeddings) or np.asarray(reference).dtype == np.float16:
+        logger.info("Using quantised similarity search.")
+        return QuantizedSimilaritySearch(reference, block_size=block_size)
+    return ExactSimilaritySearch(reference, block_size=block_size, normalized=normalized)
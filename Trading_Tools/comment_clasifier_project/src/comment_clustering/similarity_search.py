@@ -0,0 +1,130 @@
+import numpy as np
+from typing import Tuple
+from src.logs.logger import logger  # Import the logger
+
+DEFAULT_BLOCK_SIZE = 1024
+
+def _common_dtype(query_embeddings: np.ndarray, reference_embeddings: np.ndarray) -> type:
+    """
+    Pick the floating point dtype used for scoring, following the same rule as
+    sklearn's `cosine_similarity` (float32 only when both inputs are float32).
+    """
+    if query_embeddings.dtype == np.float32 and reference_embeddings.dtype == np.float32:
+        return np.float32
+    return np.float64
+
+def prepare_reference(reference_embeddings: np.ndarray, normalized: bool) -> np.ndarray:
+    """
+    Return L2-normalised reference rows, normalising only when they are not already.
+
+    Parameters
+    ----------
+    reference_embeddings : numpy.ndarray of shape (n_reference, dim)
+        Embeddings of the existing comments.
+    normalized : bool
+        Whether the rows are already unit length.
+
+    Returns
+    -------
+    numpy.ndarray
+        The normalised reference rows (the input itself when `normalized` is True).
+    """
+    from sklearn.preprocessing import normalize
+    if normalized:
+        return reference_embeddings
+    logger.info(f"Normalising {len(reference_embeddings)} reference embeddings.")
+    return normalize(reference_embeddings)
+
+class ExactSimilaritySearch:
+    """
+    Exact cosine nearest-neighbour search over a reference embedding matrix.
+
+    The reference set is L2-normalised once when the search is built. Queries are
+    scored in blocks of `block_size` rows with a single matrix multiply per block,
+    so the score matrix held in memory never exceeds `block_size x n_reference`.
+
+    Parameters
+    ----------
+    reference_embeddings : numpy.ndarray of shape (n_reference, dim)
+        Embeddings of the existing comments.
+    block_size : int, optional (default=1024)
+        Number of query rows scored per matrix multiply.
+    normalized : bool, optional (default=False)
+        Set when the reference rows are already L2-normalised (as in the artifact
+        store). The array is then used as-is, so a memory-mapped reference is never
+        copied into process memory.
+    """
+
+    def __init__(self, reference_embeddings: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE,
+                 normalized: bool = False):
+        reference_embeddings = np.asarray(reference_embeddings)
+        if reference_embeddings.ndim != 2 or len(reference_embeddings) == 0:
+            raise ValueError("Reference embeddings must be a non-empty 2D array.")
+        if block_size < 1:
+            raise ValueError("block_size must be a positive integer.")
+
+        self.reference = prepare_reference(reference_embeddings, normalized)
+        self.block_size = block_size
+
+    def __len__(self) -> int:
+        return len(self.reference)
+
+    def search(self, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the most similar reference row for every query embedding.
+
+        Parameters
+        ----------
+        query_embeddings : numpy.ndarray of shape (n_queries, dim)
+            Embeddings of the comments to classify.
+
+        Returns
+        -------
+        best_idx : numpy.ndarray of shape (n_queries,)
+            Index of the closest reference embedding for each query.
+        best_score : numpy.ndarray of shape (n_queries,)
+            Cosine similarity between each query and its closest reference embedding.
+        """
+        from sklearn.preprocessing import normalize
+        query_embeddings = np.asarray(query_embeddings)
+        dtype = _common_dtype(query_embeddings, self.reference)
+        reference = self.reference.astype(dtype, copy=False)
+
+        n_queries = len(query_embeddings)
+        best_idx = np.empty(n_queries, dtype=np.intp)
+        best_score = np.empty(n_queries, dtype=dtype)
+
+        for start in range(0, n_queries, self.block_size):
+            stop = min(start + self.block_size, n_queries)
+            block = normalize(query_embeddings[start:stop].astype(dtype, copy=False))
+            scores = block @ reference.T
+            block_idx = scores.argmax(axis=1)
+            best_idx[start:stop] = block_idx
+            best_score[start:stop] = scores[np.arange(stop - start), block_idx]
+
+        return best_idx, best_score
+
+def nearest_neighbours(query_embeddings: np.ndarray,
+                       reference_embeddings: np.ndarray,
+                       block_size: int = DEFAULT_BLOCK_SIZE,
+                       normalized: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convenience wrapper around `ExactSimilaritySearch` for one-off searches.
+
+    Parameters
+    ----------
+    query_embeddings : numpy.ndarray of shape (n_queries, dim)
+        Embeddings of the comments to classify.
+    reference_embeddings : numpy.ndarray of shape (n_reference, dim)
+        Embeddings of the existing comments.
+    block_size : int, optional (default=1024)
+        Number of query rows scored per matrix multiply.
+    normalized : bool, optional (default=False)
+        Whether the reference rows are already L2-normalised.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        The best reference index and cosine similarity for each query.
+    """
+    return ExactSimilaritySearch(reference_embeddings, block_size=block_size, normalized=normalized).search(query_embeddings)
@@ -1,18 +1,22 @@
-import json
+import os
 import pandas as pd
-import numpy as np
 import pickle
-from sklearn.metrics.pairwise import cosine_similarity
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.hierarchy_store import open_hierarchy_store
+from src.comment_clustering.pivot_table import update_pivot_table, load_pivot_table, render_pivot_xlsx
+from src.config.config import get_hierarchy_store_settings, get_pivot_table_settings
 from src.logs.logger import logger  # Import the logger
+from src.logs.tracing import count, span
 
 def load_embeddings(embeddings_file):
     """
-    Load embeddings from a pickle file.
+    Load embeddings from an artifact directory (memory-mapped) or a legacy pickle file.
 
     Parameters
     ----------
     embeddings_file : str
-        Path to the pickle file containing embeddings.
+        Path to an artifact directory written by `artifact_store.save_artifacts`,
+        or to a legacy pickle file containing embeddings.
 
     Returns
     -------
@@ -20,8 +24,11 @@ def load_embeddings(embeddings_file):
         The loaded embeddings object (typically a numpy.ndarray).
     """
     logger.info(f"Loading embeddings from {embeddings_file}.")
-    with open(embeddings_file, 'rb') as f:
-        embeddings = pickle.load(f)
+    if os.path.isdir(embeddings_file):
+        embeddings, _, _ = load_artifacts(embeddings_file)
+    else:
+        with open(embeddings_file, 'rb') as f:
+            embeddings = pickle.load(f)
     logger.info("Embeddings loaded successfully.")
     return embeddings
 
@@ -29,12 +36,18 @@ def update_comment_hierarchy(new_comments_df, hierarchy_file, pivot_output_path)
     """
     Update the comment hierarchy with new comments and generate a pivoted Excel file.
 
+    The new comments are appended to the SQLite hierarchy store (see `hierarchy_store`),
+    so the update costs O(new rows). `hierarchy_file` is imported into a new store
+    once, and rewritten from the store only when `hierarchy_store.export_json` is set.
+    Likewise only the date partitions of the new comments are rewritten in the long-format
+    Parquet table (`pivot_table.path`), from which the Excel report is streamed.
+
     Parameters
     ----------
     new_comments_df : pandas.DataFrame
         DataFrame containing new comments to add to the hierarchy.
     hierarchy_file : str
-        Path to the existing JSON hierarchy file.
+        Path to the JSON hierarchy file.
     pivot_output_path : str
         Path to save the pivoted Excel file.
 
@@ -43,76 +56,35 @@ def update_comment_hierarchy(new_comments_df, hierarchy_file, pivot_output_path)
     None
     """
     logger.info(f"Starting update of comment hierarchy with new data.")
-    
-    # Load existing hierarchy data
-    try:
-        with open(hierarchy_file, 'r') as f:
-            data = json.load(f)
-        logger.info(f"Hierarchy loaded from {hierarchy_file}.")
-    except FileNotFoundError:
-        logger.warning(f"Hierarchy file {hierarchy_file} not found. Creating a new hierarchy.")
-        data = {}
 
     # Ensure 'date' column is datetime
     new_comments_df['date'] = pd.to_datetime(new_comments_df['date'], errors='coerce')
 
-    # Append new comments into hierarchy structure
-    logger.info("Appending new comments to hierarchy structure.")
-    for _, row in new_comments_df.iterrows():
-        comment = row['comment']
-        source = row['source']
-        curve = row['curve_list']
-        grouping_var = row['grouping_var']
-        label = row['standard_label']
-        date = row['date'].strftime('%Y-%m-%d') if pd.notna(row['date']) else ''
-
-          # Skip if curve_list is missing or empty
-        if pd.isna(curve) or str(curve).strip() == "":
-            logger.warning(f"Skipping row with missing 'curve_list': {row.to_dict()}")
-            continue
-
-        if source not in data:
-            data[source] = {}
-        if curve not in data[source]:
-            data[source][curve] = {}
-        if grouping_var not in data[source][curve]:
-            data[source][curve][grouping_var] = []
-        data[source][curve][grouping_var].append({
-            'date': date,
-            'comment': comment,
-            'standard_label': label
-        })
-
-    # Create pivoted dataframe for Excel output
-    logger.info("Generating pivoted DataFrame.")
-    records = []
-    for source, curves in data.items():
-        for curve, groups in curves.items():
-            for grouping_var, comments in groups.items():
-                row = {'source': source, 'curve': curve, 'grouping_var': grouping_var}
-                for entry in comments:
-                    date = entry['date']
-                    label = entry['standard_label']
-                    comment = entry['comment']
-                    row[date] = f"[{label}] {comment}"
-                records.append(row)
-
-    df_pivot = pd.DataFrame(records)
-
-    # Sort columns: non-date first, then dates ascending
-    non_date_cols = ['source', 'curve', 'grouping_var']
-    date_cols = sorted([col for col in df_pivot.columns if col is not None and col not in non_date_cols])
-    df_pivot = df_pivot[non_date_cols + date_cols]
+    # Skip rows whose curve_list is missing or empty
+    curve_values = new_comments_df['curve_list']
+    has_curve = curve_values.notna() & (curve_values.astype(str).str.strip() != "")
+    if not has_curve.all():
+        logger.warning(f"Skipping {int((~has_curve).sum())} rows with missing 'curve_list'.")
+    count('hierarchy.skipped_rows', (~has_curve).sum())
+
+    # Append new comments to the hierarchy store and refresh only their pivot cells
+    logger.info("Appending new comments to hierarchy store.")
+    new_rows = new_comments_df[has_curve]
+    pivot_settings = get_pivot_table_settings()
+    with open_hierarchy_store(legacy_json=hierarchy_file) as store:
+        with span('hierarchy', rows=len(new_rows)):
+            store.append(new_rows)
+        with span('pivot', rows=len(new_rows)):
+            update_pivot_table(new_rows, pivot_settings['path'], store=store)
+        if get_hierarchy_store_settings()['export_json']:
+            store.export_json(hierarchy_file)
 
     # Save the pivoted Excel
     logger.info(f"Saving pivoted comments to {pivot_output_path}.")
-    df_pivot.to_excel(pivot_output_path, index=False)
-
-    # Save updated hierarchy json
-    logger.info(f"Saving updated hierarchy to {hierarchy_file}.")
-    with open(hierarchy_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    with span('render') as stage:
+        cells = load_pivot_table(pivot_settings['path'])
+        stage.set_rows(len(cells))
+        render_pivot_xlsx(cells, pivot_output_path, last_n_dates=pivot_settings['last_n_dates'])
 
     logger.info("Update of comment hierarchy completed successfully.")
-    logger.info(f"Updated hierarchy saved to '{hierarchy_file}'.")
     logger.info(f"Pivoted comments saved to '{pivot_output_path}'.")
@@ -1,3 +1,4 @@
+import copy
 import json
 from typing import Dict, Optional
 from src.logs.logger import logger  # Import the logger
@@ -24,13 +25,35 @@ def load_config(filepath: str) -> Dict:
     logger.info("Configuration loaded successfully.")
     return config_data
 
-CONFIG_DATA = load_config(CONFIG_FILE)
-CLUSTER_LABEL_MAPPING: Dict[str, str] = CONFIG_DATA.get("cluster_label_mapping", {})
+# Loaded from CONFIG_FILE on first use, not at import
+_config_data: Optional[Dict] = None
+
+def get_config_data() -> Dict:
+    """
+    Return the configuration data, loading `CONFIG_FILE` the first time it is needed.
+
+    Returns
+    -------
+    dict
+        Dictionary containing the configuration data.
+    """
+    global _config_data
+    if _config_data is None:
+        _config_data = load_config(CONFIG_FILE)
+    return _config_data
+
+def __getattr__(name: str):
+    # CONFIG_DATA and CLUSTER_LABEL_MAPPING stay importable but are only loaded when accessed
+    if name == "CONFIG_DATA":
+        return get_config_data()
+    if name == "CLUSTER_LABEL_MAPPING":
+        return get_config_data().get("cluster_label_mapping", {})
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def load_mapping(filepath: str) -> Dict[str, str]:
     """
     Load the cluster label mapping. This function currently ignores the filepath 
-    and returns the preloaded CLUSTER_LABEL_MAPPING.
+    and returns the `cluster_label_mapping` section of the configuration.
 
     Parameters
     ----------
@@ -43,8 +66,9 @@ def load_mapping(filepath: str) -> Dict[str, str]:
         The cluster label mapping dictionary.
     """
     logger.info("Loading cluster label mapping.")
-    logger.info(f"Returning cluster label mapping with {len(CLUSTER_LABEL_MAPPING)} entries.")
-    return CLUSTER_LABEL_MAPPING
+    cluster_label_mapping = get_config_data().get("cluster_label_mapping", {})
+    logger.info(f"Returning cluster label mapping with {len(cluster_label_mapping)} entries.")
+    return cluster_label_mapping
 
 def get_similarity_threshold() -> Optional[float]:
     """
@@ -56,7 +80,7 @@ def get_similarity_threshold() -> Optional[float]:
         The similarity threshold value, or None if not set.
     """
     logger.info("Retrieving similarity threshold.")
-    similarity_threshold_section = CONFIG_DATA.get("similarity_threshold", {})
+    similarity_threshold_section = get_config_data().get("similarity_threshold", {})
     threshold = similarity_threshold_section.get("01")
     logger.info(f"Similarity threshold retrieved: {threshold}")
     return threshold
@@ -72,3 +96,341 @@ def load_similarity_threshold() -> Optional[float]:
     """
     logger.info("Loading similarity threshold using compatibility function.")
     return get_similarity_threshold()
+
+# Fallback values for settings keys missing from config.json
+DEFAULT_SETTINGS: Dict[str, Dict] = {
+    "similarity_search": {
+        "mode": "exact",
+        "block_size": 1024,
+        "build_ann_index": False,
+        "n_lists": None,
+        "n_probe": 8,
+        "build_prototypes": False,
+        "prototype_method": "centroid",
+        "n_medoids": 3,
+        "prototype_threshold": None,
+    },
+    "embedding_cache": {
+        "enabled": True,
+        "path": r"output\embedding_cache.sqlite",
+        "max_entries": 1000000,
+    },
+    "model_server": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 8765,
+        "max_batch_size": 256,
+        "max_wait_ms": 10,
+        "timeout_s": 60,
+    },
+    "embedding_storage": {
+        "dtype": "float32",
+        "agreement_floor": 0.99,
+        "holdout_fraction": 0.1,
+    },
+    "clustering": {
+        "backend": "agglomerative",
+        "birch_threshold": 0.3,
+        "birch_branching_factor": 50,
+        "n_neighbors": 30,
+        "save_merge_tree": True,
+    },
+    "incremental_update": {
+        "mode": "incremental",
+        "distance_threshold": 1,
+        "new_clusters_file": r"output\new_clusters.json",
+        "sample_size": 5,
+    },
+    "hierarchy_store": {
+        "path": r"output\comment_hierarchy.sqlite",
+        "export_json": False,
+    },
+    "pivot_table": {
+        "path": r"output\pivoted_comments.parquet",
+        "last_n_dates": None,
+    },
+    "tracing": {
+        "enabled": True,
+        "summary_file": r"output\run_summary.jsonl",
+    },
+    "memory_profiling": {
+        "enabled": False,
+        "report_dir": "output",
+        "top_n": 10,
+        "sample_interval_s": 0.05,
+        "budgets_mb": {},
+        "default_budget_mb": None,
+    },
+    "preprocessing": {
+        "n_jobs": None,
+        "chunk_size": 200000,
+        "parallel_min_rows": 1000000,
+    },
+    "encoding": {
+        "n_workers": 1,
+        "batch_size": 32,
+        "bucket_size": 4096,
+        "parallel_min_texts": 20000,
+        "threads_per_worker": None,
+        "start_method": "spawn",
+    },
+    "pipeline": {
+        "mode": "in_memory",
+        "chunk_size": 50000,
+    },
+    "excel_ingest": {
+        "batch_size": 50000,
+        "cache_enabled": True,
+        "cache_dir": r"output\excel_cache",
+        "max_cache_entries": 30,
+    },
+    "dataset_store": {
+        "path": r"data\dataset",
+    },
+    "lexical_classifier": {
+        "enabled": False,
+        "model_file": r"output\model_artifacts\lexical_classifier.pkl",
+        "labeled_csv": r"output\labeled_comments.csv",
+        "ngram_range": [3, 5],
+        "min_similarity": 0.9,
+        "margin": 0.1,
+        "memo_min_agreement": 1.0,
+        "max_train_texts": 200000,
+        "block_size": 256,
+    },
+}
+
+def _get_section_settings(section: str) -> Dict:
+    """
+    Retrieve a settings section, with the defaults of `DEFAULT_SETTINGS` filled in for missing keys.
+
+    Parameters
+    ----------
+    section : str
+        Name of the section in `DEFAULT_SETTINGS` and in the configuration file.
+
+    Returns
+    -------
+    dict
+        A fresh copy of the section's settings.
+    """
+    description = section.replace("_", " ")
+    logger.info(f"Retrieving {description} settings.")
+    settings = copy.deepcopy(DEFAULT_SETTINGS[section])
+    settings.update(get_config_data().get(section, {}))
+    logger.info(f"{description.capitalize()} settings retrieved: {settings}")
+    return settings
+
+def get_similarity_search_settings() -> Dict:
+    """
+    Retrieve the similarity search settings from the configuration data.
+
+    The 'mode' key selects between 'exact' (brute-force scan of every saved embedding),
+    'approximate' (IVF index saved next to the embeddings) and 'prototype' (a few
+    centroids or medoids per cluster, see `prototypes`). Prototype scores are the
+    similarity to a centroid or medoid, not to the nearest comment, so prototype search
+    labels with its own 'prototype_threshold' instead of `similarity_threshold`. It defaults to
+    None (not calibrated), and prototype mode falls back to exact search until it is set.
+    `prototype_agreement_report` prints the prototype threshold matching the coverage of
+    the nearest-neighbour threshold.
+
+    Returns
+    -------
+    dict
+        The similarity search settings, with defaults filled in for missing keys.
+    """
+    return _get_section_settings("similarity_search")
+
+def get_embedding_cache_settings() -> Dict:
+    """
+    Retrieve the on-disk embedding cache settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The embedding cache settings ('enabled', 'path', 'max_entries'), with defaults
+        filled in for missing keys.
+    """
+    return _get_section_settings("embedding_cache")
+
+def get_model_server_settings() -> Dict:
+    """
+    Retrieve the local model server settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The model server settings ('enabled', 'host', 'port', 'max_batch_size',
+        'max_wait_ms', 'timeout_s'), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("model_server")
+
+def get_embedding_storage_settings() -> Dict:
+    """
+    Retrieve the saved-embedding storage settings from the configuration data.
+
+    'dtype' is the storage format of the reference embeddings ('float32', 'float16' or
+    'int8'); 'agreement_floor' and 'holdout_fraction' configure the quantisation
+    evaluation command.
+
+    Returns
+    -------
+    dict
+        The embedding storage settings, with defaults filled in for missing keys.
+    """
+    return _get_section_settings("embedding_storage")
+
+def get_clustering_settings() -> Dict:
+    """
+    Retrieve the clustering backend settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The clustering settings ('backend', 'birch_threshold', 'birch_branching_factor',
+        'n_neighbors', 'save_merge_tree'), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("clustering")
+
+def get_incremental_update_settings() -> Dict:
+    """
+    Retrieve the incremental base-model update settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The incremental update settings ('mode', 'distance_threshold', 'new_clusters_file',
+        'sample_size'), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("incremental_update")
+
+def get_hierarchy_store_settings() -> Dict:
+    """
+    Retrieve the comment hierarchy store settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The hierarchy store settings ('path', 'export_json'), with defaults filled in
+        for missing keys. With 'export_json' true, production runs also rewrite
+        `comment_hierarchy.json` from the store.
+    """
+    return _get_section_settings("hierarchy_store")
+
+def get_pivot_table_settings() -> Dict:
+    """
+    Retrieve the pivoted comments report settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The pivot table settings ('path' of the date-partitioned long-format Parquet table, 'last_n_dates'
+        shown in the xlsx report, None for all), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("pivot_table")
+
+def get_tracing_settings() -> Dict:
+    """
+    Retrieve the stage tracing settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The tracing settings ('enabled' to write run summaries, 'summary_file' of the
+        JSON-lines run summaries), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("tracing")
+
+def get_memory_profiling_settings() -> Dict:
+    """
+    Retrieve the per-stage memory profiling settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The memory profiling settings, with defaults filled in for missing keys:
+        'enabled' (profile every traced run), 'report_dir' for the per-stage reports,
+        'top_n' allocators kept per stage, 'sample_interval_s' of the RSS sampler,
+        'budgets_mb' (peak RSS budget per stage name) and 'default_budget_mb' for the other stages.
+    """
+    return _get_section_settings("memory_profiling")
+
+def get_preprocessing_settings() -> Dict:
+    """
+    Retrieve the comment normalisation settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The preprocessing settings ('n_jobs' worker processes, None for one per CPU;
+        'chunk_size' rows per worker task; 'parallel_min_rows', the smallest frame
+        cleaned in a process pool), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("preprocessing")
+
+def get_encoding_settings() -> Dict:
+    """
+    Retrieve the sentence encoding settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The encoding settings ('n_workers' encoder processes, 1 to encode in-process and
+        None for one per CPU; 'batch_size' texts per forward pass; 'bucket_size' texts of
+        similar length per worker task; 'parallel_min_texts', the fewest texts encoded in
+        the process pool; 'threads_per_worker' torch threads per worker, None to split
+        the CPUs evenly; 'start_method' of the worker processes), with defaults filled in
+        for missing keys.
+    """
+    return _get_section_settings("encoding")
+
+def get_pipeline_settings() -> Dict:
+    """
+    Retrieve the base pipeline execution settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The pipeline settings ('mode': 'in_memory' or 'streaming'; 'chunk_size' rows
+        per chunk in streaming mode), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("pipeline")
+
+def get_excel_ingest_settings() -> Dict:
+    """
+    Retrieve the Excel ingestion settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The Excel ingestion settings ('batch_size' rows per batch; 'cache_enabled',
+        'cache_dir' and 'max_cache_entries' of the parsed-workbook cache), with defaults
+        filled in for missing keys.
+    """
+    return _get_section_settings("excel_ingest")
+
+def get_dataset_store_settings() -> Dict:
+    """
+    Retrieve the training dataset store settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The dataset store settings ('path' of the date-partitioned Parquet dataset that
+        replaces `data.csv`), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("dataset_store")
+
+def get_lexical_classifier_settings() -> Dict:
+    """
+    Retrieve the lexical pre-classifier settings from the configuration data.
+
+    Returns
+    -------
+    dict
+        The lexical classifier settings ('enabled'; 'model_file' of the saved classifier;
+        'labeled_csv' history it is trained from; character 'ngram_range'; 'min_similarity'
+        and 'margin' of the TF-IDF tier; 'memo_min_agreement' of the exact-match tier;
+        'max_train_texts'; 'block_size'), with defaults filled in for missing keys.
+    """
+    return _get_section_settings("lexical_classifier")
@@ -4,25 +4,38 @@ import os
 # Define the log file path
 LOG_FILE = r'src\logs\data_append.log'
 
-# Ensure the logs directory exists
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+class _DelayedFileHandler(logging.FileHandler):
+    """
+    File handler that creates the log directory and opens the file on the first record,
+    so importing the logger has no side effects on disk.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        # Ensure the logs directory exists
+        directory = os.path.dirname(self.baseFilename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return super()._open()
 
 # Configure logging
 logging.basicConfig(
-    filename=LOG_FILE,
+    handlers=[_DelayedFileHandler(LOG_FILE)],
     level=logging.INFO,  # Change to DEBUG for more detailed logs
     format='%(asctime)s — %(levelname)s — %(message)s'
 )
 
 # Create a logger instance
 logger = logging.getLogger(__name__)
-logger.info("Logger initialized and ready to capture logs.")
 
 """
 Logger module.
 
 This module configures and initializes a logger instance
-for consistent logging across the project.
+for consistent logging across the project. The log file is only
+created and opened when the first message is logged.
 
 Attributes
 ----------
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+from src.util.peak_memory import current_rss_mb, peak_rss_mb
+from src.logs.logger import logger  # Import the logger
+
+class _StageMemory:
+    def __init__(self, name: str, snapshot: Optional[tracemalloc.Snapshot], rss_mb: float):
+        self.name = name
+        self.snapshot = snapshot
+        self.start_rss_mb = rss_mb
+        self.peak_rss_mb = rss_mb
+        self.traced_peak_bytes = 0
+        self.traced_start_bytes = tracemalloc.get_traced_memory()[0]
+
+class MemoryProfiler:
+    """
+    Per-stage peak RSS and tracemalloc allocations of one pipeline run.
+
+    Stages are opened and closed by `tracing.span` when the run is traced with memory
+    profiling on. For each stage the profiler records:
+
+    - the peak RSS seen while the stage ran, sampled by a background thread every
+      `sample_interval_s` (the process-wide high-water mark from `peak_rss_mb` only
+      ever grows, so it cannot be attributed to a single stage);
+    - the tracemalloc peak of Python and numpy allocations made during the stage;
+    - the `top_n` source lines whose live allocations grew most during the stage.
+
+    Stages whose peak RSS exceeds their budget are flagged in the report and logged
+    as warnings. Stages may be nested; an outer stage's peaks include its inner stages.
+
+    Parameters
+    ----------
+    budgets_mb : dict, optional
+        Peak RSS budget per stage name, in MB.
+    default_budget_mb : float, optional
+        Budget for stages without an entry in `budgets_mb`. None for no budget.
+    top_n : int, optional
+        Number of top allocators kept per stage. Default is 10.
+    sample_interval_s : float, optional
+        RSS sampling interval. Default is 0.05.
+    trace_allocations : bool, optional
+        Run tracemalloc for the traced peak and top allocators. Set to False to only
+        sample RSS, which does not slow the stages down. Default is True.
+    """
+
+    def __init__(self, budgets_mb: Optional[Dict[str, float]] = None, default_budget_mb: Optional[float] = None,
+                 top_n: int = 10, sample_interval_s: float = 0.05, trace_allocations: bool = True):
+        self.budgets_mb = budgets_mb or {}
+        self.default_budget_mb = default_budget_mb
+        self.top_n = top_n
+        self.sample_interval_s = sample_interval_s
+        self.trace_allocations = trace_allocations
+        self.stages: List[Dict] = []
+        self._active: List[_StageMemory] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        """
+        Start tracemalloc (if it is not running yet and allocations are traced) and the RSS sampler.
+        """
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_rss, name='rss-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """
+        Stop the RSS sampler, and tracemalloc if this profiler started it.
+        """
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _sample_rss(self) -> None:
+        while not self._stop.wait(self.sample_interval_s):
+            self._record_rss()
+
+    def _record_rss(self) -> None:
+        rss_mb = current_rss_mb()
+        with self._lock:
+            for stage in self._active:
+                stage.peak_rss_mb = max(stage.peak_rss_mb, rss_mb)
+
+    def _fold_traced_peak(self) -> None:
+        # Carry the tracemalloc peak into every open stage before it is reset
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        for stage in self._active:
+            stage.traced_peak_bytes = max(stage.traced_peak_bytes, traced_peak)
+
+    def start_stage(self, name: str) -> None:
+        """
+        Open a stage.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        """
+        self._record_rss()
+        with self._lock:
+            self._fold_traced_peak()
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot() if self.trace_allocations else None
+            self._active.append(_StageMemory(name, snapshot, current_rss_mb()))
+
+    def end_stage(self) -> Dict:
+        """
+        Close the innermost open stage and record its memory use.
+
+        Returns
+        -------
+        dict
+            'stage', 'start_rss_mb', 'peak_rss_mb', 'rss_growth_mb', 'process_peak_rss_mb',
+            'traced_peak_mb' (above the traced memory at the start of the stage),
+            'budget_mb', 'over_budget' and 'top_allocators' (file:line, size_diff_mb, count_diff).
+        """
+        self._record_rss()
+        with self._lock:
+            self._fold_traced_peak()
+            stage = self._active.pop()
+        top_allocators = []
+        if stage.snapshot is not None:
+            top_allocators = self._top_allocators(stage.snapshot)
+
+        budget_mb = self.budgets_mb.get(stage.name, self.default_budget_mb)
+        over_budget = budget_mb is not None and stage.peak_rss_mb > budget_mb
+        report = {
+            'stage': stage.name,
+            'start_rss_mb': round(stage.start_rss_mb, 1),
+            'peak_rss_mb': round(stage.peak_rss_mb, 1),
+            'rss_growth_mb': round(stage.peak_rss_mb - stage.start_rss_mb, 1),
+            'process_peak_rss_mb': round(peak_rss_mb(), 1),
+            'traced_peak_mb': (round(max(stage.traced_peak_bytes - stage.traced_start_bytes, 0) / (1024 * 1024), 3)
+                               if stage.snapshot is not None else None),
+            'budget_mb': budget_mb,
+            'over_budget': over_budget,
+            'top_allocators': top_allocators,
+        }
+        self.stages.append(report)
+        if over_budget:
+            logger.warning(f"Stage '{stage.name}' peaked at {stage.peak_rss_mb:.1f} MB RSS, "
+                           f"over its {budget_mb} MB budget.")
+        return report
+
+    def _top_allocators(self, start_snapshot: tracemalloc.Snapshot) -> List[Dict]:
+        snapshot = tracemalloc.take_snapshot()
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        growth = snapshot.filter_traces(ignored).compare_to(start_snapshot.filter_traces(ignored), 'lineno')
+        return [
+            {'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             'size_diff_mb': round(stat.size_diff / (1024 * 1024), 3), 'count_diff': stat.count_diff}
+            for stat in growth[:self.top_n] if stat.size_diff > 0
+        ]
+
+    def write_report(self, filepath: str, run_id: str, pipeline: str) -> None:
+        """
+        Write the per-stage memory report as JSON.
+
+        Parameters
+        ----------
+        filepath : str
+            Output JSON file.
+        run_id : str
+            Id of the traced run, as in the run summary.
+        pipeline : str
+            Name of the pipeline.
+        """
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        report = {
+            'run_id': run_id,
+            'pipeline': pipeline,
+            'process_peak_rss_mb': round(peak_rss_mb(), 1),
+            'over_budget': [stage['stage'] for stage in self.stages if stage['over_budget']],
+            'stages': self.stages,
+        }
+        with open(filepath, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Memory report written to {filepath}.")
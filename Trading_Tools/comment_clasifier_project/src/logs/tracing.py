@@ -0,0 +1,242 @@
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from src.config.config import get_tracing_settings, get_memory_profiling_settings
+from src.logs.memory_profiling import MemoryProfiler
+from src.logs.logger import logger  # Import the logger
+
+# Run that spans and counters are recorded into; None outside `trace_run`
+_current_run = None
+
+class Span:
+    """
+    One timed pipeline stage.
+
+    Parameters
+    ----------
+    name : str
+        Stage name, e.g. 'load', 'preprocess', 'embed', 'cluster', 'map', 'save', 'hierarchy' or 'pivot'.
+    rows : int, optional
+        Number of rows the stage processes. Can be set inside the span with `set_rows`
+        once it is known.
+    """
+
+    def __init__(self, name: str, rows: Optional[int] = None):
+        self.name = name
+        self.rows = rows
+        self.duration_s = None
+        self.memory = None
+
+    def set_rows(self, rows: int) -> None:
+        self.rows = int(rows)
+
+    def to_dict(self) -> Dict:
+        rows_per_s = None
+        if self.rows is not None and self.duration_s:
+            rows_per_s = round(self.rows / self.duration_s, 1)
+        summary = {'name': self.name, 'duration_s': round(self.duration_s, 6), 'rows': self.rows,
+                   'rows_per_s': rows_per_s}
+        if self.memory is not None:
+            summary.update(peak_rss_mb=self.memory['peak_rss_mb'], over_budget=self.memory['over_budget'])
+        return summary
+
+class RunTrace:
+    """
+    The spans and aggregated event counters of one pipeline run.
+
+    Parameters
+    ----------
+    pipeline : str
+        Name of the pipeline, e.g. 'base_model' or 'production'.
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.spans: List[Span] = []
+        self.counters: Dict[str, int] = {}
+        self.status = 'running'
+        self.duration_s = None
+        self.memory_profiler: Optional[MemoryProfiler] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'run_id': self.run_id,
+            'pipeline': self.pipeline,
+            'started_at': self.started_at,
+            'status': self.status,
+            'duration_s': round(self.duration_s, 6) if self.duration_s is not None else None,
+            'spans': [s.to_dict() for s in self.spans],
+            'counters': self.counters,
+        }
+
+def current_run() -> Optional[RunTrace]:
+    """
+    Return the run being traced, or None outside `trace_run`.
+    """
+    return _current_run
+
+@contextmanager
+def span(name: str, rows: Optional[int] = None) -> Iterator[Span]:
+    """
+    Time one pipeline stage.
+
+    The span is logged once when it ends (duration, rows and rows/s) and added to the
+    current run summary, if a run is being traced. When the run profiles memory the
+    stage's peak RSS and top allocators are recorded too.
+
+    Parameters
+    ----------
+    name : str
+        Stage name.
+    rows : int, optional
+        Number of rows processed; can also be set later with `Span.set_rows`.
+
+    Yields
+    ------
+    Span
+        The running span.
+
+    Examples
+    --------
+    >>> with span('embed', rows=len(df)):
+    ...     embeddings = generate_embeddings(df['cleaned_comment'].tolist())
+    """
+    stage = Span(name, rows)
+    profiler = _current_run.memory_profiler if _current_run is not None else None
+    if profiler is not None:
+        profiler.start_stage(name)
+    started = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        stage.duration_s = time.perf_counter() - started
+        if profiler is not None:
+            stage.memory = profiler.end_stage()
+        if _current_run is not None:
+            _current_run.spans.append(stage)
+        summary = stage.to_dict()
+        throughput = f", {summary['rows']} rows, {summary['rows_per_s']} rows/s" if stage.rows is not None else ""
+        logger.info(f"Stage '{name}' took {stage.duration_s:.3f}s{throughput}.")
+
+def count(event: str, n: int = 1) -> None:
+    """
+    Add `n` to the aggregated counter `event` of the current run.
+
+    Use this instead of logging per-item events; the totals end up in the run summary.
+    Does nothing outside `trace_run`.
+
+    Parameters
+    ----------
+    event : str
+        Counter name, e.g. 'preprocess.empty_comments'.
+    n : int, optional
+        Amount to add. Default is 1.
+    """
+    if _current_run is not None:
+        _current_run.counters[event] = _current_run.counters.get(event, 0) + int(n)
+
+def append_run_summary(run: RunTrace, filepath: str) -> None:
+    """
+    Append the summary of a finished run to a JSON-lines file.
+
+    Parameters
+    ----------
+    run : RunTrace
+        The finished run.
+    filepath : str
+        JSON-lines file, one run per line. Created if it does not exist.
+    """
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filepath, 'a') as f:
+        f.write(json.dumps(run.to_dict()) + '\n')
+
+def load_run_summaries(filepath: str) -> List[Dict]:
+    """
+    Read the run summaries written by `trace_run`.
+
+    Parameters
+    ----------
+    filepath : str
+        JSON-lines file of run summaries.
+
+    Returns
+    -------
+    list of dict
+        One summary per run, oldest first.
+    """
+    with open(filepath, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+@contextmanager
+def trace_run(pipeline: str, summary_file: Optional[str] = None,
+              profile_memory: Optional[bool] = None) -> Iterator[RunTrace]:
+    """
+    Trace one pipeline run and append its summary to the run summary file.
+
+    Spans and counters recorded while the context is open belong to this run. The summary
+    (stage durations, row counts, throughput, counters and whether the run failed) is
+    appended as one JSON line to `summary_file`, or to `tracing.summary_file` from
+    config.json when `tracing.enabled` is set.
+
+    With memory profiling on, every span also records its peak RSS and tracemalloc top
+    allocators (see `memory_profiling.MemoryProfiler`), and the per-stage report is written
+    to `<memory_profiling.report_dir>/memory_report_<pipeline>.json`, listing the stages
+    over their `memory_profiling` budget.
+
+    Parameters
+    ----------
+    pipeline : str
+        Name of the pipeline, e.g. 'base_model' or 'production'.
+    summary_file : str, optional
+        Override the configured JSON-lines file.
+    profile_memory : bool, optional
+        Profile memory per stage. Defaults to `memory_profiling.enabled` in config.json.
+
+    Yields
+    ------
+    RunTrace
+        The run being traced.
+    """
+    global _current_run
+    settings = get_tracing_settings()
+    if summary_file is None and settings['enabled']:
+        summary_file = settings['summary_file']
+
+    run = RunTrace(pipeline)
+    memory_settings = get_memory_profiling_settings()
+    if profile_memory is None:
+        profile_memory = memory_settings['enabled']
+    if profile_memory:
+        run.memory_profiler = MemoryProfiler(
+            budgets_mb=memory_settings['budgets_mb'], default_budget_mb=memory_settings['default_budget_mb'],
+            top_n=memory_settings['top_n'], sample_interval_s=memory_settings['sample_interval_s']
+        )
+        run.memory_profiler.start()
+    previous_run, _current_run = _current_run, run
+    started = time.perf_counter()
+    try:
+        yield run
+        run.status = 'ok'
+    except BaseException:
+        run.status = 'failed'
+        raise
+    finally:
+        _current_run = previous_run
+        run.duration_s = time.perf_counter() - started
+        if run.memory_profiler is not None:
+            run.memory_profiler.stop()
+            run.memory_profiler.write_report(
+                os.path.join(memory_settings['report_dir'], f"memory_report_{pipeline}.json"), run.run_id, pipeline
+            )
+        logger.info(f"Run {run.run_id} of '{pipeline}' {run.status} in {run.duration_s:.3f}s.")
+        if summary_file:
+            append_run_summary(run, summary_file)
+            logger.info(f"Run summary appended to {summary_file}.")
@@ -1,9 +1,14 @@
+import argparse
+import os
 import pandas as pd
 from src.util.inspect_clusters import inspect_clusters
 from src.comment_clustering.pipeline import process_and_cluster_comments
-import pickle
+from src.comment_clustering.incremental_update import update_base_model_incrementally
+from src.comment_clustering.artifact_store import load_artifacts, MANIFEST_FILE
+from src.config.config import get_incremental_update_settings, get_dataset_store_settings
 from src.util.get_number_of_clusters import get_number_of_clusters
-from src.util.append_new_data_to_csv import append_new_data_to_csv
+from src.util.add_new_data_to_dataset import add_new_data_to_dataset
+from src.logs.tracing import span, trace_run
 def main():
     # Load the labeled comments CSV generated by your pipeline
     df = pd.read_csv(r'output\labeled_comments.csv')
@@ -13,23 +18,50 @@ def main():
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Append data\\new_data.xlsx and update the base model.")
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help="Re-embed and re-cluster the whole dataset store instead of updating incrementally.")
+    parser.add_argument('--profile-memory', action='store_true', default=None,
+                        help="Record peak RSS and top allocators per stage in output\\memory_report_base_model.json.")
+    args = parser.parse_args()
 
+    update_settings = get_incremental_update_settings()
+    artifact_dir = r'output\model_artifacts'
 
-    append_new_data_to_csv()
+    with trace_run('base_model', profile_memory=args.profile_memory):
+        with span('append') as stage:
+            new_data = add_new_data_to_dataset()
+            stage.set_rows(len(new_data))
+
+        incremental = (not args.full_rebuild and update_settings['mode'] == 'incremental'
+                       and os.path.exists(os.path.join(artifact_dir, MANIFEST_FILE)))
+        if incremental and new_data.empty:
+            print("No new comments to add.")
+        elif incremental:
+            # Embed only the appended rows and attach them to the saved clusters
+            created_clusters = update_base_model_incrementally(
+                new_data,
+                output_csv=r'output\labeled_comments.csv',
+                artifact_dir=artifact_dir,
+                mapping_file=r'output\cluster_label_mapping.json',
+                hierarchy_file=r'output\comment_hierarchy.json',
+                new_clusters_file=update_settings['new_clusters_file'],
+                distance_threshold=update_settings['distance_threshold'],
+                sample_size=update_settings['sample_size']
+            )
+            print(f"New clusters needing a label: {created_clusters}")
+        else:
+            # Run the full pipeline (this saves cluster labels to a file)
+            process_and_cluster_comments(
+                input_csv=get_dataset_store_settings()['path'],
+                output_csv=r'output\labeled_comments.csv',
+                artifact_dir=artifact_dir,
+                mapping_file=r'output\cluster_label_mapping.json',
+                hierarchy_file=r'output\comment_hierarchy.json'
+            )
 
-    # Run the full pipeline (this saves cluster labels to a file)
-    process_and_cluster_comments(
-        input_csv=r'data\data.csv',
-        output_csv=r'output\labeled_comments.csv',
-        embeddings_file=r'output\saved_embeddings.pkl',
-        cluster_labels_file=r'output\saved_cluster_labels.pkl',
-        mapping_file=r'output\cluster_label_mapping.json',
-        hierarchy_file=r'output\comment_hierarchy.json'
-    )
-    
     # Load the saved cluster labels
-    with open(r'output\saved_cluster_labels.pkl', 'rb') as f:
-        cluster_labels = pickle.load(f)
+    _, cluster_labels, _ = load_artifacts(artifact_dir)
     main()
     # Check the number of clusters
     num_clusters = get_number_of_clusters(cluster_labels)
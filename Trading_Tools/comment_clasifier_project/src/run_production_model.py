@@ -1,57 +1,91 @@
-import os
-import pandas as pd
-import pickle
+import argparse
 import json
-from src.util.convert_excel_to_csv import convert_excel_to_csv
+from src.util.excel_reader import read_excel_comments
 from src.comment_clustering.preprocess import preprocess_comments
 from src.comment_clustering.generate_embeddings import generate_embeddings
 from src.comment_clustering.update_comment_hierarchy import update_comment_hierarchy
 from src.comment_clustering.assign_labels_based_on_similarity import assign_labels_based_on_similarity
-from src.config.config import load_similarity_threshold
+from src.comment_clustering.ann_index import load_similarity_search, search_similarity_threshold
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.model_server import classify_with_server
+from src.comment_clustering.lexical_classifier import load_lexical_classifier, classify_with_lexical_tiers
+from src.config.config import get_similarity_search_settings, get_model_server_settings, get_lexical_classifier_settings
+from src.logs.logger import logger  # Import the logger
+from src.logs.tracing import span, trace_run
 
-def main():
-    input_excel = r'data\test.xlsx'
-    temp_csv = r'data\temp_csv.csv'
-    pivot_output_path = r'output\pivoted_comments_table.xlsx'
-    hierarchy_file = r'output\comment_hierarchy.json'
-    embeddings_file = r'output\saved_embeddings.pkl'
-    labels_file = r'output\saved_cluster_labels.pkl'  # Assuming saved labels are here
-    cluster_to_label_file = r'output\cluster_label_mapping.json'
-    
-    # Step 1: Convert Excel to CSV
-    convert_excel_to_csv(input_excel, temp_csv)
-
-    # Step 2: Load new comments, preprocess, and generate embeddings
-    df_new = pd.read_csv(temp_csv)
-    df_new['comment'] = df_new['comment'].astype(str)
-    df_new = preprocess_comments(df_new, comment_col='comment')
-    new_embeddings = generate_embeddings(df_new['cleaned_comment'].tolist())
-
-    # Step 3: Load existing embeddings and labels
-    with open(embeddings_file, 'rb') as f:
-        existing_embeddings = pickle.load(f)
-    
-    with open(labels_file, 'rb') as f:
-        existing_labels = pickle.load(f)
+def classify_with_embeddings(df_new, artifact_dir, cluster_to_label):
+    # Generate embeddings
+    with span('embed', rows=len(df_new)):
+        new_embeddings = generate_embeddings(df_new['cleaned_comment'].tolist())
+
+    with span('map', rows=len(df_new)):
+        # Memory-map existing embeddings and labels
+        existing_embeddings, existing_labels, _ = load_artifacts(artifact_dir)
+
+        # Exact, approximate (IVF index) or prototype search, as selected in config.json
+        search_settings = get_similarity_search_settings()
+        search = load_similarity_search(existing_embeddings, artifact_dir, search_settings, normalized=True)
+        # Assign labels by similarity (pass the threshold as well); prototype search has its own threshold
+        SIMILARITY_THRESHOLD = search_similarity_threshold(search, search_settings)
+        return assign_labels_based_on_similarity(
+            df_new, new_embeddings, existing_embeddings, existing_labels, cluster_to_label, threshold=SIMILARITY_THRESHOLD,
+            search=search
+        )
+
+def classify_in_process(df_new, artifact_dir, cluster_to_label_file):
+    # Preprocess
+    with span('preprocess', rows=len(df_new)):
+        df_new = preprocess_comments(df_new, comment_col='comment')
 
     # Load cluster_to_label mapping (assuming it's a JSON file)
     with open(cluster_to_label_file, 'r') as f:
         cluster_to_label = json.load(f)
 
-    # Step 4: Assign labels by similarity (pass the threshold as well)
-    SIMILARITY_THRESHOLD = load_similarity_threshold()  # You can modify the threshold as needed
-    assigned_labels = assign_labels_based_on_similarity(
-        df_new, new_embeddings, existing_embeddings, existing_labels, cluster_to_label, threshold=SIMILARITY_THRESHOLD
+    # Label near-verbatim repeats of history lexically; only the rest goes through the encoder
+    lexical_settings = get_lexical_classifier_settings()
+    if not lexical_settings['enabled']:
+        return classify_with_embeddings(df_new, artifact_dir, cluster_to_label)
+
+    with span('lexical_load'):
+        classifier = load_lexical_classifier(lexical_settings['labeled_csv'], cluster_to_label, lexical_settings)
+    return classify_with_lexical_tiers(
+        df_new, classifier, lambda df_rest: classify_with_embeddings(df_rest, artifact_dir, cluster_to_label)
     )
 
-    # Step 5: Add the assigned labels to the dataframe
-    df_new['standard_label'] = assigned_labels
+def main(profile_memory=None):
+    input_excel = r'data\test.xlsx'
+    pivot_output_path = r'output\pivoted_comments_table.xlsx'
+    hierarchy_file = r'output\comment_hierarchy.json'
+    artifact_dir = r'output\model_artifacts'
+    cluster_to_label_file = r'output\cluster_label_mapping.json'
+    
+    with trace_run('production', profile_memory=profile_memory):
+        # Step 1: Read the new comments straight from the workbook (cached by file hash)
+        with span('load') as stage:
+            df_new = read_excel_comments(input_excel)
+            df_new['comment'] = df_new['comment'].astype(str)
+            stage.set_rows(len(df_new))
+
+        # Step 2: Ask the warm model server first when enabled; fall back to in-process classification
+        assigned_labels = None
+        server_settings = get_model_server_settings()
+        if server_settings['enabled']:
+            with span('classify_server', rows=len(df_new)):
+                assigned_labels = classify_with_server(
+                    df_new['comment'].tolist(), server_settings['host'], server_settings['port'], server_settings['timeout_s']
+                )
+
+        if assigned_labels is None:
+            assigned_labels = classify_in_process(df_new, artifact_dir, cluster_to_label_file)
 
-    # Step 6: Update hierarchy JSON and pivot Excel
-    update_comment_hierarchy(df_new, hierarchy_file, pivot_output_path)
+        # Step 3: Add the assigned labels to the dataframe
+        df_new['standard_label'] = assigned_labels
 
-    # Cleanup
-    os.remove(temp_csv)
+        # Step 4: Update hierarchy JSON and pivot Excel
+        update_comment_hierarchy(df_new, hierarchy_file, pivot_output_path)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Classify data\\test.xlsx and update the hierarchy and pivot report.")
+    parser.add_argument('--profile-memory', action='store_true', default=None,
+                        help="Record peak RSS and top allocators per stage in output\\memory_report_production.json.")
+    main(profile_memory=parser.parse_args().profile_memory)
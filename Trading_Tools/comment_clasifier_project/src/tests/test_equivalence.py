@@ -0,0 +1,112 @@
+import json
+from typing import List
+import numpy as np
+import pandas as pd
+import pytest
+from src.benchmarks.benchmark_hierarchy import build_hierarchy_iterrows, synthetic_labeled_comments
+from src.comment_clustering.assign_labels_based_on_similarity import assign_labels_based_on_similarity
+from src.comment_clustering.build_hierarchy import build_hierarchy
+from src.comment_clustering.preprocess import clean_comment, normalize_comments
+
+def assign_labels_per_row(df_new: pd.DataFrame, new_embeddings: np.ndarray, existing_embeddings: np.ndarray,
+                          existing_labels: np.ndarray, cluster_to_label: dict, threshold: float) -> List[str]:
+    """
+    The previous per-comment labelling loop (one `cosine_similarity` call per row), kept as the baseline.
+    """
+    from sklearn.metrics.pairwise import cosine_similarity
+    new_labels = []
+    for new_embedding, comment in zip(new_embeddings, df_new['comment']):
+        if pd.isna(comment) or comment.strip() == "" or comment == "nan":
+            new_labels.append("Not Reviewed / Evidenced")
+            continue
+        cos_similarity = cosine_similarity([new_embedding], existing_embeddings)
+        closest_idx = np.argmax(cos_similarity)
+        if cos_similarity[0][closest_idx] < threshold:
+            new_labels.append("Not Reviewed / Evidenced")
+        else:
+            new_labels.append(cluster_to_label.get(str(existing_labels[closest_idx]), "Not Reviewed / Evidenced"))
+    return new_labels
+
+@pytest.mark.parametrize('seed', range(30))
+def test_batched_similarity_matches_per_row(seed):
+    """
+    The batched `assign_labels_based_on_similarity` labels like `assign_labels_per_row`.
+
+    Each seed draws unnormalised reference and query embeddings, a threshold, a block size
+    and a mapping that leaves some clusters unlabelled. Queries include empty, blank,
+    'nan' and missing comments and repeated cleaned comments, which share an embedding
+    as they do when encoded.
+    """
+    max_rows = 300
+    rng = np.random.default_rng(seed)
+    dim = int(rng.integers(2, 48))
+    n_reference, n_rows = (int(n) for n in rng.integers(1, max_rows + 1, size=2))
+    n_clusters = int(rng.integers(1, 20))
+    reference = rng.normal(size=(n_reference, dim)).astype(np.float32) * rng.uniform(0.1, 10, size=(n_reference, 1)).astype(np.float32)
+    reference_clusters = rng.integers(0, n_clusters, n_reference)
+    cluster_to_label = {str(cluster): f"Label_{cluster % 5}" for cluster in range(n_clusters) if rng.random() < 0.8}
+
+    texts = np.array([f"comment {i}" for i in range(max(1, n_rows // 2))] + ['', '   ', 'nan'], dtype=object)
+    comments = pd.Series(texts[rng.integers(0, len(texts), n_rows)], dtype=object)
+    comments[rng.random(n_rows) < 0.05] = np.nan
+    df = pd.DataFrame({'comment': comments, 'cleaned_comment': comments.fillna('').str.strip()})
+    text_codes, distinct_texts = pd.factorize(df['cleaned_comment'])
+    embeddings = rng.normal(size=(len(distinct_texts), dim)).astype(np.float32)[text_codes]
+    threshold = float(rng.uniform(-0.2, 0.9))
+
+    batched = assign_labels_based_on_similarity(df, embeddings, reference, reference_clusters, cluster_to_label,
+                                                threshold, block_size=int(rng.integers(1, 64)))
+    per_row = assign_labels_per_row(df, embeddings, reference, reference_clusters, cluster_to_label, threshold)
+    assert batched == per_row
+
+@pytest.mark.parametrize('seed', range(50))
+def test_vectorised_hierarchy_matches_iterrows(seed):
+    """
+    `build_hierarchy` writes the same JSON as `build_hierarchy_iterrows`.
+
+    Each seed draws a frame size and curve count and blanks some comments and labels;
+    odd seeds shuffle the frame so the input order is not always by date.
+    """
+    max_rows = 400
+    rng = np.random.default_rng(seed)
+    n_rows = int(rng.integers(1, max_rows + 1))
+    df = synthetic_labeled_comments(n_rows, n_curves=int(rng.integers(1, 30)), random_state=seed)
+    df.loc[rng.random(n_rows) < 0.05, 'comment'] = np.nan
+    df.loc[rng.random(n_rows) < 0.05, 'standard_label'] = None
+    if seed % 2:
+        df = df.sample(frac=1, random_state=seed)
+    assert json.dumps(build_hierarchy(df), indent=2) == json.dumps(build_hierarchy_iterrows(df), indent=2)
+
+# Characters the random comments are drawn from: ASCII punctuation and whitespace,
+# accented and special-cased letters, non-ASCII digits and spaces, emoji and combining marks
+_ALPHABET = np.array(list("aZ09 _-.,;:!?'\"()[]#@\t\n\x0b") + [
+    'é', 'É', 'ß', 'İ', 'ﬁ', 'Σ', 'ς', '—', '’', '\u00a0', '\u3000', '٣', '²', '½', '😀', '\u0301', 'ǅ',
+], dtype=object)
+
+def _random_comments(seed: int, max_rows: int = 300) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    n_rows = int(rng.integers(1, max_rows + 1))
+    comments = pd.Series([''.join(rng.choice(_ALPHABET, int(rng.integers(0, 12)))) for _ in range(n_rows)],
+                         dtype=object)
+    comments[rng.random(n_rows) < 0.05] = np.nan
+    comments[rng.random(n_rows) < 0.03] = None
+    return comments
+
+@pytest.mark.parametrize('seed', range(200))
+def test_normalize_comments_matches_clean_comment(seed):
+    """
+    `normalize_comments` returns what `clean_comment` returns per row.
+    """
+    comments = _random_comments(seed)
+    # All arguments given, so the test does not read the preprocessing settings
+    normalized = normalize_comments(comments, n_jobs=1, chunk_size=len(comments), parallel_min_rows=0)
+    assert normalized.tolist() == comments.apply(clean_comment).tolist()
+
+@pytest.mark.parametrize('seed', range(5))
+def test_parallel_normalize_comments_matches_clean_comment(seed):
+    """
+    The process pool with small chunks returns what `clean_comment` returns per row.
+    """
+    comments = _random_comments(seed)
+    normalized = normalize_comments(comments, n_jobs=2, chunk_size=37, parallel_min_rows=0)
+    assert normalized.tolist() == comments.apply(clean_comment).tolist()
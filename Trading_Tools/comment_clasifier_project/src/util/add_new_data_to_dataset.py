@@ -0,0 +1,42 @@
+from src.comment_clustering.dataset_store import DATASET_COLUMNS, ROW_KEY, open_dataset_store
+from src.util.excel_reader import read_excel_comments
+from src.logs.logger import logger  # Import your configured logger
+
+def add_new_data_to_dataset():
+    """
+    Add new data from an Excel file to the training dataset store, skipping rows
+    that are already stored, and logging relevant processing steps.
+
+    Reads new data from 'data/new_data.xlsx' and upserts it into the date-partitioned
+    dataset store configured in `dataset_store` (see `dataset_store.DatasetStore`), so only
+    the touched date partitions get a new file and appending the same workbook twice adds
+    nothing. On first use the existing 'data/data.csv' is imported into the store.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The rows that were actually added, with missing values filled (except for the
+        'comment' and 'date' columns) with empty strings.
+    """
+    logger.info("Starting dataset addition process.")
+
+    # Load Excel file
+    logger.info("Loading new data from 'data/new_data.xlsx'.")
+    excel_data = read_excel_comments(r'data\new_data.xlsx')
+
+    # Log missing values count per column
+    missing_counts = excel_data.isna().sum()
+    for col, missing_count in missing_counts.items():
+        logger.info(f"Missing values in new data column '{col}': {missing_count}")
+
+    # Upsert into the dataset store (imports data.csv the first time)
+    store = open_dataset_store(legacy_csv=r'data\data.csv')
+    added = store.upsert(excel_data)[DATASET_COLUMNS].copy()
+    logger.info(f"{len(added)} of {len(excel_data)} rows were new; dropped the {ROW_KEY} column.")
+
+    # Fill missing values (except 'comment' and 'date') for the downstream update
+    columns_to_fill = [col for col in added.columns if col not in ('comment', 'date')]
+    added[columns_to_fill] = added[columns_to_fill].fillna("")
+
+    logger.info("Dataset addition process completed successfully.")
+    return added
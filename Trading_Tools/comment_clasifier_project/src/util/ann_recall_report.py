@@ -0,0 +1,99 @@
+import argparse
+import time
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from src.comment_clustering.similarity_search import ExactSimilaritySearch
+from src.comment_clustering.ann_index import IVFSimilaritySearch
+from src.comment_clustering.artifact_store import load_artifacts
+from src.logs.logger import logger  # Import your logger
+
+def ann_recall_report(embeddings: np.ndarray,
+                      cluster_labels: np.ndarray,
+                      n_probes: List[int],
+                      n_lists: Optional[int] = None,
+                      n_queries: int = 1000,
+                      random_state: int = 0) -> pd.DataFrame:
+    """
+    Compare approximate (IVF) search against the exact path on a held-out sample.
+
+    A random sample of `n_queries` saved embeddings is held out as queries and the
+    index is built on the remaining rows, so queries never match themselves.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray
+        The saved reference embeddings.
+    cluster_labels : np.ndarray
+        Cluster labels aligned with `embeddings`.
+    n_probes : list of int
+        The `n_probe` values to evaluate.
+    n_lists : int, optional
+        Number of inverted lists. Defaults to sqrt(n_reference).
+    n_queries : int, optional
+        Number of held-out query rows. Default is 1000.
+    random_state : int, optional
+        Seed for the held-out sample and the index build. Default is 0.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per search mode with recall@1 (same neighbour as exact), cluster
+        agreement with exact, and milliseconds per query.
+    """
+    embeddings = np.asarray(embeddings)
+    cluster_labels = np.asarray(cluster_labels)
+    rng = np.random.default_rng(random_state)
+    n_queries = min(n_queries, len(embeddings) - 1)
+    query_rows = rng.choice(len(embeddings), size=n_queries, replace=False)
+    reference_mask = np.ones(len(embeddings), dtype=bool)
+    reference_mask[query_rows] = False
+
+    queries = embeddings[query_rows]
+    reference = embeddings[reference_mask]
+    reference_labels = cluster_labels[reference_mask]
+
+    logger.info(f"Running exact search for {n_queries} held-out queries against {len(reference)} rows.")
+    exact = ExactSimilaritySearch(reference)
+    started = time.perf_counter()
+    exact_idx, _ = exact.search(queries)
+    exact_ms = (time.perf_counter() - started) * 1000 / n_queries
+
+    rows = [{'mode': 'exact', 'n_probe': None, 'recall_at_1': 1.0, 'cluster_agreement': 1.0, 'ms_per_query': exact_ms}]
+
+    index = IVFSimilaritySearch.build(reference, n_lists=n_lists, random_state=random_state)
+    for n_probe in n_probes:
+        index.n_probe = max(1, min(n_probe, len(index.centroids)))
+        started = time.perf_counter()
+        approx_idx, _ = index.search(queries)
+        approx_ms = (time.perf_counter() - started) * 1000 / n_queries
+        rows.append({
+            'mode': 'approximate',
+            'n_probe': index.n_probe,
+            'recall_at_1': float(np.mean(approx_idx == exact_idx)),
+            'cluster_agreement': float(np.mean(reference_labels[approx_idx] == reference_labels[exact_idx])),
+            'ms_per_query': approx_ms,
+        })
+        logger.info(f"n_probe={index.n_probe}: recall@1={rows[-1]['recall_at_1']:.4f}, {approx_ms:.3f} ms/query.")
+
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall-vs-latency report for the ANN index against exact search.")
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--output-csv', default=r'output\ann_recall_report.csv')
+    parser.add_argument('--n-probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--n-lists', type=int, default=None)
+    parser.add_argument('--n-queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    embeddings, cluster_labels, _ = load_artifacts(args.artifact_dir)
+
+    report = ann_recall_report(embeddings, cluster_labels, args.n_probes,
+                               n_lists=args.n_lists, n_queries=args.n_queries)
+    report.to_csv(args.output_csv, index=False)
+    print(report.to_string(index=False))
+    logger.info(f"ANN recall report saved to '{args.output_csv}'.")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-import pandas as pd
+from src.util.excel_reader import read_excel_comments
 from src.logs.logger import logger  # Import your logger
 
 def convert_excel_to_csv(excel_path: str, csv_path: str) -> None:
@@ -20,11 +20,7 @@ def convert_excel_to_csv(excel_path: str, csv_path: str) -> None:
     logger.info(f"Starting conversion from Excel to CSV.")
     logger.info(f"Reading Excel file: {excel_path}")
     
-    df = pd.read_excel(
-        excel_path,
-        usecols=['source', 'date', 'curve_list', 'comment', 'grouping_var'],
-        engine='openpyxl'
-    )
+    df = read_excel_comments(excel_path)
     
     logger.info(f"Saving data to CSV file: {csv_path}")
     df.to_csv(csv_path, index=False)
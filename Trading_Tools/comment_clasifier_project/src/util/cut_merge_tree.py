@@ -0,0 +1,45 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.comment_clustering.artifact_store import read_manifest
+from src.comment_clustering.merge_tree import MergeTree, merge_tree_path
+from src.logs.logger import logger  # Import your logger
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut the saved merge tree at new distance thresholds without re-clustering.")
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=None,
+                        help="Distance thresholds to cut at. Defaults to the threshold of the base build.")
+    parser.add_argument('--sweep', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=None,
+                        help="Cut at N evenly spaced thresholds between MIN and MAX instead.")
+    parser.add_argument('--output-csv', default=r'output\merge_tree_sweep.csv')
+    parser.add_argument('--labels-csv', default=None,
+                        help="Write the cluster label of every base-build row at the (single) threshold to this CSV.")
+    args = parser.parse_args()
+
+    tree = MergeTree.load(merge_tree_path(args.artifact_dir))
+    artifact_rows = read_manifest(args.artifact_dir)['rows']
+    if artifact_rows != len(tree):
+        logger.warning(f"The merge tree covers the {len(tree)} rows of the base build; the {artifact_rows - len(tree)} "
+                       f"rows appended since are not re-labelled.")
+
+    if args.sweep is not None:
+        thresholds = np.linspace(args.sweep[0], args.sweep[1], int(args.sweep[2]))
+    else:
+        thresholds = args.thresholds or [tree.distance_threshold]
+
+    started = time.perf_counter()
+    report = tree.sweep(thresholds)
+    logger.info(f"Cut the merge tree at {len(thresholds)} thresholds in {time.perf_counter() - started:.3f}s.")
+    report.to_csv(args.output_csv, index=False)
+    print(report.to_string(index=False))
+
+    if args.labels_csv is not None:
+        if len(thresholds) != 1:
+            parser.error("--labels-csv needs a single threshold.")
+        pd.DataFrame({'cluster': tree.cut(thresholds[0])}).to_csv(args.labels_csv, index_label='row')
+        logger.info(f"Cluster labels at {thresholds[0]} saved to '{args.labels_csv}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import sys
+import numpy as np
+import pandas as pd
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.assign_labels_based_on_similarity import assign_labels_based_on_similarity
+from src.comment_clustering.similarity_search import ExactSimilaritySearch
+from src.comment_clustering.quantization import quantize_embeddings, QuantizedEmbeddings, QuantizedSimilaritySearch
+from src.config.config import load_similarity_threshold, get_embedding_storage_settings
+from src.logs.logger import logger  # Import your logger
+
+def evaluate_quantization(labeled_csv: str, artifact_dir: str, mapping_file: str, dtype: str,
+                          holdout_fraction: float, threshold: float, random_state: int = 0) -> dict:
+    """
+    Measure label agreement between float32 and quantised reference embeddings.
+
+    A random held-out slice of `labeled_comments.csv` is classified against the
+    remaining rows twice: once with the float32 embeddings and once with the same
+    reference quantised to `dtype`.
+
+    Parameters
+    ----------
+    labeled_csv : str
+        Path to `labeled_comments.csv`, row-aligned with the saved artifacts.
+    artifact_dir : str
+        Directory holding float32 artifacts written by the base pipeline.
+    mapping_file : str
+        Path to the JSON cluster-to-label mapping.
+    dtype : str
+        Quantised storage to evaluate ('float16' or 'int8').
+    holdout_fraction : float
+        Fraction of rows held out as queries.
+    threshold : float
+        Similarity threshold used for labelling.
+    random_state : int, optional
+        Seed for the held-out slice. Default is 0.
+
+    Returns
+    -------
+    dict
+        Agreement, held-out size and reference memory footprint for both storage types.
+    """
+    df = pd.read_csv(labeled_csv)
+    embeddings, cluster_labels, _ = load_artifacts(artifact_dir)
+    if isinstance(embeddings, QuantizedEmbeddings) or embeddings.dtype != np.float32:
+        raise ValueError(f"{artifact_dir} must hold float32 embeddings to serve as the baseline.")
+    if len(df) != len(embeddings):
+        raise ValueError(f"{labeled_csv} has {len(df)} rows but {artifact_dir} has {len(embeddings)} embeddings.")
+    with open(mapping_file, 'r') as f:
+        cluster_to_label = json.load(f)
+
+    rng = np.random.default_rng(random_state)
+    holdout_rows = np.sort(rng.choice(len(df), size=max(1, int(len(df) * holdout_fraction)), replace=False))
+    reference_mask = np.ones(len(df), dtype=bool)
+    reference_mask[holdout_rows] = False
+
+    df_holdout = df.iloc[holdout_rows].reset_index(drop=True)
+    queries = np.asarray(embeddings[holdout_rows])
+    reference = np.asarray(embeddings[reference_mask])
+    reference_labels = np.asarray(cluster_labels[reference_mask])
+    logger.info(f"Evaluating {dtype} storage on {len(holdout_rows)} held-out comments against {len(reference)} rows.")
+
+    baseline = assign_labels_based_on_similarity(
+        df_holdout, queries, reference, reference_labels, cluster_to_label, threshold,
+        search=ExactSimilaritySearch(reference, normalized=True)
+    )
+
+    codes, scales = quantize_embeddings(reference, dtype)
+    quantized_reference = QuantizedEmbeddings(codes, scales) if scales is not None else codes
+    quantized = assign_labels_based_on_similarity(
+        df_holdout, queries, reference, reference_labels, cluster_to_label, threshold,
+        search=QuantizedSimilaritySearch(quantized_reference)
+    )
+
+    agreement = float(np.mean(np.array(baseline, dtype=object) == np.array(quantized, dtype=object)))
+    report = {
+        'dtype': dtype,
+        'holdout_rows': int(len(holdout_rows)),
+        'reference_rows': int(len(reference)),
+        'label_agreement': agreement,
+        'reference_bytes_float32': int(reference.nbytes),
+        'reference_bytes_quantized': int(codes.nbytes + (0 if scales is None else scales.nbytes)),
+    }
+    logger.info(f"Quantisation evaluation: {report}")
+    return report
+
+def main():
+    settings = get_embedding_storage_settings()
+    parser = argparse.ArgumentParser(description="Label agreement of quantised reference embeddings against float32.")
+    parser.add_argument('--labeled-csv', default=r'output\labeled_comments.csv')
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--mapping-file', default=r'output\cluster_label_mapping.json')
+    parser.add_argument('--dtype', default='int8', choices=['float16', 'int8'])
+    parser.add_argument('--holdout-fraction', type=float, default=settings['holdout_fraction'])
+    parser.add_argument('--agreement-floor', type=float, default=settings['agreement_floor'])
+    parser.add_argument('--output-json', default=r'output\quantization_report.json')
+    args = parser.parse_args()
+
+    report = evaluate_quantization(args.labeled_csv, args.artifact_dir, args.mapping_file, args.dtype,
+                                   args.holdout_fraction, load_similarity_threshold())
+    report['agreement_floor'] = args.agreement_floor
+    report['passed'] = report['label_agreement'] >= args.agreement_floor
+    with open(args.output_json, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if not report['passed']:
+        logger.error(f"Label agreement {report['label_agreement']:.4f} is below the floor {args.agreement_floor}.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import hashlib
+import os
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+import pandas as pd
+from src.config.config import get_excel_ingest_settings
+from src.logs.logger import logger  # Import the logger
+
+REQUIRED_COLUMNS = ['source', 'date', 'curve_list', 'comment', 'grouping_var']
+TEXT_COLUMNS = ['source', 'curve_list', 'comment', 'grouping_var']
+
+def file_sha256(filepath: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Return the SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cell_text(value) -> str:
+    # Integral numbers read as floats are shown without '.0', as pandas.read_excel does
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def _typed_batch(rows: List[tuple]) -> pd.DataFrame:
+    batch = pd.DataFrame.from_records(rows, columns=REQUIRED_COLUMNS)
+    for column in TEXT_COLUMNS:
+        batch[column] = batch[column].astype(object).map(_cell_text, na_action='ignore')
+    # Excel date cells become datetime64; text dates are kept for the pipelines to parse as before
+    dates = batch['date'].astype(object)
+    if dates.map(lambda value: value is None or isinstance(value, (datetime, date))).all():
+        dates = pd.to_datetime(dates)
+    batch['date'] = dates
+    return batch
+
+def _parse_excel_batches(excel_path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"{excel_path} has no header row.")
+        header = [str(name) if name is not None else None for name in header]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"{excel_path} is missing the columns {missing}.")
+        positions = [header.index(column) for column in REQUIRED_COLUMNS]
+
+        batch = []
+        for row in rows:
+            values = tuple(row[i] if i < len(row) else None for i in positions)
+            if all(value is None for value in values):
+                continue
+            batch.append(values)
+            if len(batch) == batch_size:
+                yield _typed_batch(batch)
+                batch = []
+        if batch:
+            yield _typed_batch(batch)
+    finally:
+        workbook.close()
+
+def _prune_cache(cache_dir: str, max_entries: int) -> None:
+    entries = sorted((os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.pkl')),
+                     key=os.path.getmtime)
+    for path in entries[:max(len(entries) - max_entries, 0)]:
+        os.remove(path)
+
+def iter_excel_batches(excel_path: str, batch_size: Optional[int] = None,
+                       use_cache: Optional[bool] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read the comment columns of a workbook as typed DataFrame batches.
+
+    The first sheet is streamed through openpyxl in read-only mode, so only one batch
+    of rows is materialised at a time. Only `REQUIRED_COLUMNS` are read, in that order:
+    the text columns hold `str` values (NaN when empty) and 'date' is datetime64 when
+    every filled cell is an Excel date (text dates are kept as text). Fully empty rows
+    are skipped.
+
+    Parsed workbooks are cached by the SHA-256 of the file in `excel_ingest.cache_dir`,
+    so reading the same file again does not parse it again.
+
+    Parameters
+    ----------
+    excel_path : str
+        Path to the .xlsx file.
+    batch_size : int, optional
+        Rows per batch. Defaults to `excel_ingest.batch_size` in config.json.
+    use_cache : bool, optional
+        Read and fill the parsed-workbook cache. Defaults to `excel_ingest.cache_enabled`.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Batches of at most `batch_size` rows with the `REQUIRED_COLUMNS` columns.
+
+    Raises
+    ------
+    ValueError
+        If the header row lacks one of `REQUIRED_COLUMNS`.
+    """
+    settings = get_excel_ingest_settings()
+    batch_size = batch_size or settings['batch_size']
+    if use_cache is None:
+        use_cache = settings['cache_enabled']
+
+    if not use_cache:
+        logger.info(f"Streaming {excel_path} in batches of {batch_size} rows.")
+        yield from _parse_excel_batches(excel_path, batch_size)
+        return
+
+    cache_path = os.path.join(settings['cache_dir'], f"{file_sha256(excel_path)}.pkl")
+    if os.path.exists(cache_path):
+        logger.info(f"Reading {excel_path} from the parsed-workbook cache {cache_path}.")
+        cached = pd.read_pickle(cache_path)
+        os.utime(cache_path)
+        for start in range(0, len(cached), batch_size):
+            yield cached.iloc[start:start + batch_size].reset_index(drop=True)
+        return
+
+    logger.info(f"Streaming {excel_path} in batches of {batch_size} rows.")
+    batches = []
+    for batch in _parse_excel_batches(excel_path, batch_size):
+        batches.append(batch)
+        yield batch
+
+    # Only a fully read workbook is cached
+    os.makedirs(settings['cache_dir'], exist_ok=True)
+    parsed = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=REQUIRED_COLUMNS)
+    parsed.to_pickle(cache_path + '.tmp')
+    os.replace(cache_path + '.tmp', cache_path)
+    _prune_cache(settings['cache_dir'], settings['max_cache_entries'])
+    logger.info(f"Cached parsed workbook {excel_path} as {cache_path}.")
+
+def read_excel_comments(excel_path: str, use_cache: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Read the comment columns of a workbook into one DataFrame (see `iter_excel_batches`).
+
+    Parameters
+    ----------
+    excel_path : str
+        Path to the .xlsx file.
+    use_cache : bool, optional
+        Read and fill the parsed-workbook cache. Defaults to `excel_ingest.cache_enabled`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `REQUIRED_COLUMNS` columns of every non-empty row.
+    """
+    batches = list(iter_excel_batches(excel_path, use_cache=use_cache))
+    if not batches:
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    df = pd.concat(batches, ignore_index=True)
+    logger.info(f"Read {len(df)} rows from {excel_path}.")
+    return df
@@ -0,0 +1,22 @@
+import argparse
+from src.comment_clustering.hierarchy_store import open_hierarchy_store
+from src.logs.logger import logger  # Import your logger
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the SQLite hierarchy store to the nested comment_hierarchy.json format."
+    )
+    parser.add_argument('--output-json', default=r'output\comment_hierarchy.json')
+    parser.add_argument('--curve', default=None, help="Print the comments of one curve instead of exporting.")
+    args = parser.parse_args()
+
+    with open_hierarchy_store() as store:
+        if args.curve:
+            print(store.get_curve(args.curve).to_string(index=False))
+            return
+        store.export_json(args.output_json)
+        logger.info(f"Hierarchy export to {args.output_json} completed.")
+        print(f"Exported {len(store)} comments to '{args.output_json}'.")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,5 @@
-from collections import defaultdict
 from pathlib import Path
 from src.logs.logger import logger  # Import your logger
-import pandas as pd  # Ensure pandas is imported
 
 def inspect_clusters(df, log_filename="cluster_inspection.txt") -> None:
     """
@@ -28,20 +26,15 @@ def inspect_clusters(df, log_filename="cluster_inspection.txt") -> None:
     log_path = log_dir / log_filename
     logger.info(f"Log file path: {log_path}")
 
-    cluster_examples = defaultdict(set)  # unique comments per cluster
-
     logger.info("Collecting unique comments per cluster.")
-    for _, row in df.iterrows():
-        cluster = row['cluster']
-        comment = row['cleaned_comment']
-        if pd.notna(comment):  # only add non-NaN comments
-            cluster_examples[cluster].add(comment)
+    # Distinct non-NaN comments per cluster, sorted by cluster then comment
+    examples = df.loc[df['cleaned_comment'].notna(), ['cluster', 'cleaned_comment']].drop_duplicates()
+    examples = examples.sort_values(['cluster', 'cleaned_comment'], kind='stable')
 
     logger.info("Writing clusters to log file.")
     with open(log_path, 'w', encoding='utf-8') as f:
-        for cluster in sorted(cluster_examples.keys()):
+        for cluster, comments in examples.groupby('cluster', sort=True)['cleaned_comment']:
             f.write(f"\nCluster {cluster}:\n")
-            for comment in sorted(cluster_examples[cluster]):
-                f.write(f"{str(comment)}\n")  # safe write
+            f.writelines(f"{str(comment)}\n" for comment in comments)  # safe write
 
     logger.info(f"Cluster inspection completed. Results saved to '{log_path}'.")
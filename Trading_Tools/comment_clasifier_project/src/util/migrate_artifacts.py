@@ -0,0 +1,22 @@
+import argparse
+from src.comment_clustering.artifact_store import migrate_pickle_artifacts, SUPPORTED_DTYPES
+from src.logs.logger import logger  # Import your logger
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="One-shot migration of saved_embeddings.pkl / saved_cluster_labels.pkl to the memory-mapped artifact store."
+    )
+    parser.add_argument('--embeddings-pkl', default=r'output\saved_embeddings.pkl')
+    parser.add_argument('--labels-pkl', default=r'output\saved_cluster_labels.pkl')
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--model-name', default='all-MiniLM-L6-v2')
+    parser.add_argument('--dtype', default='float32', choices=SUPPORTED_DTYPES)
+    args = parser.parse_args()
+
+    manifest = migrate_pickle_artifacts(args.embeddings_pkl, args.labels_pkl, args.artifact_dir,
+                                        model_name=args.model_name, dtype=args.dtype)
+    logger.info(f"Migration to {args.artifact_dir} completed.")
+    print(f"Migrated {manifest['rows']} x {manifest['dim']} embeddings ({manifest['embedding_dtype']}) to '{args.artifact_dir}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+
+def _windows_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+    ctypes.windll.psapi.GetProcessMemoryInfo(
+        ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+    )
+    return counters
+
+def peak_rss_mb() -> float:
+    """
+    Return the peak resident set size of the current process in megabytes.
+
+    Uses `GetProcessMemoryInfo` on Windows and `getrusage` elsewhere.
+
+    Returns
+    -------
+    float
+        Peak RSS (peak working set on Windows) since the process started, in MB.
+    """
+    if sys.platform == 'win32':
+        return _windows_memory_counters().PeakWorkingSetSize / (1024 * 1024)
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def current_rss_mb() -> float:
+    """
+    Return the current resident set size of the current process in megabytes.
+
+    Uses `GetProcessMemoryInfo` on Windows and `/proc/self/statm` on Linux. Where
+    neither is available the peak RSS is returned instead.
+
+    Returns
+    -------
+    float
+        Current RSS (working set on Windows), in MB.
+    """
+    if sys.platform == 'win32':
+        return _windows_memory_counters().WorkingSetSize / (1024 * 1024)
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return peak_rss_mb()
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
@@ -0,0 +1,161 @@
+import argparse
+import json
+import time
+from typing import Optional
+import numpy as np
+import pandas as pd
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.assign_labels_based_on_similarity import assign_labels_based_on_similarity
+from src.comment_clustering.prototypes import PrototypeSimilaritySearch, PROTOTYPE_METHODS
+from src.comment_clustering.quantization import build_exact_search
+from src.config.config import load_similarity_threshold, get_similarity_search_settings
+from src.logs.logger import logger  # Import your logger
+
+def _timed_labels(df, queries, reference, reference_labels, cluster_to_label, threshold, search):
+    started = time.perf_counter()
+    labels = assign_labels_based_on_similarity(df, queries, reference, reference_labels, cluster_to_label,
+                                               threshold, search=search)
+    return np.array(labels, dtype=object), time.perf_counter() - started
+
+def matching_threshold(reference_scores: np.ndarray, scores: np.ndarray, reference_threshold: float) -> float:
+    """
+    Find the threshold on `scores` that covers as many queries as `reference_threshold` covers on `reference_scores`.
+
+    Parameters
+    ----------
+    reference_scores : np.ndarray of shape (n_queries,)
+        Top-1 nearest-neighbour similarities.
+    scores : np.ndarray of shape (n_queries,)
+        Top-1 prototype similarities of the same queries.
+    reference_threshold : float
+        Nearest-neighbour similarity threshold.
+
+    Returns
+    -------
+    float
+        The lowest prototype threshold whose coverage does not exceed the nearest-neighbour coverage
+        (up to ties).
+    """
+    n_covered = int(np.count_nonzero(np.asarray(reference_scores) >= reference_threshold))
+    descending = np.sort(np.asarray(scores, dtype=np.float64))[::-1]
+    if n_covered == 0:
+        return float(np.nextafter(descending[0], np.inf))
+    return float(descending[n_covered - 1])
+
+def prototype_agreement_report(labeled_csv: str, artifact_dir: str, mapping_file: str, method: str,
+                               n_medoids: int, holdout_fraction: float, threshold: float,
+                               prototype_threshold: Optional[float] = None, random_state: int = 0) -> dict:
+    """
+    Measure label agreement between prototype search and the full nearest-neighbour search.
+
+    A random held-out slice of `labeled_comments.csv` is classified against the
+    remaining rows twice: once by scanning every remaining embedding, and once against
+    the prototypes computed from those rows only. Prototype scores are the similarity to a
+    centroid or medoid, so the prototype threshold matching the coverage of `threshold`
+    is derived from the same queries and reported.
+
+    Parameters
+    ----------
+    labeled_csv : str
+        Path to `labeled_comments.csv`, row-aligned with the saved artifacts.
+    artifact_dir : str
+        Directory holding the artifacts written by the base pipeline.
+    mapping_file : str
+        Path to the JSON cluster-to-label mapping.
+    method : str
+        'centroid' or 'medoid'.
+    n_medoids : int
+        Medoids per cluster for the 'medoid' method.
+    holdout_fraction : float
+        Fraction of rows held out as queries.
+    threshold : float
+        Nearest-neighbour similarity threshold (`similarity_threshold`).
+    prototype_threshold : float, optional
+        Threshold of the prototype labels (`similarity_search.prototype_threshold`).
+        Defaults to the derived matching threshold.
+    random_state : int, optional
+        Seed for the held-out slice. Default is 0.
+
+    Returns
+    -------
+    dict
+        Overall and per-label agreement, both thresholds and their coverage, the matching
+        prototype threshold, the number of prototypes and the labelling time of both searches.
+    """
+    df = pd.read_csv(labeled_csv)
+    embeddings, cluster_labels, _ = load_artifacts(artifact_dir)
+    if len(df) != len(embeddings):
+        raise ValueError(f"{labeled_csv} has {len(df)} rows but {artifact_dir} has {len(embeddings)} embeddings.")
+    with open(mapping_file, 'r') as f:
+        cluster_to_label = json.load(f)
+
+    rng = np.random.default_rng(random_state)
+    holdout_rows = np.sort(rng.choice(len(df), size=max(1, int(len(df) * holdout_fraction)), replace=False))
+    reference_mask = np.ones(len(df), dtype=bool)
+    reference_mask[holdout_rows] = False
+
+    df_holdout = df.iloc[holdout_rows].reset_index(drop=True)
+    queries = np.asarray(embeddings[holdout_rows])
+    reference = np.asarray(embeddings[reference_mask])
+    reference_labels = np.asarray(cluster_labels[reference_mask])
+    prototypes = PrototypeSimilaritySearch.build(reference, reference_labels, method=method, n_medoids=n_medoids)
+    logger.info(f"Comparing {len(prototypes)} {method} prototypes with {len(reference)} reference rows "
+                f"on {len(holdout_rows)} held-out comments.")
+
+    exact = build_exact_search(reference, normalized=True)
+    _, nn_scores = exact.search(queries)
+    _, prototype_scores = prototypes.search(queries)
+    matching = matching_threshold(nn_scores, prototype_scores, threshold)
+    if prototype_threshold is None:
+        prototype_threshold = matching
+
+    full, full_s = _timed_labels(df_holdout, queries, reference, reference_labels, cluster_to_label, threshold, exact)
+    nearest_prototype, prototype_s = _timed_labels(df_holdout, queries, reference, reference_labels,
+                                                   cluster_to_label, prototype_threshold, prototypes)
+
+    agrees = full == nearest_prototype
+    per_label = pd.Series(agrees).groupby(full).agg(['mean', 'size'])
+    report = {
+        'method': method,
+        'holdout_rows': int(len(holdout_rows)),
+        'reference_rows': int(len(reference)),
+        'prototypes': len(prototypes),
+        'similarity_threshold': threshold,
+        'nearest_neighbour_coverage': float(np.mean(nn_scores >= threshold)),
+        'matching_prototype_threshold': matching,
+        'prototype_threshold': prototype_threshold,
+        'prototype_coverage': float(np.mean(prototype_scores >= prototype_threshold)),
+        'label_agreement': float(agrees.mean()),
+        'per_label_agreement': {label: {'agreement': float(row['mean']), 'rows': int(row['size'])}
+                                for label, row in per_label.iterrows()},
+        'full_search_s': full_s,
+        'prototype_search_s': prototype_s,
+    }
+    logger.info(f"Prototype agreement: {report['label_agreement']:.4f} with {len(prototypes)} prototypes at threshold "
+                f"{prototype_threshold:.4f}; {matching:.4f} matches the coverage of similarity_threshold {threshold}.")
+    return report
+
+def main():
+    settings = get_similarity_search_settings()
+    parser = argparse.ArgumentParser(description="Label agreement of prototype search against full nearest-neighbour search.")
+    parser.add_argument('--labeled-csv', default=r'output\labeled_comments.csv')
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--mapping-file', default=r'output\cluster_label_mapping.json')
+    parser.add_argument('--method', default=settings['prototype_method'], choices=PROTOTYPE_METHODS)
+    parser.add_argument('--n-medoids', type=int, default=settings['n_medoids'])
+    parser.add_argument('--holdout-fraction', type=float, default=0.1)
+    parser.add_argument('--prototype-threshold', type=float, default=settings['prototype_threshold'],
+                        help="Threshold of the prototype labels. Defaults to similarity_search.prototype_threshold, "
+                             "or to the threshold matching the nearest-neighbour coverage when it is not set.")
+    parser.add_argument('--output-json', default=r'output\prototype_report.json')
+    args = parser.parse_args()
+
+    report = prototype_agreement_report(args.labeled_csv, args.artifact_dir, args.mapping_file, args.method,
+                                        args.n_medoids, args.holdout_fraction, load_similarity_threshold(),
+                                        prototype_threshold=args.prototype_threshold)
+    with open(args.output_json, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import json
+from typing import Optional
+import numpy as np
+import pandas as pd
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.assign_labels_based_on_similarity import (NOT_REVIEWED_LABEL, NOT_REVIEWED_ALIASES,
+                                                                     is_empty_comment)
+from src.comment_clustering.quantization import build_exact_search
+from src.config.config import load_similarity_threshold
+from src.logs.logger import logger  # Import your logger
+
+def _normalize_not_reviewed(labels: np.ndarray) -> np.ndarray:
+    # One spelling for "no reviewed label", whichever label source it came from
+    labels = np.asarray(labels, dtype=object).copy()
+    labels[pd.Series(labels).isin(NOT_REVIEWED_ALIASES).to_numpy()] = NOT_REVIEWED_LABEL
+    return labels
+
+def holdout_neighbours(df: pd.DataFrame, embeddings, cluster_labels: np.ndarray, cluster_to_label: dict,
+                       label_column: str = 'standard_label', holdout_fraction: float = 0.1,
+                       random_state: int = 0) -> pd.DataFrame:
+    """
+    Find the top-1 neighbour of a labelled held-out slice, in a single similarity pass.
+
+    A random slice of the non-empty comments is held out as queries and scored against
+    the remaining rows, so queries never match themselves.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Labelled comments, row-aligned with `embeddings`, with 'comment' and `label_column` columns.
+    embeddings : np.ndarray of shape (n_samples, dim) or QuantizedEmbeddings
+        The saved L2-normalised embeddings.
+    cluster_labels : np.ndarray of shape (n_samples,)
+        The saved cluster labels.
+    cluster_to_label : dict
+        Cluster-to-label mapping.
+    label_column : str, optional
+        Column holding the reviewed label of each comment. Default is 'standard_label'.
+    holdout_fraction : float, optional
+        Fraction of the non-empty comments held out as queries. Default is 0.1.
+    random_state : int, optional
+        Seed for the held-out slice. Default is 0.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per held-out comment: 'score' (top-1 cosine similarity), 'predicted'
+        (label of the neighbour's cluster) and 'expected' (its reviewed label). Every spelling of
+        "no reviewed label" (`NOT_REVIEWED_ALIASES`) is replaced by 'Not Reviewed / Evidenced'.
+    """
+    if len(df) != len(embeddings):
+        raise ValueError(f"The labelled comments have {len(df)} rows but there are {len(embeddings)} embeddings.")
+    candidates = np.flatnonzero(~is_empty_comment(df['comment']))
+    rng = np.random.default_rng(random_state)
+    holdout_rows = np.sort(rng.choice(candidates, size=max(1, int(len(candidates) * holdout_fraction)), replace=False))
+    reference_mask = np.ones(len(df), dtype=bool)
+    reference_mask[holdout_rows] = False
+    reference_labels = np.asarray(cluster_labels)[reference_mask]
+
+    logger.info(f"Scoring {len(holdout_rows)} held-out comments against {int(reference_mask.sum())} reference rows.")
+    search = build_exact_search(np.asarray(embeddings[reference_mask]), normalized=True)
+    closest_idx, closest_score = search.search(np.asarray(embeddings[holdout_rows]))
+    predicted = [cluster_to_label.get(str(cluster), NOT_REVIEWED_LABEL) for cluster in reference_labels[closest_idx]]
+    return pd.DataFrame({
+        'score': np.asarray(closest_score, dtype=np.float64),
+        'predicted': _normalize_not_reviewed(predicted),
+        'expected': _normalize_not_reviewed(df[label_column].iloc[holdout_rows].astype(str).to_numpy(dtype=object)),
+    })
+
+def sweep_thresholds(neighbours: pd.DataFrame, thresholds: np.ndarray) -> pd.DataFrame:
+    """
+    Evaluate coverage and accuracy at every threshold from the cached top-1 neighbours.
+
+    A comment is covered when its score is at or above the threshold and its neighbour's
+    cluster has a label; uncovered comments are labelled 'Not Reviewed / Evidenced',
+    as in `assign_labels_based_on_similarity`.
+
+    Parameters
+    ----------
+    neighbours : pandas.DataFrame
+        Output of `holdout_neighbours`.
+    thresholds : np.ndarray
+        Similarity thresholds to evaluate.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per threshold: 'coverage' (share of comments covered), 'covered_accuracy'
+        (share of covered comments labelled as reviewed) and 'accuracy' (share of all
+        comments whose final label matches the reviewed one).
+    """
+    # Sort by descending score once; every threshold then covers a prefix of the comments
+    order = np.argsort(-neighbours['score'].to_numpy(), kind='stable')
+    scores = neighbours['score'].to_numpy()[order]
+    predicted = neighbours['predicted'].to_numpy()[order]
+    expected = neighbours['expected'].to_numpy()[order]
+
+    labelled = predicted != NOT_REVIEWED_LABEL
+    covered_before = np.concatenate([[0], np.cumsum(labelled)])
+    correct_before = np.concatenate([[0], np.cumsum(labelled & (predicted == expected))])
+    # Uncovered comments are right when their reviewed label is 'Not Reviewed / Evidenced'
+    not_reviewed_after = np.concatenate([np.cumsum((expected == NOT_REVIEWED_LABEL)[::-1])[::-1], [0]])
+    unlabelled_right = np.concatenate([[0], np.cumsum(~labelled & (expected == NOT_REVIEWED_LABEL))])
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    n_above = np.searchsorted(-scores, -thresholds, side='right')
+    covered = covered_before[n_above]
+    correct = correct_before[n_above]
+    n_total = max(len(scores), 1)
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'coverage': covered / n_total,
+        'covered_accuracy': np.divide(correct, covered, out=np.full(len(thresholds), np.nan), where=covered > 0),
+        'accuracy': (correct + unlabelled_right[n_above] + not_reviewed_after[n_above]) / n_total,
+    })
+
+def recommend_threshold(curve: pd.DataFrame, min_accuracy: Optional[float] = None) -> pd.Series:
+    """
+    Pick a threshold from a sweep.
+
+    Parameters
+    ----------
+    curve : pandas.DataFrame
+        Output of `sweep_thresholds`.
+    min_accuracy : float, optional
+        When given, the lowest threshold (largest coverage) whose covered accuracy reaches
+        this value. Otherwise the threshold with the best overall accuracy, ties going to
+        the lowest threshold.
+
+    Returns
+    -------
+    pandas.Series
+        The curve row of the recommended threshold.
+    """
+    curve = curve.sort_values('threshold', kind='stable')
+    if min_accuracy is not None:
+        meeting = curve[curve['covered_accuracy'] >= min_accuracy]
+        if len(meeting):
+            return meeting.iloc[0]
+        logger.warning(f"No threshold reaches a covered accuracy of {min_accuracy}; falling back to the best overall accuracy.")
+    return curve.loc[curve['accuracy'].idxmax()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Coverage and accuracy of the similarity threshold over a labelled holdout.")
+    parser.add_argument('--labeled-csv', default=r'output\labeled_comments.csv')
+    parser.add_argument('--artifact-dir', default=r'output\model_artifacts')
+    parser.add_argument('--mapping-file', default=r'output\cluster_label_mapping.json')
+    parser.add_argument('--label-column', default='standard_label')
+    parser.add_argument('--holdout-fraction', type=float, default=0.1)
+    parser.add_argument('--min-threshold', type=float, default=0.0)
+    parser.add_argument('--max-threshold', type=float, default=1.0)
+    parser.add_argument('--n-thresholds', type=int, default=401)
+    parser.add_argument('--min-accuracy', type=float, default=None,
+                        help="Recommend the lowest threshold whose covered accuracy reaches this value.")
+    parser.add_argument('--output-csv', default=r'output\threshold_sweep.csv')
+    parser.add_argument('--output-json', default=r'output\threshold_recommendation.json')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.labeled_csv)
+    embeddings, cluster_labels, _ = load_artifacts(args.artifact_dir)
+    with open(args.mapping_file, 'r') as f:
+        cluster_to_label = json.load(f)
+
+    neighbours = holdout_neighbours(df, embeddings, cluster_labels, cluster_to_label, label_column=args.label_column,
+                                    holdout_fraction=args.holdout_fraction)
+    thresholds = np.linspace(args.min_threshold, args.max_threshold, args.n_thresholds)
+    curve = sweep_thresholds(neighbours, thresholds)
+    curve.to_csv(args.output_csv, index=False)
+
+    recommended = recommend_threshold(curve, min_accuracy=args.min_accuracy)
+    current_threshold = load_similarity_threshold()
+    summary = {
+        'holdout_rows': int(len(neighbours)),
+        'recommended': recommended.to_dict(),
+        'current': (sweep_thresholds(neighbours, np.array([current_threshold])).iloc[0].to_dict()
+                    if current_threshold is not None else None),
+    }
+    with open(args.output_json, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    logger.info(f"Threshold sweep saved to '{args.output_csv}'; recommended threshold {recommended['threshold']:.4f}.")
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,35 @@
-import json
-import pandas as pd
+from typing import Optional
+from src.comment_clustering.hierarchy_store import open_hierarchy_store
+from src.comment_clustering.pivot_table import pivot_cells, render_pivot_xlsx, save_pivot_table
 
-def transform_to_flattened_excel(input_json: str, output_excel: str) -> None:
+def transform_to_flattened_excel(input_json: str, output_excel: str, output_parquet: Optional[str] = None,
+                                 last_n_dates: Optional[int] = None) -> None:
     """
-    Transform hierarchical JSON comment data into a flattened Excel table.
+    Transform the hierarchical comment data into a flattened Excel table.
 
-    This function reads a JSON file that contains hierarchical comment data grouped by source, curve, and a grouping variable.
-    It flattens the data into a tabular format where each row corresponds to a unique source-curve-grouping_var combination,
+    This function reads the comment hierarchy, grouped by source, curve, and a grouping variable, from the SQLite hierarchy
+    store that production runs append to (see `hierarchy_store`), so it is current even when `comment_hierarchy.json` is
+    not re-exported. It flattens the data into a tabular format where each row corresponds to a unique source-curve-grouping_var combination,
     and each comment is placed under its respective date column.
 
     Parameters
     ----------
     input_json : str
-        The file path to the JSON file containing hierarchical comment data. The data should be grouped by source, curve, and
-        grouping variable, and each comment should have a 'date', 'standard_label', and 'comment'.
+        The file path to the JSON file containing hierarchical comment data, imported once when the hierarchy store is
+        empty. The data should be grouped by source, curve, and grouping variable, and each comment should have a 'date',
+        'standard_label', and 'comment'.
 
     output_excel : str
         The file path where the flattened Excel table will be saved. The Excel file will contain the source, curve, grouping variable,
         and comments categorized under date columns.
 
+    output_parquet : str, optional
+        If given, the long-format pivot table (one row per source, curve, grouping variable and date) is also saved
+        to this directory, partitioned by date (see `pivot_table.PivotTableStore`).
+
+    last_n_dates : int, optional
+        Only include the most recent `last_n_dates` date columns in the Excel table.
+
     Returns
     -------
     None
@@ -34,8 +45,8 @@ def transform_to_flattened_excel(input_json: str, output_excel: str) -> None:
     Notes
     -----
     - Each comment in the Excel sheet is annotated with its label as "[label] comment".
-    - Date columns in the Excel file are sorted chronologically.
-    - The JSON input structure should be similar to the following example:
+    - Date columns in the Excel file are sorted chronologically, and the workbook is written in streaming (write-only) mode.
+    - The JSON input structure (also the shape `python -m src.util.export_hierarchy` writes) should be similar to the following example:
 
     >>> {
     >>>     "source1": {
@@ -48,37 +59,22 @@ def transform_to_flattened_excel(input_json: str, output_excel: str) -> None:
     >>>     }
     >>> }
 
-    - Requires the `comment_hierarchy.json` file to be present in the working directory.
+    - Requires the hierarchy store, or the `comment_hierarchy.json` file to seed it, to be present.
     """
     
-    with open(input_json, 'r') as f:
-        data = json.load(f)
-
-    records = []
-
-    for source, curves in data.items():
-        for curve, groups in curves.items():
-            for grouping_var, comments in groups.items():
-                row = {'source': source, 'curve': curve, 'grouping_var': grouping_var}
-                for entry in comments:
-                    date = entry['date']
-                    label = entry['standard_label']
-                    comment = entry['comment']
-                    row[date] = f"[{label}] {comment}"
-                records.append(row)
-
-    df = pd.DataFrame(records)
+    with open_hierarchy_store(legacy_json=input_json) as store:
+        cells = pivot_cells(store.to_dataframe())
 
-    non_date_cols = ['source', 'curve', 'grouping_var']
-    date_cols = sorted([col for col in df.columns if col not in non_date_cols])
-    df = df[non_date_cols + date_cols]
+    if output_parquet:
+        save_pivot_table(cells, output_parquet)
 
-    df.to_excel(output_excel, index=False)
+    render_pivot_xlsx(cells, output_excel, last_n_dates=last_n_dates)
 
-    print(df.head())
+    print(cells.head())
 
 # Example usage
-transform_to_flattened_excel(
-    input_json='comment_hierarchy.json',
-    output_excel='Pivoted_Comments_Table.xlsx'
-)
+if __name__ == '__main__':
+    transform_to_flattened_excel(
+        input_json='comment_hierarchy.json',
+        output_excel='Pivoted_Comments_Table.xlsx'
+    )
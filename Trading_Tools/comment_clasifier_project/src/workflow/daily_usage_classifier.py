@@ -1,15 +1,18 @@
 import pandas as pd
 import json
-import re
-import pickle
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from src.comment_clustering.quantization import build_exact_search
+from src.comment_clustering.generate_embeddings import generate_embeddings
+from src.comment_clustering.preprocess import normalize_comments
+from src.comment_clustering.artifact_store import load_artifacts
+from src.comment_clustering.hierarchy_store import open_hierarchy_store
+from src.comment_clustering.pivot_table import update_pivot_table, load_pivot_table, render_pivot_xlsx
+from src.config.config import get_hierarchy_store_settings, get_pivot_table_settings
+from src.logs.tracing import count, span, trace_run
 
 def classify_and_save_new_comments(input_csv: str, 
                                    output_excel: str, 
-                                   saved_embeddings_file: str, 
-                                   saved_cluster_labels_file: str, 
+                                   artifact_dir: str, 
                                    cluster_label_mapping_file: str, 
                                    hierarchy_file: str) -> None:
     """
@@ -20,7 +23,8 @@ def classify_and_save_new_comments(input_csv: str,
     preprocessed, embedded, and compared against the saved embeddings to determine their 
     closest cluster. The function generates a new table with comments and their corresponding 
     labels, then saves the results in an Excel file (`Pivoted_Comments_Table.xlsx`). The 
-    updated comment hierarchy is also written back to a JSON file (`comment_hierarchy.json`).
+    new comments are appended to the SQLite hierarchy store, which imports `comment_hierarchy.json`
+    once and rewrites it only when `hierarchy_store.export_json` is set in config.json.
 
     Parameters
     ----------
@@ -33,145 +37,104 @@ def classify_and_save_new_comments(input_csv: str,
         The table will include columns for source, curve, grouping_var, date, standard_label, and 
         each date that appears in the comment hierarchy.
 
-    saved_embeddings_file : str
-        The file path to the pickle file containing the pre-trained embeddings for the original comments.
-
-    saved_cluster_labels_file : str
-        The file path to the pickle file containing the cluster labels corresponding to the pre-trained embeddings.
+    artifact_dir : str
+        The directory containing the memory-mapped pre-trained embeddings and their cluster labels
+        (written by the base pipeline, or by `src.util.migrate_artifacts` from the old pickle files).
 
     cluster_label_mapping_file : str
         The file path to the JSON file containing the mapping between cluster labels and human-readable categories.
 
     hierarchy_file : str
-        The file path to the JSON file containing the current comment hierarchy. This file will be updated with the new classified comments.
+        The file path to the JSON file containing the comment hierarchy, imported into an empty hierarchy store
+        and re-exported when `hierarchy_store.export_json` is set.
 
     Returns
     -------
     None
-        The function does not return any value. It writes the classified comments to an Excel file and updates 
-        the `comment_hierarchy.json` file.
+        The function does not return any value. It writes the classified comments to an Excel file and appends
+        them to the hierarchy store.
 
     Examples
     --------
     >>> classify_and_save_new_comments(
     >>>     input_csv='/content/t.csv',
     >>>     output_excel='Pivoted_Comments_Table.xlsx',
-    >>>     saved_embeddings_file='saved_embeddings.pkl',
-    >>>     saved_cluster_labels_file='saved_cluster_labels.pkl',
+    >>>     artifact_dir='model_artifacts',
     >>>     cluster_label_mapping_file='cluster_label_mapping.json',
     >>>     hierarchy_file='comment_hierarchy.json'
     >>> )
     
     Notes
     -----
-    - The function uses a pre-trained sentence transformer model (`all-MiniLM-L6-v2`) to generate embeddings for new comments.
-    - Cosine similarity is used to match new comments with saved embeddings, and a similarity threshold of 0.3 is applied to classify comments.
+    - The function uses a pre-trained sentence transformer model (`all-MiniLM-L6-v2`) to generate embeddings for new comments,
+      going through the shared embedding cache so previously seen comments are not re-encoded.
+    - Cosine similarity is used to match new comments with saved embeddings (scored in blocks against the normalised saved set), and a similarity threshold of 0.3 is applied to classify comments.
     - The input CSV should contain the following columns: 'comment', 'source', 'curve_list', 'grouping_var', and 'date'.
     - The output Excel file will have columns for source, curve, grouping variable, date, and standard label, along with comments under respective date columns.
-    - The resulting hierarchy will be written to `comment_hierarchy.json`, which organizes the comments by source, curve, and grouping variable.
+      It is streamed from the long-format pivot table (`pivot_table.path`, Parquet partitioned by date), in which only the dates of the new comments are rewritten;
+      set `pivot_table.last_n_dates` to limit the report to the most recent dates.
+    - The hierarchy store organizes the comments by source, curve, and grouping variable; each run only appends the new rows.
+    - Each call is traced as a 'daily_usage' run: stage timings and throughput are appended to the
+      `tracing.summary_file` run summary.
     """
     
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-
-    with open(saved_embeddings_file, 'rb') as f:
-        saved_embeddings = pickle.load(f)
-
-    with open(saved_cluster_labels_file, 'rb') as f:
-        saved_cluster_labels = pickle.load(f)
-
-    with open(cluster_label_mapping_file, 'r') as f:
-        cluster_to_label = json.load(f)
-
-    new_comments_df = pd.read_csv(input_csv)
-    print(new_comments_df.columns)
-
-    new_comments_df.rename(columns=lambda x: x.strip(), inplace=True)
-    if 'comment' not in new_comments_df.columns:
-        raise KeyError("The 'comment' column is missing from the input data.")
-
-    def preprocess(text):
-        if pd.isna(text):
-            return ""
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', '', text)
-        text = text.strip()
-        return text
-
-    new_comments_df['cleaned_comment'] = new_comments_df['comment'].apply(preprocess)
-
-    new_embeddings = model.encode(new_comments_df['cleaned_comment'].tolist(), show_progress_bar=True)
-
-    SIMILARITY_THRESHOLD = 0.3
-
-    new_labels = []
-
-    for new_embedding, comment in zip(new_embeddings, new_comments_df['comment']):
-        if pd.isna(comment) or comment.strip() == "":
-            new_comment_label = "Not Reviewed / Evidenced"
-        else:
-            cos_similarity = cosine_similarity([new_embedding], saved_embeddings)
-            closest_idx = np.argmax(cos_similarity)
-            max_cos_similarity = cos_similarity[0][closest_idx]
-            if max_cos_similarity < SIMILARITY_THRESHOLD:
-                new_comment_label = "Not Reviewed / Evidenced"
-            else:
-                new_comment_cluster = saved_cluster_labels[closest_idx]
-                new_comment_label = cluster_to_label.get(str(new_comment_cluster))
-        new_labels.append(new_comment_label)
-
-    new_comments_df['standard_label'] = new_labels
-
-    with open(hierarchy_file, 'r') as f:
-        data = json.load(f)
-
-    new_comments_df['date'] = pd.to_datetime(new_comments_df['date'], errors='coerce')
-
-    for _, row in new_comments_df.iterrows():
-        comment = row['comment']
-        source = row['source']
-        curve = row['curve_list']
-        grouping_var = row['grouping_var']
-        label = row['standard_label']
-        if pd.notna(row['date']):
-            date = row['date'].strftime('%Y-%m-%d')
-        else:
-            date = ''
-        if source not in data:
-            data[source] = {}
-        if curve not in data[source]:
-            data[source][curve] = {}
-        if grouping_var not in data[source][curve]:
-            data[source][curve][grouping_var] = []
-        data[source][curve][grouping_var].append({
-            'date': date,
-            'comment': comment,
-            'standard_label': label
-        })
-
-    records = []
-
-    for source, curves in data.items():
-        for curve, groups in curves.items():
-            for grouping_var, comments in groups.items():
-                row = {'source': source, 'curve': curve, 'grouping_var': grouping_var}
-                for entry in comments:
-                    date = entry['date']
-                    label = entry['standard_label']
-                    comment = entry['comment']
-                    row[date] = f"[{label}] {comment}"
-                records.append(row)
-
-    df = pd.DataFrame(records)
-
-    non_date_cols = ['source', 'curve', 'grouping_var']
-    date_cols = sorted([col for col in df.columns if col not in non_date_cols])
-    df = df[non_date_cols + date_cols]
-
-    df.to_excel(output_excel, index=False)
-
-    print(df.head())
-
-    with open(hierarchy_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    with trace_run('daily_usage'):
+        with span('load') as stage:
+            saved_embeddings, saved_cluster_labels, _ = load_artifacts(artifact_dir)
+
+            with open(cluster_label_mapping_file, 'r') as f:
+                cluster_to_label = json.load(f)
+
+            new_comments_df = pd.read_csv(input_csv)
+            stage.set_rows(len(new_comments_df))
+        print(new_comments_df.columns)
+
+        new_comments_df.rename(columns=lambda x: x.strip(), inplace=True)
+        if 'comment' not in new_comments_df.columns:
+            raise KeyError("The 'comment' column is missing from the input data.")
+
+        n_rows = len(new_comments_df)
+        with span('preprocess', rows=n_rows):
+            new_comments_df['cleaned_comment'] = normalize_comments(new_comments_df['comment'])
+
+        with span('embed', rows=n_rows):
+            new_embeddings = generate_embeddings(new_comments_df['cleaned_comment'].tolist(), model_name='all-MiniLM-L6-v2')
+
+        SIMILARITY_THRESHOLD = 0.3
+
+        with span('map', rows=n_rows):
+            new_labels = ["Not Reviewed / Evidenced"] * len(new_comments_df)
+
+            comments = new_comments_df['comment']
+            rows_to_score = np.flatnonzero((comments.notna() & (comments.astype(str).str.strip() != "")).to_numpy())
+
+            if len(rows_to_score) > 0:
+                search = build_exact_search(saved_embeddings, normalized=True)
+                closest_idx, max_cos_similarity = search.search(np.asarray(new_embeddings)[rows_to_score])
+                for row, idx, similarity in zip(rows_to_score, closest_idx, max_cos_similarity):
+                    if similarity >= SIMILARITY_THRESHOLD:
+                        new_comment_cluster = saved_cluster_labels[idx]
+                        new_labels[row] = cluster_to_label.get(str(new_comment_cluster))
+            count('map.not_reviewed', sum(label == "Not Reviewed / Evidenced" for label in new_labels))
+
+            new_comments_df['standard_label'] = new_labels
+
+        new_comments_df['date'] = pd.to_datetime(new_comments_df['date'], errors='coerce')
+
+        pivot_settings = get_pivot_table_settings()
+        with open_hierarchy_store(legacy_json=hierarchy_file) as store:
+            with span('hierarchy', rows=n_rows):
+                store.append(new_comments_df)
+            with span('pivot', rows=n_rows):
+                update_pivot_table(new_comments_df, pivot_settings['path'], store=store)
+            if get_hierarchy_store_settings()['export_json']:
+                store.export_json(hierarchy_file)
+
+        with span('render') as stage:
+            cells = load_pivot_table(pivot_settings['path'])
+            stage.set_rows(len(cells))
+            render_pivot_xlsx(cells, output_excel, last_n_dates=pivot_settings['last_n_dates'])
+
+    print(cells.head())
 
     print("New comments classified and saved to 'Pivoted_Comments_Table.xlsx'!")
@@ -1,4 +1,5 @@
 import pandas as pd
+from src.util.excel_reader import read_excel_comments
 
 def combine_files(excel_file: str, csv_file: str, output_file: str) -> None:
     """
@@ -23,11 +24,12 @@ def combine_files(excel_file: str, csv_file: str, output_file: str) -> None:
     
     Notes
     -----
-    The Excel file is read using `pandas.read_excel()` and the CSV file using `pandas.read_csv()`.
+    The Excel file is read with `excel_reader.read_excel_comments` (read-only streaming, cached by
+    file hash) and the CSV file using `pandas.read_csv()`.
     The function assumes that both files contain compatible data and will concatenate them along the rows
     (ignoring the index). The combined data is saved as a CSV file without including the index column.
     """
-    excel_data = pd.read_excel(excel_file, usecols=['source', 'date', 'curve_list', 'comment', 'grouping_var'])
+    excel_data = read_excel_comments(excel_file)
 
     csv_data = pd.read_csv(csv_file)
 
@@ -37,4 +39,5 @@ def combine_files(excel_file: str, csv_file: str, output_file: str) -> None:
     
     print(f"Files combined and saved as '{output_file}'")
 
-combine_files('new.xlsx', 'data.csv', 'combined_data.csv')
+if __name__ == '__main__':
+    combine_files('new.xlsx', 'data.csv', 'combined_data.csv')
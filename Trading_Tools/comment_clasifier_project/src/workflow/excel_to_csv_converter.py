@@ -23,9 +23,10 @@ Examples
 """
 import pandas as pd
 
-# Load the Excel file
-df = pd.read_excel('/content/t.xlsx', engine='openpyxl')
+if __name__ == '__main__':
+    # Load the Excel file
+    df = pd.read_excel('/content/t.xlsx', engine='openpyxl')
 
-# Save to CSV
-df.to_csv('t.csv', index=False)
-print("✅ Excel file converted to CSV")
+    # Save to CSV
+    df.to_csv('t.csv', index=False)
+    print("✅ Excel file converted to CSV")
@@ -1,10 +1,9 @@
 import pandas as pd
-import re
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import AgglomerativeClustering
+from src.comment_clustering.generate_embeddings import encode_texts
+from src.comment_clustering.build_hierarchy import build_hierarchy
+from src.comment_clustering.preprocess import normalize_comments
 import json
 import pickle
-from collections import defaultdict
 
 def process_and_cluster_comments(input_csv: str, output_csv: str, embeddings_file: str, cluster_labels_file: str, mapping_file: str, hierarchy_file: str) -> None:
     """
@@ -68,21 +67,13 @@ def process_and_cluster_comments(input_csv: str, output_csv: str, embeddings_fil
     df = pd.read_csv(input_csv)
     df['comment'] = df['comment'].astype(str)
 
-    def pre_process(text_comment):
-        if pd.isna(text_comment):
-            return ""
-        text_comment = text_comment.lower()
-        text_comment = re.sub(r'[^\w\s]', '', text_comment)
-        text_comment = text_comment.strip()
-        return text_comment
-
-    df['cleaned_comment'] = df['comment'].apply(pre_process)
+    df['cleaned_comment'] = normalize_comments(df['comment'])
 
     
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = model.encode(df['cleaned_comment'].tolist(), show_progress_bar=True)
+    embeddings = encode_texts(df['cleaned_comment'].tolist(), 'all-MiniLM-L6-v2')
 
     
+    from sklearn.cluster import AgglomerativeClustering
     clustering_model = AgglomerativeClustering(n_clusters=None, distance_threshold=1)
     cluster_labels = clustering_model.fit_predict(embeddings)
     df['cluster'] = cluster_labels
@@ -169,31 +160,20 @@ def process_and_cluster_comments(input_csv: str, output_csv: str, embeddings_fil
     df = df.sort_values(by='date')
 
     
-    nested_dict = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-
-    for _, row in df.iterrows():
-        comment = row['comment'] if pd.notna(row['comment']) and row['comment'].strip() != '' else '[Not Reviewed / Evidenced]'
-        source = row['source']
-        curve = row['curve_list']
-        grouping_var = row['grouping_var']
-
-        nested_dict[source][curve][grouping_var].append({
-            'date': row['date'].strftime('%Y-%m-%d'),
-            'comment': comment,
-            'standard_label': row['standard_label']
-        })
+    nested_dict = build_hierarchy(df)
 
    
     with open(hierarchy_file, 'w') as f:
         json.dump(nested_dict, f, indent=2)
 
 
-process_and_cluster_comments(
-        input_csv=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\data\data.csv',
-        output_csv=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\labeled_comments.csv',
-        embeddings_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\saved_embeddings.pkl',
-        cluster_labels_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\saved_cluster_labels.pkl',
-        mapping_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\cluster_label_mapping.json',
-        hierarchy_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\comment_hierarchy.json'
-    )
+if __name__ == '__main__':
+    process_and_cluster_comments(
+            input_csv=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\data\data.csv',
+            output_csv=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\labeled_comments.csv',
+            embeddings_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\saved_embeddings.pkl',
+            cluster_labels_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\saved_cluster_labels.pkl',
+            mapping_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\cluster_label_mapping.json',
+            hierarchy_file=r'C:\Users\srini\OneDrive\Desktop\comment-classifier-project\output\comment_hierarchy.json'
+        )
 